@@ -10,12 +10,19 @@ import time
 import datetime
 import logging
 import DWM10_Parms
+import DWM12_RefCache
+import DWM13_TokenVocabulary
 import DWM14_BuildRefDict
 import DWM15_BuildLinkIndex
 import DWM16_BuildTokenFreqDict
+import DWM17_AliasCanonicalization
 import DWM25_Global_Token_Replace
+import DWM41_BlockingKeyIndex
 import DWM42_BuildBlockPairs
 import DWM45_Block_Cleaning
+import DWM46_ParallelBlockCorrection
+import DWM48_MetaBlocking
+import DWM50_PartitionedRun
 import DWM55_LinkBlockPairs
 import DWM80_TransitiveClosure
 import DWM90_IterateClusters
@@ -59,7 +66,29 @@ import xlsxwriter
 # Version 2.21 Corrected two bugs, one in Global Correction, and one in DWM90
 # Version 2.30 Added new value 'CompressNbr' to parameter 'tokenizerType' 
 # Version 2.31 Corrected a bug in DWM42 where last key group was not being processed
-version = 2.31
+# Version 2.32 Moved tokenizer functions to DWM20 with compiled patterns and an ASCII fast path
+# Version 2.33 Added new parameter ingestWorkers to tokenize the input file in parallel shards
+# Version 2.34 Added DWM12 reference cache with new parameters useRefCache, refCacheDir, refCacheMaxMB
+# Version 2.35 Added DWM13 token vocabulary, tokens are interned to integer IDs used by DWM16, DWM42, DWM55
+# Version 2.36 DWM16 tokenFreqDict is an incrementally maintained index, DWM25 and DWM45 update it instead of a full rebuild
+# Version 2.37 DWM25 correction search uses a symmetric-deletion index instead of comparing every token pair
+# Version 2.38 Added DWM11 resource loader for DWM_WordList.txt and alias.dat, new parameter resourceCacheDir
+# Version 2.39 Added DWM26 variant store, learned variants are appended to a log with file locking
+# Version 2.40 DWM42 blocking keys and block pairs are packed integer codes, pair keys are no longer ambiguous concatenations
+# Version 2.41 Added new parameters maxBlockSize, blockWindowSize, DWM42 logs a histogram of block sizes
+# Version 2.42 Added DWM43 external-memory blocking with new parameters blockingMemoryMB, blockingTempDir
+# Version 2.43 Added DWM44 parallel block pair generation with new parameters blockingWorkers, blockingChunkSize
+# Version 2.44 Added DWM41 blocking key index with new parameter useBlockingKeyIndex
+# Version 2.45 Added DWM47 MinHash LSH blocking with new parameters blockingMode, lshBands, lshRows
+# Version 2.46 Added DWM39 pair budget estimate with new parameters reportPairBudget, maxCandidatePairs
+# Version 2.47 Added DWM48 meta-blocking with new parameters metaBlocking, metaBlockingWeight
+# Version 2.48 Added DWM40 sorted neighborhood blocking with new parameters snSortKeys, snMinWindow, snMaxWindow, snSimilarity
+# Version 2.49 Added field-aware token pair blocking with new parameter fieldAwareBlocking
+# Version 2.50 Added DWM38 blocking key functions with new parameter blockingKeyFunctions
+# Version 2.51 Added DWM50 partitioned run of DWM55, DWM80, DWM90 with new parameter partitionWorkers
+# Version 2.52 Added DWM46 parallel block correction with new parameters blockCorrectionWorkers, blockCorrectionCompare
+# Version 2.53 Added DWM17 alias canonicalization with new parameter canonicalizeAliases
+version = 2.53
 
 # get start time for timer
 startTime = time.time()
@@ -145,20 +174,37 @@ while True:
     DWM10_Parms.blockCorrect =DWM10_Parms.blockCorrection
     # Load truth dictionary for data capture (if truth file is provided)
     truthDict = DWM_DataCapture.load_truth_dict(DWM10_Parms.truthFileName)
+    # If useRefCache is True, look for refDict and tokenFreqDict saved by an earlier run
+    refCacheKey, refCacheEntry = DWM12_RefCache.lookup()
     # Create refDict, a dictionary where key=refID, value is list of reference tokens
-    refDict = DWM14_BuildRefDict.tokenizeInput()
+    if refCacheEntry is None:
+        refDict = DWM14_BuildRefDict.tokenizeInput()
+        # If canonicalizeAliases, replace aliases before the token frequencies are counted
+        if DWM10_Parms.canonicalizeAliases:
+            DWM17_AliasCanonicalization.canonicalizeRefDict(refDict)
+    else:
+        refDict = refCacheEntry['refDict']
+    # Intern every token to an integer ID in a new vocabulary shared by all stages of this run
+    DWM13_TokenVocabulary.resetVocabulary().internRefDict(refDict)
+    DWM41_BlockingKeyIndex.resetIndex()
     DWM_DataCapture.save_ref_dict(refDict, os.path.join(captureFolder, '01_refDict.csv'))
     # Create linkIndx, a dictionary where key=refID, value is cluster ID`
     linkIndex = DWM15_BuildLinkIndex.buildLinkIndex(refDict)
     DWM_DataCapture.save_link_index(linkIndex, os.path.join(captureFolder, '02_linkIndex_initial.csv'), refDict)
     # Create tokenFeqDict, a dictionary where key=token, value is token frequency
-    tokenFreqDict =DWM16_BuildTokenFreqDict.buildTokenFreqDict(refDict)
+    if refCacheEntry is None:
+        tokenFreqDict =DWM16_BuildTokenFreqDict.buildTokenFreqDict(refDict)
+        DWM12_RefCache.store(refCacheKey, refDict, tokenFreqDict)
+    else:
+        tokenFreqDict = refCacheEntry['tokenFreqDict']
     DWM_DataCapture.save_token_freq_dict(tokenFreqDict, os.path.join(captureFolder, '03_tokenFreqDict.csv'))
     # create dictionary of corrections (stdTokenDict), leave empty if not running replacement
     #if global replacement configured, populate stdTokenDict of corrections in DWM25
     if DWM10_Parms.runGlobalCorrection:
+        # DWM25 updates tokenFreqDict with each replacement it applies
         refDict = DWM25_Global_Token_Replace.globalReplace(refDict, tokenFreqDict)
-        tokenFreqDict =DWM16_BuildTokenFreqDict.buildTokenFreqDict(refDict)
+        DWM13_TokenVocabulary.getVocabulary().internRefs(DWM25_Global_Token_Replace.changedRefIDs, refDict)
+        DWM16_BuildTokenFreqDict.updateTokenFreqDict(tokenFreqDict, 'DWM25')
         DWM_DataCapture.save_ref_dict(refDict, os.path.join(captureFolder, '04_refDict_after_global_correction.csv'))
         DWM_DataCapture.save_token_freq_dict(tokenFreqDict, os.path.join(captureFolder, '04_tokenFreqDict_after_global_correction.csv'))
     moreToDo = True
@@ -208,10 +254,16 @@ while True:
             break
         # If block correction requested, only run once on first iteration
         if DWM10_Parms.blockCorrection and firstIteration:
-            changeCount = DWM45_Block_Cleaning.RunBlockCorrections(blockPairList, tokenFreqDict, refDict)
-            # if there were block corrections, rebuild token dictionary and re-block
+            if DWM10_Parms.blockCorrectionWorkers > 1:
+                changeCount = DWM46_ParallelBlockCorrection.runParallelCorrections(blockPairList, tokenFreqDict, refDict)
+            else:
+                changeCount = DWM45_Block_Cleaning.RunBlockCorrections(blockPairList, tokenFreqDict, refDict)
+            # DWM45 updates tokenFreqDict with each correction, if there were corrections re-block
             if changeCount > 0:
-                tokenFreqDict=DWM16_BuildTokenFreqDict.buildTokenFreqDict(refDict)
+                DWM16_BuildTokenFreqDict.updateTokenFreqDict(tokenFreqDict, 'DWM45')
+                # Sorted so new tokens get the same IDs in every run
+                DWM13_TokenVocabulary.getVocabulary().internRefs(sorted(DWM45_Block_Cleaning.changedRefIDs), refDict)
+                DWM41_BlockingKeyIndex.markChanged(DWM45_Block_Cleaning.changedRefIDs)
                 blockPairList = DWM42_BuildBlockPairs.buildBlockPairs(refDict, linkIndex, tokenFreqDict)
                 DWM_DataCapture.save_ref_dict(refDict, os.path.join(iterationFolder, '06_refDict_after_block_correction.csv'))
                 DWM_DataCapture.save_block_pair_list(blockPairList, os.path.join(iterationFolder, '06_blockPairList_after_block_correction.csv'), refDict, truthDict)
@@ -227,7 +279,15 @@ while True:
                 if DWM10_Parms.truthFileName != '':
                     DWM99_ERmetrics.generateBlockingMetrics(blockPairList, iterationNum, refDict)
             firstIteration = False
-        linkedPairList = DWM55_LinkBlockPairs.linkBlockPairs(blockPairList, refDict, tokenFreqDict)
+        # If meta-blocking requested, prune the weak pairs before they are compared
+        if DWM10_Parms.metaBlocking != 'None':
+            blockPairList = DWM48_MetaBlocking.pruneBlockPairs(blockPairList, truthDict)
+        # If partitioned run requested, link, close and evaluate each component of the blocking graph in parallel
+        partitioned = DWM10_Parms.partitionWorkers > 1
+        if partitioned:
+            linkedPairList, clusterList, iterationLinkIndex = DWM50_PartitionedRun.runPartitioned(blockPairList, refDict, tokenFreqDict, linkIndex)
+        else:
+            linkedPairList = DWM55_LinkBlockPairs.linkBlockPairs(blockPairList, refDict, tokenFreqDict)
         DWM_DataCapture.save_linked_pair_list(linkedPairList, os.path.join(iterationFolder, '07_linkedPairList.csv'), refDict, truthDict)
         # Pair comparison views for linked pairs
         DWM_DataCapture.save_pair_comparison_view(
@@ -241,14 +301,16 @@ while True:
             print('Ending because linkedPairList is empty')
             print('Ending because linkedPairList is empty', file=logFile)
             break
-        clusterList = DWM80_TransitiveClosure.transitiveClosure(linkedPairList)
+        if not partitioned:
+            clusterList = DWM80_TransitiveClosure.transitiveClosure(linkedPairList)
         DWM_DataCapture.save_cluster_list(clusterList, os.path.join(iterationFolder, '08_clusterList.csv'), refDict, truthDict)
         lastClusterList = clusterList
         if len(clusterList)==0:
             print('--Ending because clusterList is empty')
             print('--Ending because clusterList is empty', file=logFile)
             break
-        iterationLinkIndex = DWM90_IterateClusters.iterateClusters(clusterList, refDict, linkIndex)
+        if not partitioned:
+            iterationLinkIndex = DWM90_IterateClusters.iterateClusters(clusterList, refDict, linkIndex)
         DWM_DataCapture.save_link_index(iterationLinkIndex, os.path.join(iterationFolder, '09_linkIndex.csv'), refDict)
         lastIterationLinkIndex = iterationLinkIndex
         print("\n>>Itermediate Results from this Iteration")
@@ -19,10 +19,16 @@ tokenizerType = 'Splitter'
 truthFileName = ''
 runIterationProfile = False
 addRefsToLinkIndex = False
+ingestWorkers = 1
+useRefCache = False
+refCacheDir = 'DWM_Cache'
+refCacheMaxMB = 512
+resourceCacheDir = 'DWM_Cache'
 # Global Correction Parameters
 runGlobalCorrection = False
 globalCorrectionDetail = False
 learnTokenVariants = False
+canonicalizeAliases = False
 minFreqStdToken = 5
 minLenStdToken = 3
 maxFreqErrToken = 3
@@ -31,9 +37,31 @@ beta = 2
 blockByPairs = True
 minBlkTokenLen = 4
 excludeNumericBlocks = True
+maxBlockSize = 0
+blockWindowSize = 10
+blockingMemoryMB = 0
+blockingTempDir = ''
+blockingWorkers = 1
+blockingChunkSize = 1000000
+useBlockingKeyIndex = False
+blockingMode = 'Token'
+lshBands = 20
+lshRows = 5
+reportPairBudget = False
+maxCandidatePairs = 0
+metaBlocking = 'None'
+metaBlockingWeight = 'CBS'
+snSortKeys = 2
+snMinWindow = 3
+snMaxWindow = 20
+snSimilarity = 0.5
+fieldAwareBlocking = False
+blockingKeyFunctions = ''
 # Block Correction Parameters
 blockCorrection = False
 blockCorrectionDetail = False
+blockCorrectionWorkers = 1
+blockCorrectionCompare = False
 # Linking Parameters
 epsilon = 0.50
 epsilonIterate = 0.00
@@ -42,6 +70,7 @@ muIterate = 0.10
 comparator = 'ScoringMatrixStd'
 matrixNumTokenRule = False
 matrixInitialRule = False
+partitionWorkers = 1
 # Stop Word Parameters
 sigma = 12
 removeDuplicateTokens = False
@@ -120,7 +149,15 @@ def getParms(parmFileName, logName):
     logFile = logName
     global fatalError
    
-    validParmNames = ['inputFileName','delimiter', 'hasHeader', 'tokenizerType', 'removeDuplicateTokens',                        'minFreqStdToken', 'minLenStdToken', 'maxFreqErrToken', 'addRefsToLinkIndex',                              'mu', 'muIterate', 'beta', 'minBlkTokenLen', 'sigma', 'epsilon', 'epsilonIterate',                         'excludeNumericBlocks', 'removeExcludedBlkTokens','runClusterMetrics', 'createFinalJoin',                       'blockByPairs', 'comparator','truthFileName', 'matrixNumTokenRule', 'matrixInitialRule',                        'runGlobalCorrection', 'runIterationProfile', 'blockCorrection', 'blockCorrectionDetail',                       'globalCorrectionDetail', 'learnTokenVariants']
+    validParmNames = ['inputFileName','delimiter', 'hasHeader', 'tokenizerType', 'removeDuplicateTokens',                        'minFreqStdToken', 'minLenStdToken', 'maxFreqErrToken', 'addRefsToLinkIndex',                              'mu', 'muIterate', 'beta', 'minBlkTokenLen', 'sigma', 'epsilon', 'epsilonIterate',                         'excludeNumericBlocks', 'removeExcludedBlkTokens','runClusterMetrics', 'createFinalJoin',                       'blockByPairs', 'comparator','truthFileName', 'matrixNumTokenRule', 'matrixInitialRule',                        'runGlobalCorrection', 'runIterationProfile', 'blockCorrection', 'blockCorrectionDetail',                       'globalCorrectionDetail', 'learnTokenVariants',
+                      'ingestWorkers', 'useRefCache', 'refCacheDir', 'refCacheMaxMB',
+                      'resourceCacheDir', 'maxBlockSize', 'blockWindowSize',
+                      'blockingMemoryMB', 'blockingTempDir', 'blockingWorkers', 'blockingChunkSize',
+                      'useBlockingKeyIndex', 'blockingMode', 'lshBands', 'lshRows',
+                      'reportPairBudget', 'maxCandidatePairs', 'metaBlocking', 'metaBlockingWeight',
+                      'snSortKeys', 'snMinWindow', 'snMaxWindow', 'snSimilarity',
+                      'fieldAwareBlocking', 'blockingKeyFunctions', 'partitionWorkers',
+                      'blockCorrectionWorkers', 'blockCorrectionCompare', 'canonicalizeAliases']
     parmFile = open(parmFileName,'r')
     parms = {}
     lineNbr = 0
@@ -165,6 +202,26 @@ def getParms(parmFileName, logName):
             global tokenizerType
             tokenizerType = parmValue
             continue
+        if parmName=='ingestWorkers':
+            global ingestWorkers
+            ingestWorkers = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='useRefCache':
+            global useRefCache
+            useRefCache = convertToBoolean(lineNbr, parmValue)
+            continue
+        if parmName=='refCacheDir':
+            global refCacheDir
+            refCacheDir = parmValue
+            continue
+        if parmName=='refCacheMaxMB':
+            global refCacheMaxMB
+            refCacheMaxMB = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='resourceCacheDir':
+            global resourceCacheDir
+            resourceCacheDir = parmValue
+            continue
         if parmName=='removeDuplicateTokens':
             global removeDuplicateTokens
             removeDuplicateTokens = convertToBoolean(lineNbr, parmValue)
@@ -239,6 +296,102 @@ def getParms(parmFileName, logName):
             global minBlkTokenLen
             minBlkTokenLen = convertToInteger(lineNbr, parmValue)
             continue            
+        if parmName=='maxBlockSize':
+            global maxBlockSize
+            maxBlockSize = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockWindowSize':
+            global blockWindowSize
+            blockWindowSize = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockingMemoryMB':
+            global blockingMemoryMB
+            blockingMemoryMB = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockingTempDir':
+            global blockingTempDir
+            blockingTempDir = parmValue
+            continue
+        if parmName=='blockingWorkers':
+            global blockingWorkers
+            blockingWorkers = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockingChunkSize':
+            global blockingChunkSize
+            blockingChunkSize = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='useBlockingKeyIndex':
+            global useBlockingKeyIndex
+            useBlockingKeyIndex = convertToBoolean(lineNbr, parmValue)
+            continue
+        if parmName=='blockingMode':
+            global blockingMode
+            blockingMode = parmValue
+            continue
+        if parmName=='lshBands':
+            global lshBands
+            lshBands = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='lshRows':
+            global lshRows
+            lshRows = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='reportPairBudget':
+            global reportPairBudget
+            reportPairBudget = convertToBoolean(lineNbr, parmValue)
+            continue
+        if parmName=='maxCandidatePairs':
+            global maxCandidatePairs
+            maxCandidatePairs = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='metaBlocking':
+            global metaBlocking
+            metaBlocking = parmValue
+            continue
+        if parmName=='metaBlockingWeight':
+            global metaBlockingWeight
+            metaBlockingWeight = parmValue
+            continue
+        if parmName=='snSortKeys':
+            global snSortKeys
+            snSortKeys = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='snMinWindow':
+            global snMinWindow
+            snMinWindow = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='snMaxWindow':
+            global snMaxWindow
+            snMaxWindow = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='snSimilarity':
+            global snSimilarity
+            snSimilarity = convertToFloat(lineNbr, parmValue)
+            continue
+        if parmName=='fieldAwareBlocking':
+            global fieldAwareBlocking
+            fieldAwareBlocking = convertToBoolean(lineNbr, parmValue)
+            continue
+        if parmName=='blockingKeyFunctions':
+            global blockingKeyFunctions
+            blockingKeyFunctions = parmValue
+            continue
+        if parmName=='partitionWorkers':
+            global partitionWorkers
+            partitionWorkers = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockCorrectionWorkers':
+            global blockCorrectionWorkers
+            blockCorrectionWorkers = convertToInteger(lineNbr, parmValue)
+            continue
+        if parmName=='blockCorrectionCompare':
+            global blockCorrectionCompare
+            blockCorrectionCompare = convertToBoolean(lineNbr, parmValue)
+            continue
+        if parmName=='canonicalizeAliases':
+            global canonicalizeAliases
+            canonicalizeAliases = convertToBoolean(lineNbr, parmValue)
+            continue
         if parmName=='excludeNumericBlocks':
             global excludeNumericBlocks
             excludeNumericBlocks = convertToBoolean(lineNbr, parmValue)
@@ -379,6 +532,67 @@ def getParms(parmFileName, logName):
     if epsilonIterate < 0.0 or epsilonIterate > 1.00:
         print('**Error: epsilonIterate value ', epsilonIterate,' must be in interval (0.00,1.00]')
         fatalError = True
+    if ingestWorkers is not None and ingestWorkers < 1:
+        print('**Error: ingestWorkers value ', ingestWorkers,' must be at least 1')
+        fatalError = True
+    if maxBlockSize is not None and maxBlockSize < 0:
+        print('**Error: maxBlockSize value ', maxBlockSize,' must be 0 (no limit) or larger')
+        fatalError = True
+    if blockWindowSize is not None and blockWindowSize < 2:
+        print('**Error: blockWindowSize value ', blockWindowSize,' must be at least 2')
+        fatalError = True
+    if blockingMemoryMB is not None and blockingMemoryMB < 0:
+        print('**Error: blockingMemoryMB value ', blockingMemoryMB,' must be 0 (in memory) or larger')
+        fatalError = True
+    if blockingWorkers is not None and blockingWorkers < 1:
+        print('**Error: blockingWorkers value ', blockingWorkers,' must be at least 1')
+        fatalError = True
+    if blockingChunkSize is not None and blockingChunkSize < 1:
+        print('**Error: blockingChunkSize value ', blockingChunkSize,' must be at least 1')
+        fatalError = True
+    if blockingMode not in ('Token', 'MinHashLSH', 'SortedNeighborhood'):
+        print('**Error: blockingMode value ', blockingMode,' must be Token, MinHashLSH or SortedNeighborhood')
+        fatalError = True
+    if lshBands is not None and lshBands < 1:
+        print('**Error: lshBands value ', lshBands,' must be at least 1')
+        fatalError = True
+    if lshRows is not None and lshRows < 1:
+        print('**Error: lshRows value ', lshRows,' must be at least 1')
+        fatalError = True
+    if maxCandidatePairs is not None and maxCandidatePairs < 0:
+        print('**Error: maxCandidatePairs value ', maxCandidatePairs,' must be 0 (no budget) or larger')
+        fatalError = True
+    if metaBlocking not in ('None', 'WEP', 'WNP'):
+        print('**Error: metaBlocking value ', metaBlocking,' must be None, WEP or WNP')
+        fatalError = True
+    if metaBlockingWeight not in ('CBS', 'Jaccard'):
+        print('**Error: metaBlockingWeight value ', metaBlockingWeight,' must be CBS or Jaccard')
+        fatalError = True
+    if snSortKeys is not None and snSortKeys < 1:
+        print('**Error: snSortKeys value ', snSortKeys,' must be at least 1')
+        fatalError = True
+    if snMinWindow is not None and snMinWindow < 2:
+        print('**Error: snMinWindow value ', snMinWindow,' must be at least 2')
+        fatalError = True
+    if snMaxWindow is not None and snMinWindow is not None and snMaxWindow < snMinWindow:
+        print('**Error: snMaxWindow value ', snMaxWindow,' must be at least snMinWindow value ', snMinWindow)
+        fatalError = True
+    if snSimilarity is not None and (snSimilarity < 0.0 or snSimilarity > 1.00):
+        print('**Error: snSimilarity value ', snSimilarity,' must be in interval [0.00,1.00]')
+        fatalError = True
+    if fieldAwareBlocking and not blockByPairs:
+        print('**Error: fieldAwareBlocking requires blockByPairs to be True')
+        fatalError = True
+    for keyFunction in blockingKeyFunctions.split(','):
+        if keyFunction.strip() not in ('', 'Soundex', 'QGram'):
+            print('**Error: blockingKeyFunctions value ', keyFunction,' must be Soundex or QGram')
+            fatalError = True
+    if partitionWorkers is not None and partitionWorkers < 1:
+        print('**Error: partitionWorkers value ', partitionWorkers,' must be at least 1')
+        fatalError = True
+    if blockCorrectionWorkers is not None and blockCorrectionWorkers < 1:
+        print('**Error: blockCorrectionWorkers value ', blockCorrectionWorkers,' must be at least 1')
+        fatalError = True
     if minFreqStdToken <= maxFreqErrToken:
         print('**Error: minFreqStdToken ', minFreqStdToken,' must be greater than maxFreqErrToken', maxFreqErrToken)
         fatalError = True
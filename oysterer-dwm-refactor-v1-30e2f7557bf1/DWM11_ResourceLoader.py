@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import os
+import csv
+import json
+import mmap
+import hashlib
+import DWM10_Parms
+import DWM12_RefCache
+# Compiled forms of the static resource files, DWM_WordList.txt used by DWM25 and alias.dat
+# used by DWM45. Each file is parsed once into a sorted array of UTF-8 keys (and values for
+# alias.dat) written to resourceCacheDir. Later runs memory-map the compiled file instead of
+# parsing the text file and decode it once into a frozenset or dict, so a lookup is a hash
+# lookup. A compiled file is trusted while the size and modification time of its source file
+# match, the content hash is only compared when they differ and the file is rebuilt when the
+# content changed. Loaded resources are kept for the whole process, so every parms file of a
+# multi-parms run shares them.
+resourceVersion = 1
+resourceMagic = b'DWMRES\n'
+compiledSuffix = '.dwmres'
+# key=source path, value=(source stat, loaded resource)
+loadedResources = {}
+
+
+# In[ ]:
+
+
+class CompiledKeys:
+    # Read-only sorted array of strings stored as an offsets array and one UTF-8 blob
+    def __init__(self, buffer, offsetsStart, count, blobStart):
+        self._buffer = buffer
+        self._offsets = memoryview(buffer)[offsetsStart:offsetsStart+8*(count+1)].cast('q')
+        self._blobStart = blobStart
+        self._count = count
+    def __len__(self):
+        return self._count
+    def __getitem__(self, j):
+        # Key j as UTF-8 bytes
+        start = self._blobStart+self._offsets[j]
+        end = self._blobStart+self._offsets[j+1]
+        return self._buffer[start:end]
+    def decode(self, j):
+        return self[j].decode('utf-8')
+    def strings(self):
+        # All the keys, decoded from one copy of the blob
+        offsets = self._offsets.tolist()
+        blob = self._buffer[self._blobStart:self._blobStart+offsets[-1]]
+        text = blob.decode('utf-8')
+        if len(text) == len(blob):
+            # ASCII blob, the byte offsets are also the character offsets
+            return [text[start:end] for start, end in zip(offsets, offsets[1:])]
+        return [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+class CompiledWordSet(frozenset):
+    # Set of the words of a compiled word list, with the item count of the original DWM25 loop
+    def __new__(cls, keys, header):
+        wordSet = super().__new__(cls, keys.strings())
+        wordSet.itemsRead = header['itemsRead']
+        return wordSet
+class CompiledAliasDict(dict):
+    # Mapping of alias to value of a compiled alias file
+    def __init__(self, keys, values, header):
+        super().__init__(zip(keys.strings(), values.strings()))
+
+
+# In[ ]:
+
+
+def parseWordList(fileName):
+    # Same reading rules as the original DWM25 loop, stops at the first blank line
+    words = {}
+    itemsRead = 1
+    with open(fileName,'r') as wordListFile:
+        word = wordListFile.readline().strip()
+        while word != '':
+            words[word] = ''
+            word = wordListFile.readline().strip()
+            itemsRead +=1
+    return sorted(words, key=lambda word: word.encode('utf-8')), [], {'itemsRead': itemsRead}
+def parseAliasFile(fileName):
+    # Same reading rules as the original DWM45 loop, a later line replaces an earlier alias
+    aliasDict = {}
+    with open(fileName, 'r') as aliasFile:
+        reader = csv.DictReader(aliasFile, delimiter='\t', fieldnames=['value', 'alias'])
+        for line in reader:
+            aliasDict[line['alias']]=line['value']
+    # Lines without an alias field give a None key that no token can match
+    aliasDict.pop(None, None)
+    keys = sorted(aliasDict, key=lambda alias: alias.encode('utf-8'))
+    return keys, [aliasDict[alias] for alias in keys], {}
+def sourceStat(fileName):
+    status = os.stat(fileName)
+    return [status.st_size, status.st_mtime_ns]
+
+
+# In[ ]:
+
+
+def packStrings(strings):
+    offsets = bytearray()
+    blob = bytearray()
+    offsets += (0).to_bytes(8, 'little', signed=True)
+    for string in strings:
+        blob += string.encode('utf-8')
+        offsets += len(blob).to_bytes(8, 'little', signed=True)
+    return bytes(offsets), bytes(blob)
+def compileResource(kind, sourceName, keys, values, extra):
+    # Layout: magic, header length, JSON header, then each section 8-byte aligned
+    sections = []
+    for strings in ([keys, values] if kind == 'alias' else [keys]):
+        sections.extend(packStrings(strings))
+    header = {'version': resourceVersion, 'kind': kind, 'source': os.path.abspath(sourceName),
+              'stat': sourceStat(sourceName), 'sha256': DWM12_RefCache.hashFile(sourceName), 'count': len(keys)}
+    header.update(extra)
+    position = 0
+    layout = []
+    for section in sections:
+        layout.append(position)
+        position += (len(section)+7)//8*8
+    header['layout'] = layout
+    headerBytes = json.dumps(header).encode('utf-8')
+    dataStart = (len(resourceMagic)+8+len(headerBytes)+7)//8*8
+    compiled = bytearray(resourceMagic)
+    compiled += len(headerBytes).to_bytes(8, 'little')
+    compiled += headerBytes
+    compiled += bytes(dataStart-len(compiled))
+    for section in sections:
+        compiled += section
+        compiled += bytes((len(section)+7)//8*8-len(section))
+    return bytes(compiled)
+def writeCompiled(path, compiled):
+    # Write to a temporary name first so a concurrent run never maps a partial file
+    tempPath = path+'.'+str(os.getpid())+'.tmp'
+    with open(tempPath, 'wb') as compiledFile:
+        compiledFile.write(compiled)
+    os.replace(tempPath, path)
+def parseCompiled(buffer):
+    # Returns (header, buffer, dataStart) or None if buffer is not a compiled resource
+    magicLen = len(resourceMagic)
+    if buffer[:magicLen] != resourceMagic:
+        return None
+    headerLen = int.from_bytes(buffer[magicLen:magicLen+8], 'little')
+    try:
+        header = json.loads(buffer[magicLen+8:magicLen+8+headerLen].decode('utf-8'))
+    except ValueError:
+        return None
+    dataStart = (magicLen+8+headerLen+7)//8*8
+    return header, buffer, dataStart
+def readCompiled(path):
+    # Memory-map a compiled file, None if it is missing or not a compiled resource
+    try:
+        with open(path, 'rb') as compiledFile:
+            buffer = mmap.mmap(compiledFile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    return parseCompiled(buffer)
+def isCurrent(header, kind, sourceName, stat):
+    if header.get('version') != resourceVersion or header.get('kind') != kind:
+        return False
+    if header.get('source') != os.path.abspath(sourceName):
+        return False
+    if header.get('stat') == stat:
+        return True
+    return header.get('sha256') == DWM12_RefCache.hashFile(sourceName)
+def compiledPath(sourceName):
+    # The folder part of the name keeps sources with the same file name in different folders apart
+    sourceKey = hashlib.sha256(os.path.abspath(sourceName).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(DWM10_Parms.resourceCacheDir, os.path.basename(sourceName)+'.'+sourceKey+compiledSuffix)
+def buildResource(kind, header, buffer, dataStart):
+    count = header['count']
+    layout = header['layout']
+    keys = CompiledKeys(buffer, dataStart+layout[0], count, dataStart+layout[1])
+    if kind == 'alias':
+        values = CompiledKeys(buffer, dataStart+layout[2], count, dataStart+layout[3])
+        return CompiledAliasDict(keys, values, header)
+    return CompiledWordSet(keys, header)
+
+
+# In[ ]:
+
+
+def saveCompiled(path, sourceName, compiledBytes):
+    # Returns the memory-mapped compiled file, or None if it could not be written
+    logFile = DWM10_Parms.logFile
+    try:
+        os.makedirs(DWM10_Parms.resourceCacheDir, exist_ok=True)
+        writeCompiled(path, compiledBytes)
+        print('Resource Compiled =', sourceName, '->', path)
+        print('Resource Compiled =', sourceName, '->', path, file=logFile)
+        return readCompiled(path)
+    except OSError as error:
+        # Without a writable resourceCacheDir the compiled form is only kept in memory
+        print('**Warning: Unable to save compiled resource', path, error)
+        print('**Warning: Unable to save compiled resource', path, error, file=logFile)
+        return None
+def resourceParts(kind, resource):
+    # (keys, values, extra) of a loaded resource, in the order of the parser output
+    keys = sorted(resource, key=lambda key: key.encode('utf-8'))
+    if kind == 'alias':
+        return keys, [resource[key] for key in keys], {}
+    return keys, [], {'itemsRead': resource.itemsRead}
+def loadResource(kind, sourceName, parser):
+    stat = sourceStat(sourceName)
+    sourceKey = os.path.abspath(sourceName)
+    loaded = loadedResources.get(sourceKey)
+    if loaded is not None and loaded[0] == stat:
+        return loaded[1]
+    path = compiledPath(sourceName)
+    compiled = readCompiled(path)
+    if compiled is not None and isCurrent(compiled[0], kind, sourceName, stat):
+        resource = buildResource(kind, *compiled)
+        if compiled[0]['stat'] != stat:
+            # Same content with a new size or modification time, save the new stat so the
+            # next run does not hash the source again
+            saveCompiled(path, sourceName, compileResource(kind, sourceName, *resourceParts(kind, resource)))
+    else:
+        compiledBytes = compileResource(kind, sourceName, *parser(sourceName))
+        compiled = saveCompiled(path, sourceName, compiledBytes)
+        if compiled is None:
+            compiled = parseCompiled(compiledBytes)
+        resource = buildResource(kind, *compiled)
+    loadedResources[sourceKey] = (stat, resource)
+    return resource
+def loadWordList(fileName='DWM_WordList.txt'):
+    return loadResource('wordList', fileName, parseWordList)
+def loadAliasDict(fileName='alias.dat'):
+    return loadResource('alias', fileName, parseAliasFile)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import os
+import pickle
+import hashlib
+import DWM10_Parms
+# Persistent cache of the DWM14 refDict (after DWM17 when canonicalizeAliases is True) and DWM16
+# tokenFreqDict. Entries are keyed by the content hash of the input file and the parameters that
+# change tokenization, so a list of parms files that only vary blocking, linking or cluster
+# parameters tokenizes the input once.
+# Increase the version whenever the tokenizer output or the entry layout changes.
+cacheVersion = 3
+cacheSuffix = '.pkl'
+# DWM16 statistics saved with each entry and restored to DWM10_Parms on a hit
+statNames = ['refCnt', 'tokenCnt', 'uniqueTokenCnt', 'uniqueTokenRatio', 'numTokenCnt', 'numTokenRatio',
+             'minFreq', 'maxFreq', 'avgFreq', 'stdFreq', 'minLen', 'maxLen', 'avgLen', 'stdDevLen']
+
+
+# In[ ]:
+
+
+def hashFile(fileName):
+    hasher = hashlib.sha256()
+    with open(fileName, 'rb') as inputFile:
+        while True:
+            chunk = inputFile.read(1 << 20)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+def buildCacheKey():
+    hasher = hashlib.sha256()
+    hasher.update(hashFile(DWM10_Parms.inputFileName).encode('ascii'))
+    settings = [cacheVersion, DWM10_Parms.delimiter, DWM10_Parms.hasHeader,
+                DWM10_Parms.tokenizerType, DWM10_Parms.removeDuplicateTokens, DWM10_Parms.canonicalizeAliases]
+    hasher.update(repr(settings).encode('utf-8'))
+    if DWM10_Parms.canonicalizeAliases:
+        # DWM17 rewrites the cached refDict with the alias file
+        hasher.update(hashFile('alias.dat').encode('ascii'))
+    return hasher.hexdigest()
+def entryPath(cacheKey):
+    return os.path.join(DWM10_Parms.refCacheDir, cacheKey+cacheSuffix)
+
+
+# In[ ]:
+
+
+def lookup():
+    # Returns (cacheKey, entry), entry is None on a miss, both are None when the cache is off
+    if not DWM10_Parms.useRefCache:
+        return None, None
+    logFile = DWM10_Parms.logFile
+    print('\n>>Starting DWM12')
+    print('\n>>Starting DWM12', file=logFile)
+    cacheKey = buildCacheKey()
+    path = entryPath(cacheKey)
+    entry = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as cacheFile:
+                entry = pickle.load(cacheFile)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            entry = None
+    if entry is None:
+        print('Reference Cache Miss, key =', cacheKey)
+        print('Reference Cache Miss, key =', cacheKey, file=logFile)
+        return cacheKey, None
+    # Refresh modification time so eviction removes least recently used entries first
+    os.utime(path)
+    for name in statNames:
+        setattr(DWM10_Parms, name, entry['stats'][name])
+    print('Reference Cache Hit, key =', cacheKey)
+    print('Reference Cache Hit, key =', cacheKey, file=logFile)
+    print('Total References Loaded =', len(entry['refDict']))
+    print('Total References Loaded =', len(entry['refDict']), file=logFile)
+    print('Total Unique Tokens Loaded =', len(entry['tokenFreqDict']))
+    print('Total Unique Tokens Loaded =', len(entry['tokenFreqDict']), file=logFile)
+    return cacheKey, entry
+def store(cacheKey, refDict, tokenFreqDict):
+    if cacheKey is None:
+        return
+    logFile = DWM10_Parms.logFile
+    os.makedirs(DWM10_Parms.refCacheDir, exist_ok=True)
+    entry = {'refDict': refDict,
+             'tokenFreqDict': tokenFreqDict,
+             'stats': {name: getattr(DWM10_Parms, name) for name in statNames}}
+    path = entryPath(cacheKey)
+    # Write to a temporary name first so a concurrent run never loads a partial entry
+    tempPath = path+'.'+str(os.getpid())+'.tmp'
+    with open(tempPath, 'wb') as cacheFile:
+        pickle.dump(entry, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tempPath, path)
+    print('Reference Cache Entry Saved =', path)
+    print('Reference Cache Entry Saved =', path, file=logFile)
+    evictCacheEntries(path)
+def evictCacheEntries(keepPath):
+    # Remove least recently used entries until the cache fits in refCacheMaxMB
+    logFile = DWM10_Parms.logFile
+    cacheDir = DWM10_Parms.refCacheDir
+    maxBytes = DWM10_Parms.refCacheMaxMB*1024*1024
+    entries = []
+    totalBytes = 0
+    for fileName in os.listdir(cacheDir):
+        if not fileName.endswith(cacheSuffix):
+            continue
+        path = os.path.join(cacheDir, fileName)
+        try:
+            status = os.stat(path)
+        except OSError:
+            continue
+        entries.append((status.st_mtime, path, status.st_size))
+        totalBytes += status.st_size
+    entries.sort()
+    evictCnt = 0
+    for mtime, path, size in entries:
+        if totalBytes <= maxBytes:
+            break
+        if path == keepPath:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        totalBytes -= size
+        evictCnt += 1
+    if evictCnt > 0:
+        print('Reference Cache Entries Evicted =', evictCnt)
+        print('Reference Cache Entries Evicted =', evictCnt, file=logFile)
+    if totalBytes > maxBytes:
+        print('**Warning: Reference Cache exceeds refCacheMaxMB =', DWM10_Parms.refCacheMaxMB)
+        print('**Warning: Reference Cache exceeds refCacheMaxMB =', DWM10_Parms.refCacheMaxMB, file=logFile)
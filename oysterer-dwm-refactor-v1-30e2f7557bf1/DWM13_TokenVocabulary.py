@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import re
+import numpy as np
+# TokenVocabulary interns every distinct token to an integer ID. Reference token lists keep
+# their strings, which DWM25, DWM45 and DWM46 edit and the comparators and data capture read
+# with ==. The driver interns refDict after DWM14, which also keeps the token ID array of every
+# reference, and interns again only the references edited by DWM25, DWM45 and DWM46. The
+# blocking and filter stages read the kept arrays (refTokenIDs, encodeRefs) instead of looking
+# every token up again, so the tokens are only hashed when a reference is interned. Stages
+# that filter tokens look up per-ID arrays (length, numeric flag, frequency) instead of
+# testing each token string. The frequency array is kept until the version of tokenFreqDict
+# changes.
+# A token with a digit starts the address part of a reference, same rule as DWM95 and DWM_DataCapture
+digitRe = re.compile(r'\d')
+class TokenVocabulary:
+    def __init__(self):
+        # tokenIDs maps token -> ID, tokens maps ID -> token
+        self.tokenIDs = {}
+        self.tokens = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._numeric = np.zeros(0, dtype=bool)
+        self._digit = np.zeros(0, dtype=bool)
+        # (tokenFreqDict, version, frequency array) of the last frequencyArray call
+        self._freqCache = None
+        # The interned refDict and the token ID array of each of its references
+        self.refDict = None
+        self.refIDArrays = {}
+    def __len__(self):
+        return len(self.tokens)
+    def __contains__(self, token):
+        return token in self.tokenIDs
+    def intern(self, token):
+        # Return the ID of token, adding it to the vocabulary if it is new
+        tokenID = self.tokenIDs.get(token)
+        if tokenID is None:
+            tokenID = len(self.tokens)
+            self.tokenIDs[token] = tokenID
+            self.tokens.append(token)
+        return tokenID
+    def internTokenList(self, tokenList):
+        # Replace each token of the list, in place, by the vocabulary's string object,
+        # returns the token ID array of the list
+        tokens = self.tokens
+        tokenIDs = self.encode(tokenList)
+        for j, tokenID in enumerate(tokenIDs):
+            tokenList[j] = tokens[tokenID]
+        return np.array(tokenIDs, dtype=np.int64)
+    def internRefDict(self, refDict):
+        self.refDict = refDict
+        self.refIDArrays = {}
+        self.internRefs(refDict, refDict)
+    def internRefs(self, refIDs, refDict):
+        # Intern again the references edited after internRefDict, refDict can be a new dictionary
+        # holding the same token lists for the other references, like the one returned by DWM25
+        self.refDict = refDict
+        refIDArrays = self.refIDArrays
+        for refID in refIDs:
+            refIDArrays[refID] = self.internTokenList(refDict[refID])
+    def refTokenIDs(self, refID, refDict):
+        # Token ID array of a reference, the kept one when refDict is the interned refDict
+        if refDict is self.refDict:
+            tokenIDs = self.refIDArrays.get(refID)
+            if tokenIDs is not None:
+                return tokenIDs
+        return np.array(self.encode(refDict[refID]), dtype=np.int64)
+    def encode(self, tokenList):
+        intern = self.intern
+        return [intern(token) for token in tokenList]
+    def decode(self, tokenIDs):
+        tokens = self.tokens
+        return [tokens[tokenID] for tokenID in tokenIDs]
+    def encodeRefs(self, refIDs, refDict):
+        # The token ID arrays of the references listed in refIDs as one flat ID array
+        # Returns (flatIDs, offsets) where the tokens of refIDs[j] are flatIDs[offsets[j]:offsets[j+1]]
+        arrays = [self.refTokenIDs(refID, refDict) for refID in refIDs]
+        offsets = np.zeros(len(arrays)+1, dtype=np.int64)
+        np.cumsum([len(tokenIDs) for tokenIDs in arrays], out=offsets[1:])
+        if len(arrays) == 0:
+            return np.zeros(0, dtype=np.int64), offsets
+        return np.concatenate(arrays), offsets
+    def _extend(self):
+        known = len(self._lengths)
+        if known < len(self.tokens):
+            newTokens = self.tokens[known:]
+            self._lengths = np.concatenate((self._lengths, np.array([len(token) for token in newTokens], dtype=np.int32)))
+            self._numeric = np.concatenate((self._numeric, np.array([token.isdigit() for token in newTokens], dtype=bool)))
+            self._digit = np.concatenate((self._digit, np.array([digitRe.search(token) is not None for token in newTokens], dtype=bool)))
+    def tokenLengths(self):
+        # Array of token length indexed by ID
+        self._extend()
+        return self._lengths
+    def numericFlags(self):
+        # Array indexed by ID, True when the token is all digits
+        self._extend()
+        return self._numeric
+    def digitFlags(self):
+        # Array indexed by ID, True when the token has a digit
+        self._extend()
+        return self._digit
+    def addressFlags(self, flatIDs, offsets):
+        # For the output of encodeRefs, True for the tokens in the address part of their reference,
+        # from the first token with a digit to the end
+        hasDigit = self.digitFlags()[flatIDs].astype(np.int64)
+        digitCnts = np.cumsum(hasDigit)
+        refStarts = np.repeat(offsets[:-1], np.diff(offsets))
+        digitsBefore = np.concatenate(([0], digitCnts))[refStarts]
+        return digitCnts > digitsBefore
+    def frequencyArray(self, tokenFreqDict):
+        # Read-only array of token frequency indexed by ID, 0 for tokens missing from tokenFreqDict
+        version = getattr(tokenFreqDict, 'version', None)
+        cache = self._freqCache
+        if version is not None and cache is not None and cache[0] is tokenFreqDict and cache[1] == version:
+            freq = cache[2]
+            if len(freq) < len(self.tokens):
+                # Tokens interned since, every key of tokenFreqDict already had an ID
+                freq = np.concatenate((freq, np.zeros(len(self.tokens)-len(freq), dtype=np.int64)))
+                freq.flags.writeable = False
+                self._freqCache = (tokenFreqDict, version, freq)
+            return freq
+        tokenIDs = self.encode(tokenFreqDict)
+        freq = np.zeros(len(self.tokens), dtype=np.int64)
+        freq[tokenIDs] = list(tokenFreqDict.values())
+        freq.flags.writeable = False
+        if version is not None:
+            self._freqCache = (tokenFreqDict, version, freq)
+        return freq
+    def tokenSet(self, mask):
+        # Set of the tokens whose ID is True in mask
+        tokens = self.tokens
+        return {tokens[tokenID] for tokenID in np.flatnonzero(mask)}
+
+
+# In[ ]:
+
+
+# Vocabulary shared by all stages of the current parms file run
+vocabulary = TokenVocabulary()
+def resetVocabulary():
+    global vocabulary
+    vocabulary = TokenVocabulary()
+    return vocabulary
+def getVocabulary():
+    return vocabulary
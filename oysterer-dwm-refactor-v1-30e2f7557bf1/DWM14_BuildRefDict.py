@@ -4,71 +4,17 @@
 # In[ ]:
 
 
+import io
 import re
 import sys
-import numpy as np
-import operator
+import mmap
+import locale
 import DWM10_Parms
+import DWM20_TokenizerFunctions
+import DWM_Parallel
+# A line ends at \r\n, \r or \n, the same terminators as universal newlines mode
+_lineEndRe = re.compile(rb'\r\n|\r|\n')
 def tokenizeInput():
-    #***********Inner Function*******************************
-    #Replace delimiter with blanks, then compress token by replacing non-word characters with null
-    def tokenizerCompress(string):
-        string = string.upper()
-        string = string.replace(delimiter,' ')
-        tokenList = re.split('[\s]+',string)
-        newList = []
-        for token in tokenList:
-            newToken = re.sub('[\W]+','',token)
-            if len(newToken)>0:
-                newList.append(newToken)
-        return newList
-    #***********Inner Function*******************************
-    #Replace all non-words characters with blanks, then split on blanks
-    def tokenizerSplitter(string):
-        string = string.upper()
-        string = re.sub('[\W]+',' ',string)
-        tokenList = re.split('[\s]+',string)
-        newList = []
-        for token in tokenList:
-            if len(token)>0:
-                newList.append(token)
-        return newList
-    #***********Inner Function*******************************
-    #Replace delimiter with blanks, then compress token by replacing non-word characters with null
-    def tokenizerCompressNbr(string):
-        string = string.upper()
-        print('=====tokenizerCompressNbr')
-        print('string=',string)
-        fieldList = re.split(delimiter,string)
-        print('fieldList=',fieldList)
-        newList = []
-        for fieldValue in fieldList:
-            print('fieldValue=',fieldValue)          
-            tokenList = fieldValue.split()
-            print('tokenList=',tokenList)
-            nbr = False
-            listLen = len(tokenList)
-            print('listLen=',listLen)
-            newToken =''
-            for j in range(listLen):
-                token = tokenList[j]
-                print('token=', token)
-                token = re.sub('[\W]+','',token) 
-                print('token=',token)
-                if token.isdigit():
-                    nbr = True
-                    newToken = newToken + token
-                else:
-                    if nbr:
-                        newList.append(newToken)
-                        newToken = ''
-                        nbr = False
-                    newList.append(token)
-            if nbr:
-                newList.append(newToken)
-        print('newList=', newList)
-        return newList
-    #***********Outer Main Function*******************************
     # Start of Main Tokenizer Function
     logFile = DWM10_Parms.logFile
     print('\n>> Starting DWM14')
@@ -89,30 +35,44 @@ def tokenizeInput():
     removeDuplicateTokens = DWM10_Parms.removeDuplicateTokens
     print('Remove Duplicate Reference Tokens =',removeDuplicateTokens)
     print('Remove Duplicate Reference Tokens =',removeDuplicateTokens, file=logFile)
-    goodType = False
-    if tokenizerType=='Splitter':
-        tokenizerFunction = tokenizerSplitter
-        goodType = True
-    if tokenizerType=='Compress':
-        tokenizerFunction = tokenizerCompress
-        goodType = True
-    if tokenizerType=='CompressNbr':
-        tokenizerFunction = tokenizerCompressNbr
-        goodType = True        
-    if goodType == False:
+    tokenizerFunction = DWM20_TokenizerFunctions.getTokenizer(tokenizerType, delimiter)
+    if tokenizerFunction is None:
         print('**Error: Invalid Parameter value for tokenizerType ',tokenizerType)
         sys.exit()
-    # Read input file and build reference dictionary (refDict)
-    inputFile= open(inputFileName,'r')
+    ingestWorkers = DWM10_Parms.ingestWorkers
+    pool = DWM_Parallel.get_pool(ingestWorkers)
+    if pool is not None:
+        # Tokenize byte-range shards of the file in parallel
+        print('Parallel Ingest Workers =', ingestWorkers)
+        print('Parallel Ingest Workers =', ingestWorkers, file=logFile)
+        with pool:
+            refCnt, tokenCnt, shardCnt = tokenizeShards(pool, ingestWorkers, inputFileName, hasHeader,
+                                                        tokenizerType, delimiter, removeDuplicateTokens, refDict)
+        print('Input Shards Tokenized =', shardCnt)
+        print('Input Shards Tokenized =', shardCnt, file=logFile)
+    else:
+        # Read input file and build reference dictionary (refDict)
+        inputFile= open(inputFileName,'r')
+        # skip header record
+        if hasHeader:
+            inputFile.readline()
+        refCnt, tokenCnt = tokenizeLines(inputFile, tokenizerFunction, delimiter, removeDuplicateTokens, refDict)
+        inputFile.close()
+    print('Total References Read=',refCnt)
+    print('Total References Read=',refCnt, file=logFile)
+    print('Total Tokens Found =',tokenCnt)
+    print('Total Tokens Found =',tokenCnt, file=logFile)
+    return refDict
+
+
+# In[ ]:
+
+
+def tokenizeLines(lines, tokenizerFunction, delimiter, removeDuplicateTokens, refDict):
+    # Tokenize an iterable of input lines into refDict, returns (refCnt, tokenCnt)
     refCnt = 0
-    # skip header record
-    if hasHeader:
-        line = inputFile.readline()
-    line = inputFile.readline()
     tokenCnt = 0
-    tokensOut = 0
-    tokenFreqCount = []
-    while line !='':
+    for line in lines:
         refCnt +=1
         line = line.strip()
         # assume first token is the reference identifier (refID)
@@ -123,13 +83,64 @@ def tokenizeInput():
         tokenCnt = tokenCnt + len(tokenList)
         if removeDuplicateTokens:
             tokenList = list(dict.fromkeys(tokenList))
-        tokensOut = tokensOut + len(tokenList)
-        refDict[refID] = tokenList          
-        line = inputFile.readline()
-    inputFile.close()
-    print('Total References Read=',refCnt)
-    print('Total References Read=',refCnt, file=logFile)
-    print('Total Tokens Found =',tokenCnt)
-    print('Total Tokens Found =',tokenCnt, file=logFile)
-    return refDict
+        refDict[refID] = tokenList
+    return refCnt, tokenCnt
+
+
+# In[ ]:
+
+
+def findShardBounds(data, start, shardCnt):
+    # Split data[start:] into at most shardCnt byte ranges that begin at line boundaries
+    size = len(data)
+    bounds = [start]
+    for j in range(1, shardCnt):
+        target = start + j*(size-start)//shardCnt
+        if target <= bounds[-1]:
+            continue
+        # the shard boundary is the end of the line containing the byte before target
+        match = _lineEndRe.search(data, target-1)
+        if match is None:
+            break
+        bound = match.end()
+        if bound > bounds[-1] and bound < size:
+            bounds.append(bound)
+    bounds.append(size)
+    return [(bounds[j], bounds[j+1]) for j in range(len(bounds)-1) if bounds[j] < bounds[j+1]]
+def tokenizeShard(inputFileName, begin, end, tokenizerType, delimiter, removeDuplicateTokens, encoding):
+    # Worker function, tokenizes the lines in bytes [begin, end) of the input file
+    with open(inputFileName, 'rb') as inputFile:
+        with mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[begin:end].decode(encoding)
+    # newline=None gives the same line splitting as reading the file in text mode
+    lines = io.StringIO(text, newline=None)
+    tokenizerFunction = DWM20_TokenizerFunctions.getTokenizer(tokenizerType, delimiter)
+    shardDict = {}
+    refCnt, tokenCnt = tokenizeLines(lines, tokenizerFunction, delimiter, removeDuplicateTokens, shardDict)
+    return shardDict, refCnt, tokenCnt
+def tokenizeShards(pool, shardCnt, inputFileName, hasHeader, tokenizerType, delimiter, removeDuplicateTokens, refDict):
+    # Tokenize the input file in shards and merge them into refDict in file order
+    encoding = locale.getpreferredencoding(False)
+    with open(inputFileName, 'rb') as inputFile:
+        if len(inputFile.read(1)) == 0:
+            return 0, 0, 0
+        with mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            # skip header record
+            if hasHeader:
+                match = _lineEndRe.search(data, 0)
+                start = match.end() if match is not None else len(data)
+            shards = findShardBounds(data, start, shardCnt)
+    futures = [pool.submit(tokenizeShard, inputFileName, begin, end, tokenizerType, delimiter,
+                           removeDuplicateTokens, encoding) for begin, end in shards]
+    refCnt = 0
+    tokenCnt = 0
+    for future in futures:
+        shardDict, shardRefCnt, shardTokenCnt = future.result()
+        # a refID repeated in a later shard keeps its first position and takes the later tokens,
+        # exactly as the serial path assigning refDict[refID] line by line
+        refDict.update(shardDict)
+        refCnt += shardRefCnt
+        tokenCnt += shardTokenCnt
+    return refCnt, tokenCnt, len(shards)
 
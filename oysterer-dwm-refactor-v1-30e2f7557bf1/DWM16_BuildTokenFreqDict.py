@@ -4,131 +4,204 @@
 # In[1]:
 
 
-import re
-import sys
+import heapq
 import numpy as np
 import operator
 import math
 import DWM10_Parms
+import DWM13_TokenVocabulary
+
+# TokenFrequencyIndex is the tokenFreqDict passed between stages, a dictionary where
+# key=token, value=token frequency. It also keeps the token length histogram and the
+# frequency histogram current, so DWM25 and DWM45 update it with deltas as they replace,
+# insert or delete tokens and the statistics are reported without rebuilding from refDict.
+class TokenFrequencyIndex(dict):
+    def __init__(self):
+        super().__init__()
+        self.refCnt = 0
+        self.tokenCnt = 0
+        self.numTokenCnt = 0
+        # tokenLenDict, key=token length, value=number of token occurrences with that length
+        self.tokenLenDict = {}
+        # freqCountDict, key=frequency, value=number of distinct tokens with that frequency
+        self.freqCountDict = {}
+        # version increases with every update, so users of the frequencies can tell they changed
+        self.version = 0
+    def _moveFreq(self, oldFreq, newFreq):
+        freqCountDict = self.freqCountDict
+        if oldFreq > 0:
+            if freqCountDict[oldFreq] == 1:
+                del freqCountDict[oldFreq]
+            else:
+                freqCountDict[oldFreq] -= 1
+        if newFreq > 0:
+            freqCountDict[newFreq] = freqCountDict.get(newFreq, 0) + 1
+    def _countOccurrences(self, token, count):
+        self.tokenCnt += count
+        if token.isdigit():
+            self.numTokenCnt += count
+        tokenLen = len(token)
+        newLenCnt = self.tokenLenDict.get(tokenLen, 0) + count
+        if newLenCnt > 0:
+            self.tokenLenDict[tokenLen] = newLenCnt
+        else:
+            del self.tokenLenDict[tokenLen]
+    def addToken(self, token, count=1):
+        oldFreq = self.get(token, 0)
+        newFreq = oldFreq + count
+        self[token] = newFreq
+        self.version += 1
+        self._moveFreq(oldFreq, newFreq)
+        self._countOccurrences(token, count)
+    def removeToken(self, token, count=1):
+        oldFreq = self.get(token, 0)
+        if oldFreq == 0:
+            return
+        count = min(count, oldFreq)
+        newFreq = oldFreq - count
+        if newFreq == 0:
+            del self[token]
+        else:
+            self[token] = newFreq
+        self.version += 1
+        self._moveFreq(oldFreq, newFreq)
+        self._countOccurrences(token, -count)
+    def replaceToken(self, oldToken, newToken):
+        if oldToken == newToken:
+            return
+        self.removeToken(oldToken)
+        self.addToken(newToken)
+    def reportStatistics(self):
+        # Print the token statistics and save them in DWM10_Parms for DWM100
+        logFile = DWM10_Parms.logFile
+        refCnt = self.refCnt
+        tokenCnt = self.tokenCnt
+        numTokenCnt = self.numTokenCnt
+        tokenFreqDict = self
+        tokenLenDict = self.tokenLenDict
+        print('Total References Read=',refCnt)
+        print('Total References Read=',refCnt, file=logFile)    
+        DWM10_Parms.refCnt=refCnt
+        print('Total Tokens Found =',tokenCnt)
+        print('Total Tokens Found =',tokenCnt, file=logFile)  
+        DWM10_Parms.tokenCnt=tokenCnt
+        uniqueTokenCnt = len(tokenFreqDict)
+        print('Total Unique Tokens =', uniqueTokenCnt)
+        print('Total Unique Tokens =', uniqueTokenCnt, file=logFile)     
+        DWM10_Parms.uniqueTokenCnt=uniqueTokenCnt
+        uniqueTokenRatio = uniqueTokenCnt/tokenCnt
+        uniqueTokenRatio = round(uniqueTokenRatio, 4)
+        print('Unique Token Ratio =',uniqueTokenRatio)
+        print('Unique Token Ratio =',uniqueTokenRatio, file=logFile)    
+        DWM10_Parms.uniqueTokenRatio=uniqueTokenRatio   
+        print('Total Numeric Tokens Found =',numTokenCnt)
+        print('Total Numeric Tokens Found =',numTokenCnt, file=logFile)    
+        DWM10_Parms.numTokenCnt=numTokenCnt
+        numTokenRatio = numTokenCnt/tokenCnt
+        numTokenRatio = round(numTokenRatio, 4)
+        print('Numeric Token Ratio =',numTokenRatio)
+        print('Numeric Token Ratio =',numTokenRatio, file=logFile)    
+        DWM10_Parms.numTokenRatio=numTokenRatio
+        # minimum, maximum, average and standard deviation come from the frequency histogram
+        minFreq = min(self.freqCountDict)
+        print('Minimum Token Frequency =', str(minFreq))
+        print('Minimum Token Frequency =', str(minFreq), file=logFile)    
+        DWM10_Parms.minFreq=minFreq
+        maxFreq = max(self.freqCountDict)
+        print('Maximum Token Frequency =', str(maxFreq))
+        print('Maximum Token Frequency =', str(maxFreq), file=logFile)    
+        DWM10_Parms.maxFreq=maxFreq
+        # nlargest gives the same ten tokens, in the same order, as a full descending sort
+        topIndex = heapq.nlargest(10, tokenFreqDict.items(), key=operator.itemgetter(1))
+        print('Top Ten Tokens by Freqency')
+        for pairJ in topIndex:
+            wordJ = pairJ[0]
+            freqJ = pairJ[1]
+            print('  Token=', wordJ, 'Frequency=', freqJ)
+            print('  Token=', wordJ, 'Frequency=', freqJ, file=logFile)
+        totalFreq = 0
+        totalFreq2 = 0
+        for freq, cnt in self.freqCountDict.items():
+            totalFreq += freq*cnt
+            totalFreq2 += freq*freq*cnt
+        avgFreq = totalFreq/uniqueTokenCnt
+        avgFreq = round(avgFreq, 4)
+        print('Average Token Frequency =', str(avgFreq))
+        print('Average Token Frequency =', str(avgFreq), file=logFile)    
+        DWM10_Parms.avgFreq=avgFreq
+        # population standard deviation, same as numpy std of the frequency list
+        stdFreq = (uniqueTokenCnt*totalFreq2 - totalFreq*totalFreq)/(uniqueTokenCnt*uniqueTokenCnt)
+        stdFreq = math.sqrt(stdFreq)
+        stdFreq = round(stdFreq, 4)
+        print('Standard Deviation of Token Frequency =', str(stdFreq))
+        print('Standard Deviation of Token Frequency =', str(stdFreq), file=logFile)    
+        DWM10_Parms.stdFreq=stdFreq
+        # Calculations for token lengths from dictionary
+        totalF = 0
+        totalFxL = 0
+        totalFxL2 = 0
+        maxLen = 0
+        minLen = 999
+        for key in tokenLenDict:
+            if key>maxLen:
+                maxLen = key
+            if key<minLen:
+                minLen = key
+            freq = tokenLenDict[key]
+            totalF += freq
+            totalFxL += freq*key
+            totalFxL2 += freq*key*key
+        avgLen = totalFxL/totalF
+        avgLen = round(avgLen, 4)
+        stdDevLen = (totalF*totalFxL2 - totalFxL*totalFxL)/(totalF*(totalF-1))
+        stdDevLen = math.sqrt(stdDevLen)
+        stdDevLen = round(stdDevLen, 4)
+        print('Minimum Token Length =', str(minLen))
+        print('Minimum Token Length =', str(minLen), file=logFile)    
+        DWM10_Parms.minLen=minLen
+        print('Maximum Token Length =', str(maxLen))
+        print('Maximum Token Length =', str(maxLen), file=logFile)    
+        DWM10_Parms.maxLen=maxLen    
+        print('Average Token Length =', str(avgLen))
+        print('Average Token Length =', str(avgLen), file=logFile)    
+        DWM10_Parms.avgLen=avgLen
+        print('Stardard Devation of Token Length =', str(stdDevLen))
+        print('Stardard Devation of Token Length =', str(stdDevLen), file=logFile)    
+        DWM10_Parms.stdDevLen=stdDevLen
+
+
+# In[ ]:
+
 
 def buildTokenFreqDict(refDict):
+    # Full build of the TokenFrequencyIndex, only needed when refDict is first loaded
     logFile = DWM10_Parms.logFile
     print('\n>> Starting DWM16')
     print('\n>> Starting DWM16', file=logFile)    
-    tokenCnt = 0
-    refCnt = 0
-    numTokenCnt = 0
-    tokenFreqDict = {}
-    tokenLenDict = {}
-    for key in refDict:
-        refCnt +=1
-        tokenList = refDict[key]
-        tokenCnt = tokenCnt + len(tokenList)
-        for j in range(0, len(tokenList)):
-            token = tokenList[j]
-            if token.isdigit():
-                numTokenCnt += 1
-            if token in tokenFreqDict:
-                tokenFreqDict[token] += 1
-            else:
-                tokenFreqDict[token] = 1
-            tokenLen = len(token)
-            if tokenLen in tokenLenDict:
-                tokenLenDict[tokenLen] += 1
-            else:
-                tokenLenDict[tokenLen] = 1
-    
-    print('Total References Read=',refCnt)
-    print('Total References Read=',refCnt, file=logFile)    
-    DWM10_Parms.refCnt=refCnt
-    print('Total Tokens Found =',tokenCnt)
-    print('Total Tokens Found =',tokenCnt, file=logFile)  
-    DWM10_Parms.tokenCnt=tokenCnt
-    uniqueTokenCnt = len(tokenFreqDict)
-    print('Total Unique Tokens =', uniqueTokenCnt)
-    print('Total Unique Tokens =', uniqueTokenCnt, file=logFile)     
-    DWM10_Parms.uniqueTokenCnt=uniqueTokenCnt
-    uniqueTokenRatio = uniqueTokenCnt/tokenCnt
-    uniqueTokenRatio = round(uniqueTokenRatio, 4)
-    print('Unique Token Ratio =',uniqueTokenRatio)
-    print('Unique Token Ratio =',uniqueTokenRatio, file=logFile)    
-    DWM10_Parms.uniqueTokenRatio=uniqueTokenRatio   
-    print('Total Numeric Tokens Found =',numTokenCnt)
-    print('Total Numeric Tokens Found =',numTokenCnt, file=logFile)    
-    DWM10_Parms.numTokenCnt=numTokenCnt
-    numTokenRatio = numTokenCnt/tokenCnt
-    numTokenRatio = round(numTokenRatio, 4)
-    print('Numeric Token Ratio =',numTokenRatio)
-    print('Numeric Token Ratio =',numTokenRatio, file=logFile)    
-    DWM10_Parms.numTokenRatio=numTokenRatio
-    # Build a list of token frequencies from dictionary
-    tokenFreqCount = list(tokenFreqDict.values())
-    # numpy functions that directly calculates minimum, maximum, average and standard deviation
-    minFreq = min(tokenFreqCount)
-    print('Minimum Token Frequency =', str(minFreq))
-    print('Minimum Token Frequency =', str(minFreq), file=logFile)    
-    DWM10_Parms.minFreq=minFreq
-    maxFreq = max(tokenFreqCount)
-    print('Maximum Token Frequency =', str(maxFreq))
-    print('Maximum Token Frequency =', str(maxFreq), file=logFile)    
-    DWM10_Parms.maxFreq=maxFreq
-    sortedIndex = sorted(tokenFreqDict.items(),reverse=True, key=operator.itemgetter(1))
-    sortLen = len(sortedIndex)
-    if sortLen<10:
-        top = sortLen
-    else:
-        top = 10
-    print('Top Ten Tokens by Freqency')
-    for j in range(0,top):
-        pairJ = sortedIndex[j]
-        wordJ = pairJ[0]
-        lenJ = len(wordJ)
-        freqJ = pairJ[1]
-        print('  Token=', wordJ, 'Frequency=', freqJ)
-        print('  Token=', wordJ, 'Frequency=', freqJ, file=logFile)
-    avgFreq = np.mean(np.array(tokenFreqCount))
-    avgFreq = round(avgFreq, 4)
-    print('Average Token Frequency =', str(avgFreq))
-    print('Average Token Frequency =', str(avgFreq), file=logFile)    
-    DWM10_Parms.avgFreq=avgFreq
-    stdFreq = np.std(np.array(tokenFreqCount))
-    stdFreq = round(stdFreq, 4)
-    print('Standard Deviation of Token Frequency =', str(stdFreq))
-    print('Standard Deviation of Token Frequency =', str(stdFreq), file=logFile)    
-    DWM10_Parms.stdFreq=stdFreq
-    # Calculations for token lengths from dictionary
-    totalF = 0
-    totalFxL = 0
-    totalFxL2 = 0
-    maxLen = 0
-    minLen = 999
-    for key in tokenLenDict:
-        if key>maxLen:
-            maxLen = key
-        if key<minLen:
-            minLen = key
-        freq = tokenLenDict[key]
-        totalF += freq
-        totalFxL += freq*key
-        totalFxL2 += freq*key*key
-    avgLen = totalFxL/totalF
-    avgLen = round(avgLen, 4)
-    stdDevLen = (totalF*totalFxL2 - totalFxL*totalFxL)/(totalF*(totalF-1))
-    stdDevLen = math.sqrt(stdDevLen)
-    stdDevLen = round(stdDevLen, 4)
-    print('Minimum Token Length =', str(minLen))
-    print('Minimum Token Length =', str(minLen), file=logFile)    
-    DWM10_Parms.minLen=minLen
-    print('Maximum Token Length =', str(maxLen))
-    print('Maximum Token Length =', str(maxLen), file=logFile)    
-    DWM10_Parms.maxLen=maxLen    
-    print('Average Token Length =', str(avgLen))
-    print('Average Token Length =', str(avgLen), file=logFile)    
-    DWM10_Parms.avgLen=avgLen
-    print('Stardard Devation of Token Length =', str(stdDevLen))
-    print('Stardard Devation of Token Length =', str(stdDevLen), file=logFile)    
-    DWM10_Parms.stdDevLen=stdDevLen
-    
+    # Count tokens by vocabulary ID instead of hashing every token occurrence
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    flatIDs = vocabulary.encodeRefs(refDict, refDict)[0]
+    counts = np.bincount(flatIDs, minlength=len(vocabulary))
+    # tokenFreqDict lists tokens in order of first occurrence, ties in frequency sorts depend on it
+    uniqueIDs, firstIndex = np.unique(flatIDs, return_index=True)
+    orderedIDs = uniqueIDs[np.argsort(firstIndex, kind='stable')]
+    tokenFreqDict = TokenFrequencyIndex()
+    tokenFreqDict.update(zip(vocabulary.decode(orderedIDs.tolist()), counts[orderedIDs].tolist()))
+    tokenFreqDict.refCnt = len(refDict)
+    tokenFreqDict.tokenCnt = len(flatIDs)
+    tokenFreqDict.numTokenCnt = int(counts[vocabulary.numericFlags()].sum())
+    lenCounts = np.bincount(vocabulary.tokenLengths()[flatIDs])
+    for tokenLen in np.flatnonzero(lenCounts).tolist():
+        tokenFreqDict.tokenLenDict[tokenLen] = int(lenCounts[tokenLen])
+    freqCounts = np.bincount(counts[orderedIDs])
+    for freq in np.flatnonzero(freqCounts).tolist():
+        tokenFreqDict.freqCountDict[freq] = int(freqCounts[freq])
+    tokenFreqDict.reportStatistics()
+    return tokenFreqDict
+def updateTokenFreqDict(tokenFreqDict, stageName):
+    # Report the statistics of an index that was updated in place by stageName
+    logFile = DWM10_Parms.logFile
+    print('\n>> DWM16 statistics after', stageName)
+    print('\n>> DWM16 statistics after', stageName, file=logFile)
+    tokenFreqDict.reportStatistics()
     return tokenFreqDict
-
-
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import csv
+import DWM10_Parms
+import DWM13_TokenVocabulary
+# Alias canonicalization run by the driver right after DWM14 when canonicalizeAliases is True.
+# Each alias.dat row gives a value and one of its aliases (nicknames), e.g. AARON and RON. Only
+# the aliases that name a single value are used, RON is also an alias of RONALD and BILL of
+# WILLIAM and WILLIS, so they are left as they are, and so is an alias that is itself a value
+# of another row. The header row and the rows of state postal codes (AL for ALABAMA, IN for
+# INDIANA) are skipped. Only the name part of a reference is rewritten, the tokens before its
+# first token with a digit (same rule as DWM13 addressFlags), so street words like COURT or
+# FIELD are kept. The map is case-folded once, the replacement of every distinct token is
+# decided once, and refDict is rewritten in one pass over its tokens, before DWM16 counts the
+# token frequencies. DWM45 still checks the aliases of the aligned tokens, for the aliases left
+# as they are.
+aliasFileName = 'alias.dat'
+# Values of the state postal code rows of alias.dat
+stateNames = frozenset(['ALABAMA', 'ALASKA', 'AMERICAN SAMOA', 'ARIZONA', 'ARKANSAS', 'CALIFORNIA', 'COLORADO',
+    'CONNECTICUT', 'DELAWARE', 'DISTRICT OF COLUMBIA', 'FLORIDA', 'GEORGIA', 'GUAM', 'HAWAII', 'IDAHO',
+    'ILLINOIS', 'INDIANA', 'IOWA', 'KANSAS', 'KENTUCKY', 'LOUISIANA', 'MAINE', 'MARYLAND', 'MASSACHUSETTS',
+    'MICHIGAN', 'MINNESOTA', 'MISSISSIPPI', 'MISSOURI', 'MONTANA', 'NEBRASKA', 'NEVADA', 'NEW HAMPSHIRE',
+    'NEW JERSEY', 'NEW MEXICO', 'NEW YORK', 'NORTH CAROLINA', 'NORTH DAKOTA', 'NORTHERN MARIANA IS', 'OHIO',
+    'OKLAHOMA', 'OREGON', 'PENNSYLVANIA', 'PUERTO RICO', 'RHODE ISLAND', 'SOUTH CAROLINA', 'SOUTH DAKOTA',
+    'TENNESSEE', 'TEXAS', 'UTAH', 'VERMONT', 'VIRGINIA', 'VIRGIN ISLANDS', 'WASHINGTON', 'WEST VIRGINIA',
+    'WISCONSIN', 'WYOMING'])
+
+
+# In[ ]:
+
+
+def isStateCode(alias, value):
+    return len(alias) == 2 and value.upper() in stateNames
+def readAliasRows(fileName):
+    # Returns the (value, alias) rows of the alias file, without the header row
+    rows = []
+    with open(fileName, 'r') as aliasFile:
+        reader = csv.DictReader(aliasFile, delimiter='\t', fieldnames=['value', 'alias'])
+        for line in reader:
+            value = line['value']
+            alias = line['alias']
+            if alias is None or value is None or value.startswith('!!'):
+                continue
+            rows.append((value.strip(), alias.strip()))
+    return rows
+def canonicalMap(aliasRows):
+    # key=case-folded alias, value=canonical value in upper case like the tokenizer output,
+    # only for the aliases with a single value that are not themselves a value
+    values = {}
+    for value, alias in aliasRows:
+        if alias == '' or isStateCode(alias, value) or alias.casefold() == value.casefold():
+            continue
+        values.setdefault(alias.casefold(), set()).add(value.upper())
+    canonicalValues = {value.casefold() for value, alias in aliasRows}
+    aliasMap = {}
+    for alias, aliasValues in values.items():
+        if len(aliasValues) == 1 and alias not in canonicalValues:
+            aliasMap[alias] = aliasValues.pop()
+    return aliasMap
+def canonicalizeRefDict(refDict):
+    # Replaces the aliases in the token lists of refDict, returns the number of replacements
+    logFile = DWM10_Parms.logFile
+    print('\n>>Starting DWM17')
+    print('\n>>Starting DWM17', file=logFile)
+    aliasMap = canonicalMap(readAliasRows(aliasFileName))
+    digitRe = DWM13_TokenVocabulary.digitRe
+    removeDuplicateTokens = DWM10_Parms.removeDuplicateTokens
+    replacements = {}
+    replaceCnt = 0
+    refCnt = 0
+    for refID, tokens in refDict.items():
+        newTokens = []
+        changed = False
+        for position, token in enumerate(tokens):
+            if digitRe.search(token) is not None:
+                # Start of the address part
+                newTokens.extend(tokens[position:])
+                break
+            canonical = replacements.get(token)
+            if canonical is None:
+                canonical = aliasMap.get(token.casefold(), token)
+                replacements[token] = canonical
+            if canonical != token:
+                changed = True
+                replaceCnt += 1
+            newTokens.append(canonical)
+        if changed:
+            if removeDuplicateTokens:
+                newTokens = list(dict.fromkeys(newTokens))
+            refDict[refID] = newTokens
+            refCnt += 1
+    print('Aliases in Alias Map =', len(aliasMap))
+    print('Aliases in Alias Map =', len(aliasMap), file=logFile)
+    print('Alias Replacements =', replaceCnt, ' References Changed =', refCnt)
+    print('Alias Replacements =', replaceCnt, ' References Changed =', refCnt, file=logFile)
+    return replaceCnt
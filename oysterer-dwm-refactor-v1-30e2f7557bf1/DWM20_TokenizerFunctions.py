@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import re
+# Tokenizer functions used by DWM14 to split the body of a reference into tokens.
+# All patterns are compiled once at import. Pure ASCII strings take a str.translate
+# fast path that produces exactly the same tokens as the regular expression path,
+# strings with non-ASCII characters fall back to the compiled regular expressions.
+_whitespaceRe = re.compile(r'[\s]+')
+_nonWordRe = re.compile(r'[\W]+')
+# Delimiters that can be split with str.split instead of re.split
+_plainDelimiters = ',;:\t'
+# Translate tables for the ASCII fast path
+_splitTable = {}
+_compressTable = {}
+for _code in range(128):
+    _char = chr(_code)
+    if _nonWordRe.match(_char):
+        _splitTable[_code] = ' '
+        if _whitespaceRe.match(_char):
+            _compressTable[_code] = ' '
+        else:
+            _compressTable[_code] = None
+_deleteTable = dict.fromkeys(_splitTable.keys())
+
+
+# In[ ]:
+
+
+#Replace all non-words characters with blanks, then split on blanks
+def tokenizerSplitter(string):
+    string = string.upper()
+    if string.isascii():
+        return string.translate(_splitTable).split()
+    return _splitTokens(string)
+def splitterRegex(string):
+    return _splitTokens(string.upper())
+def _splitTokens(string):
+    string = _nonWordRe.sub(' ', string)
+    return [token for token in _whitespaceRe.split(string) if len(token)>0]
+
+
+# In[ ]:
+
+
+#Replace delimiter with blanks, then compress token by replacing non-word characters with null
+def tokenizerCompress(string, delimiter):
+    string = string.upper().replace(delimiter,' ')
+    if string.isascii():
+        return string.translate(_compressTable).split()
+    return _compressTokens(string)
+def compressRegex(string, delimiter):
+    return _compressTokens(string.upper().replace(delimiter,' '))
+def _compressTokens(string):
+    newList = []
+    for token in _whitespaceRe.split(string):
+        newToken = _nonWordRe.sub('', token)
+        if len(newToken)>0:
+            newList.append(newToken)
+    return newList
+
+
+# In[ ]:
+
+
+#Split on delimiter, compress each token and join consecutive all-digit tokens of a field
+def tokenizerCompressNbr(string, delimiter):
+    string = string.upper()
+    if delimiter in _plainDelimiters:
+        fieldList = string.split(delimiter)
+    else:
+        # re.split keeps the original behavior for delimiters that are regex characters
+        fieldList = re.split(delimiter, string)
+    isAscii = string.isascii()
+    newList = []
+    for fieldValue in fieldList:
+        nbr = False
+        newToken = ''
+        for token in fieldValue.split():
+            if isAscii:
+                token = token.translate(_deleteTable)
+            else:
+                token = _nonWordRe.sub('', token)
+            if token.isdigit():
+                nbr = True
+                newToken = newToken + token
+            else:
+                if nbr:
+                    newList.append(newToken)
+                    newToken = ''
+                    nbr = False
+                newList.append(token)
+        if nbr:
+            newList.append(newToken)
+    return newList
+
+
+# In[ ]:
+
+
+validTokenizerTypes = ['Splitter', 'Compress', 'CompressNbr']
+def getTokenizer(tokenizerType, delimiter):
+    # Returns a function of one argument (the reference body) or None if type is invalid
+    if tokenizerType=='Splitter':
+        return tokenizerSplitter
+    if tokenizerType=='Compress':
+        return lambda string: tokenizerCompress(string, delimiter)
+    if tokenizerType=='CompressNbr':
+        return lambda string: tokenizerCompressNbr(string, delimiter)
+    return None
@@ -5,88 +5,135 @@
 
 
 import DWM10_Parms
+import DWM11_ResourceLoader
+import DWM26_VariantStore
 from collections import OrderedDict
 from textdistance import DamerauLevenshtein
 #from textdistance import Levenshtein
 import Levenshtein as lev
 import operator
-import json
-import os
 
 VARIANT_MAP_FILE = 'DWM_TokenVariants.json'
+# refIDs changed by the last globalReplace, in refDict order so they are interned in the same order
+changedRefIDs = []
 
 
-def _load_variant_map(path):
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return {}
-    if not isinstance(data, dict):
-        return {}
-    return data
+def _deletion_variants(word, maxDeletes=2):
+    # All strings obtained by deleting up to maxDeletes characters from word, including word
+    variants = {word}
+    frontier = {word}
+    for _ in range(maxDeletes):
+        nextFrontier = set()
+        for variant in frontier:
+            for j in range(len(variant)):
+                nextFrontier.add(variant[:j]+variant[j+1:])
+        variants.update(nextFrontier)
+        frontier = nextFrontier
+    return variants
 
 
-def _save_variant_map(path, data):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=True, sort_keys=True)
+def _build_deletion_index(cleanIndex, kStart):
+    # Symmetric-deletion index of the error token candidates, key=deletion variant of the
+    # lower case token, value=list of cleanIndex positions. Two strings are within Levenshtein
+    # distance 2 only if they share a variant, so a lookup returns a small superset of the
+    # tokens within distance 2 instead of every error token.
+    deletionIndex = {}
+    for k in range(kStart, len(cleanIndex)):
+        for variant in _deletion_variants(cleanIndex[k][0].lower()):
+            deletionIndex.setdefault(variant, []).append(k)
+    return deletionIndex
 
 
-def _update_learned_variants(learned_variants, std_token_dict):
-    updated = False
-    existing_variants = set()
-    for standard, variants in learned_variants.items():
-        if not isinstance(variants, list):
-            continue
-        for variant in variants:
-            existing_variants.add(variant)
-    for variant, standard in std_token_dict.items():
-        if not variant.isalpha() or not standard.isalpha():
-            continue
-        if variant in existing_variants:
-            # Respect manual mappings; never reassign or duplicate variants.
-            continue
-        if standard not in learned_variants:
-            learned_variants[standard] = []
-        if variant not in learned_variants[standard] and variant != standard:
-            learned_variants[standard].append(variant)
-            existing_variants.add(variant)
-            updated = True
-    # Keep lists sorted for stable files
-    if updated:
-        for standard in learned_variants:
-            learned_variants[standard] = sorted(set(learned_variants[standard]))
-    return updated
+def _error_token_start(cleanIndex, maxFreqErrToken):
+    # cleanIndex is sorted descending by frequency, error token candidates are the tail of
+    # positions > 1 with frequency <= maxFreqErrToken
+    kStart = len(cleanIndex)
+    while kStart > 2 and cleanIndex[kStart-1][1] <= maxFreqErrToken:
+        kStart -= 1
+    return kStart
+
+
+def _is_correction(wordJ, wordK, Class):
+    dis = lev.distance(wordJ.lower(),wordK.lower())
+    if dis == 1:
+        return True
+    if dis == 2:
+        return Class.distance(wordJ,wordK)==1
+    return False
+
+
+def _find_corrections_scan(cleanIndex, minFreqStdToken, maxFreqErrToken):
+    # Reference implementation, compares each standard token with every error token
+    Class = DamerauLevenshtein()
+    cleanIndex = list(cleanIndex)
+    cleanCnt = len(cleanIndex)
+    stdTokenDict = {}
+    for j in range(0,cleanCnt-1):
+        pairJ = cleanIndex[j]
+        wordJ = pairJ[0]
+        freqJ = pairJ[1]
+        if freqJ < minFreqStdToken:
+            break
+        for k in range(cleanCnt-1, 1, -1):
+            pairK = cleanIndex[k]
+            wordK = pairK[0]
+            freqK = pairK[1]
+            if freqK > maxFreqErrToken:
+                break
+            if _is_correction(wordJ, wordK, Class):
+                stdTokenDict[wordK] = wordJ
+                cleanIndex[k] = ('',freqK)
+    return stdTokenDict
+
+
+def _find_corrections(cleanIndex, minFreqStdToken, maxFreqErrToken):
+    # Same corrections, in the same order, as _find_corrections_scan. Each standard token only
+    # checks the error tokens found in the deletion index, in the descending position order
+    # of the scan. An error token is removed (set to '') when it is corrected, standard tokens
+    # of 2 characters or less can match removed tokens, so they use the scan.
+    Class = DamerauLevenshtein()
+    cleanIndex = list(cleanIndex)
+    cleanCnt = len(cleanIndex)
+    kStart = _error_token_start(cleanIndex, maxFreqErrToken)
+    deletionIndex = _build_deletion_index(cleanIndex, kStart)
+    stdTokenDict = {}
+    for j in range(0,cleanCnt-1):
+        pairJ = cleanIndex[j]
+        wordJ = pairJ[0]
+        freqJ = pairJ[1]
+        if freqJ < minFreqStdToken:
+            break
+        lowerJ = wordJ.lower()
+        if len(lowerJ) <= 2:
+            candidates = range(cleanCnt-1, kStart-1, -1)
+        else:
+            candidates = set()
+            for variant in _deletion_variants(lowerJ):
+                candidates.update(deletionIndex.get(variant, ()))
+            candidates = sorted(candidates, reverse=True)
+        for k in candidates:
+            pairK = cleanIndex[k]
+            wordK = pairK[0]
+            freqK = pairK[1]
+            if _is_correction(wordJ, wordK, Class):
+                stdTokenDict[wordK] = wordJ
+                cleanIndex[k] = ('',freqK)
+    return stdTokenDict
 
 
 # In[2]:
 
 
 def globalReplace(refDict, tokenFreqDict):
+    global changedRefIDs
     logFile = DWM10_Parms.logFile
     print ("\n>>Starting DWM25 --- runGlobalCorrection is set to True")
     print("\n>>Starting DWM25 --- runGlobalCorrection is set to True", file=logFile)
-    Class = DamerauLevenshtein()
-    learned_variants = _load_variant_map(VARIANT_MAP_FILE)
-    variant_map = {}
-    for standard, variants in learned_variants.items():
-        if not isinstance(variants, list):
-            continue
-        for variant in variants:
-            variant_map[variant] = standard
-#Phase 1 Create Dictionary from DWM_WordList
-    wordListDict = {}
-    wordListFile = open('DWM_WordList.txt','r')
-    word = wordListFile.readline().strip()
-    itemsRead = 1
-    while word != '':
-        wordListDict.update({word:''})
-        word = wordListFile.readline().strip()
-        itemsRead +=1
-    wordListFile.close()
-    print('Items read =', itemsRead)
+    variantStore = DWM26_VariantStore.VariantStore(VARIANT_MAP_FILE)
+    variant_map = variantStore.load(DWM10_Parms.learnTokenVariants)
+#Phase 1 Load DWM_WordList, compiled by DWM11 on first use and memory-mapped afterwards
+    wordListDict = DWM11_ResourceLoader.loadWordList('DWM_WordList.txt')
+    print('Items read =', wordListDict.itemsRead)
     print('wordListDict size =', len(wordListDict))
     minFreqStdToken = DWM10_Parms.minFreqStdToken
     minLenStdToken = DWM10_Parms.minLenStdToken
@@ -123,30 +170,7 @@ def globalReplace(refDict, tokenFreqDict):
     print("Clean Token Size =", cleanCnt)
     print("Clean Token Size =", cleanCnt, file=logFile)
 #Phase 3 Populate Dictionary (stdTokenDict) of token corrections
-    stdTokenDict = {}
-    checkCnt = 0
-    for j in range(0,cleanCnt-1):
-        pairJ = cleanIndex[j]
-        wordJ = pairJ[0]
-        lenJ = len(wordJ)
-        freqJ = pairJ[1]
-        if freqJ < minFreqStdToken:
-            break
-        for k in range(cleanCnt-1, 1, -1):
-            pairK = cleanIndex[k]
-            wordK = pairK[0]
-            lenK = len(wordK)
-            freqK = pairK[1]
-            if freqK > maxFreqErrToken:
-                break
-            dis = lev.distance(wordJ.lower(),wordK.lower())     
-            if dis == 1:
-                stdTokenDict[wordK] = wordJ
-                cleanIndex[k] = ('',freqK)                   
-            elif dis == 2:
-                if Class.distance(wordJ,wordK)==1:
-                    stdTokenDict[wordK] = wordJ
-                    cleanIndex[k] = ('',freqK)
+    stdTokenDict = _find_corrections(cleanIndex, minFreqStdToken, maxFreqErrToken)
     print('\nTotal correction pairs = ', len(stdTokenDict)) 
     print('\nTotal correction pairs = ', len(stdTokenDict), file=logFile) 
     # Add explicit standardizations (variant -> standard)
@@ -156,21 +180,22 @@ def globalReplace(refDict, tokenFreqDict):
         print('Total standardization pairs = ', len(variant_map), file=logFile)
     # Update learned variants with new corrections
     if DWM10_Parms.learnTokenVariants:
-        if _update_learned_variants(learned_variants, stdTokenDict):
-            _save_variant_map(VARIANT_MAP_FILE, learned_variants)
-            print('Updated variant map saved to', VARIANT_MAP_FILE)
-            print('Updated variant map saved to', VARIANT_MAP_FILE, file=logFile)
+        newVariantCnt = variantStore.learn(stdTokenDict)
+        if newVariantCnt > 0:
+            print('Updated variant map saved to', VARIANT_MAP_FILE, 'new variants =', newVariantCnt)
+            print('Updated variant map saved to', VARIANT_MAP_FILE, 'new variants =', newVariantCnt, file=logFile)
     # If detail requested, write changes to run log
     if DWM10_Parms.globalCorrectionDetail:
         print('Details of correction sent to logFile')
         print('Error Token, Correction Token', file=logFile)
         for token in stdTokenDict:
             print(token+','+stdTokenDict[token], file=logFile)
-    # Apply corrections to all references
+    # Apply corrections to all references, updating tokenFreqDict with each replacement
     newList = []
     newDict = {}
     tokenChangeCnt = 0
     refChangeCnt = 0
+    changedRefIDs = []
     for refID in refDict:
         tokenList = refDict[refID]
         #print('**ref=',refID, 'before', tokenList)
@@ -180,6 +205,7 @@ def globalReplace(refDict, tokenFreqDict):
         for token in tokenList:
             if token in stdTokenDict:
                 newList.append(stdTokenDict[token])
+                tokenFreqDict.replaceToken(token, stdTokenDict[token])
                 tokenChangeCnt +=1
                 change = True
             else:
@@ -187,6 +213,7 @@ def globalReplace(refDict, tokenFreqDict):
         newDict[refID] = newList
         if change:
             refChangeCnt +=1
+            changedRefIDs.append(refID)
     print('Total tokens corrected = ', tokenChangeCnt) 
     print('Total tokens corrected = ', tokenChangeCnt, file=logFile)
     print('Total references corrected = ', refChangeCnt) 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import os
+import json
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+# Store of learned token variants used by DWM25. The snapshot file (DWM_TokenVariants.json,
+# key=standard token, value=sorted list of variants) keeps its original format so it can still
+# be edited by hand. New variants learned by a run are appended to a log file next to it, one
+# JSON object per line, instead of rewriting the snapshot. The log is folded into the snapshot
+# once it holds compactEntries mappings. A run that learns variants holds a lock on a separate
+# lock file for its reads and writes, so parallel runs that learn variants never lose each
+# other's mappings. A run that only applies the variants reads without the lock and never
+# creates the lock file. The snapshot is replaced atomically and a partial log line is
+# skipped, so such a read can at worst miss or repeat the mappings another run is compacting.
+logSuffix = '.log'
+lockSuffix = '.lock'
+compactEntries = 1000
+
+
+# In[ ]:
+
+
+class VariantLock:
+    # Shared or exclusive lock on the store's lock file, used in a with statement
+    def __init__(self, path, exclusive):
+        self.path = path
+        self.exclusive = exclusive
+        self.lockFile = None
+    def __enter__(self):
+        self.lockFile = open(self.path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        else:
+            # msvcrt only has exclusive locks, on the first byte of the file
+            self.lockFile.seek(0)
+            msvcrt.locking(self.lockFile.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+    def __exit__(self, excType, excValue, traceback):
+        if fcntl is not None:
+            fcntl.flock(self.lockFile.fileno(), fcntl.LOCK_UN)
+        else:
+            self.lockFile.seek(0)
+            msvcrt.locking(self.lockFile.fileno(), msvcrt.LK_UNLCK, 1)
+        self.lockFile.close()
+        self.lockFile = None
+        return False
+
+
+# In[ ]:
+
+
+class VariantStore:
+    def __init__(self, path):
+        self.path = path
+        self.logPath = path+logSuffix
+        self.lockPath = path+lockSuffix
+        # variantMap, key=variant, value=standard token, used by the apply phase
+        self.variantMap = {}
+        # learnedVariants, key=standard token, value=list of variants, the snapshot plus the log
+        self.learnedVariants = {}
+        self.logEntryCnt = 0
+    def _readSnapshot(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as snapshotFile:
+                data = json.load(snapshotFile)
+        except (json.JSONDecodeError, OSError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
+    def _readLog(self):
+        entries = []
+        if not os.path.exists(self.logPath):
+            return entries
+        with open(self.logPath, 'r', encoding='utf-8') as logFile:
+            for line in logFile:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run stopped while appending, skip the partial line
+                    continue
+                if isinstance(entry, list) and len(entry) == 2:
+                    entries.append(entry)
+        return entries
+    def _refresh(self):
+        # Rebuild both views from the snapshot then the log, caller holds the lock
+        learnedVariants = self._readSnapshot()
+        logEntries = self._readLog()
+        for variant, standard in logEntries:
+            variants = learnedVariants.setdefault(standard, [])
+            if isinstance(variants, list):
+                variants.append(variant)
+        variantMap = {}
+        for standard, variants in learnedVariants.items():
+            if not isinstance(variants, list):
+                continue
+            for variant in variants:
+                variantMap[variant] = standard
+        self.learnedVariants = learnedVariants
+        self.variantMap = variantMap
+        self.logEntryCnt = len(logEntries)
+    def load(self, lock=True):
+        # lock is False when the run does not learn variants
+        if not lock:
+            self._refresh()
+            return self.variantMap
+        with VariantLock(self.lockPath, False):
+            self._refresh()
+        return self.variantMap
+    def learn(self, stdTokenDict):
+        # Append the alphabetic corrections of stdTokenDict whose variant is not already known,
+        # returns the number of new mappings
+        with VariantLock(self.lockPath, True):
+            # Re-read so mappings appended by another run since load() are respected
+            self._refresh()
+            newEntries = []
+            for variant, standard in stdTokenDict.items():
+                if not variant.isalpha() or not standard.isalpha():
+                    continue
+                if variant in self.variantMap or variant == standard:
+                    # Respect manual mappings; never reassign or duplicate variants.
+                    continue
+                if not isinstance(self.learnedVariants.get(standard, []), list):
+                    continue
+                newEntries.append([variant, standard])
+                self.variantMap[variant] = standard
+                self.learnedVariants.setdefault(standard, []).append(variant)
+            if newEntries:
+                self._endPartialLine()
+                with open(self.logPath, 'a', encoding='utf-8') as logFile:
+                    for entry in newEntries:
+                        logFile.write(json.dumps(entry, ensure_ascii=True)+'\n')
+                    logFile.flush()
+                    os.fsync(logFile.fileno())
+                self.logEntryCnt += len(newEntries)
+            if self.logEntryCnt >= compactEntries:
+                self._compact()
+        return len(newEntries)
+    def _endPartialLine(self):
+        # A run stopped while appending leaves the log without its last newline, end that line
+        # so the next entry is not joined to it, caller holds the lock
+        if not os.path.exists(self.logPath) or os.path.getsize(self.logPath) == 0:
+            return
+        with open(self.logPath, 'rb+') as logFile:
+            logFile.seek(-1, os.SEEK_END)
+            if logFile.read(1) != b'\n':
+                logFile.write(b'\n')
+    def compact(self):
+        with VariantLock(self.lockPath, True):
+            self._refresh()
+            self._compact()
+    def _compact(self):
+        # Write snapshot plus log as a new snapshot, then empty the log, caller holds the lock
+        snapshot = {}
+        for standard, variants in self.learnedVariants.items():
+            snapshot[standard] = sorted(set(variants)) if isinstance(variants, list) else variants
+        tempPath = self.path+'.'+str(os.getpid())+'.tmp'
+        with open(tempPath, 'w', encoding='utf-8') as snapshotFile:
+            json.dump(snapshot, snapshotFile, indent=2, ensure_ascii=True, sort_keys=True)
+        os.replace(tempPath, self.path)
+        if os.path.exists(self.logPath):
+            os.remove(self.logPath)
+        self.learnedVariants = snapshot
+        self.logEntryCnt = 0
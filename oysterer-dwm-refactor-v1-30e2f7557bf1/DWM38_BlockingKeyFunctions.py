@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+# Blocking key functions for DWM42, listed in blockingKeyFunctions. Each function maps a token
+# to a code (Soundex code, sorted q-gram prefix) so that misspelled tokens can share a block
+# with their correct form. The code of every distinct token is computed once and interned in
+# the run vocabulary as a key token, named with a control character so it never equals a
+# reference token. TokenKeyIndex keeps the token ID -> key token ID array of each function,
+# extended only for tokens added since the last call, and is shared by every iteration of
+# the run. Each function is an extra blocking pass: a key token is a blocking token when the
+# frequencies of the tokens mapped to it add up to between 2 and beta.
+keyPrefix = '\x01'
+# Size and number of the sorted q-grams of the QGram key
+qgramSize = 2
+qgramPrefix = 3
+
+
+# In[ ]:
+
+
+soundexCodes = {}
+for letters, code in (('BFPV', '1'), ('CGJKQSXZ', '2'), ('DT', '3'), ('L', '4'), ('MN', '5'), ('R', '6')):
+    for letter in letters:
+        soundexCodes[letter] = code
+def soundexKey(token):
+    # American Soundex, None for tokens that are not alphabetic
+    token = token.upper()
+    if not token.isalpha() or not token.isascii():
+        return None
+    code = token[0]
+    previous = soundexCodes.get(token[0], '')
+    for letter in token[1:]:
+        digit = soundexCodes.get(letter, '')
+        if digit != '' and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'HW':
+            # A vowel separates two letters with the same code, H and W do not
+            previous = digit
+    return code.ljust(4, '0')
+def qgramKey(token):
+    # The first qgramPrefix distinct q-grams of the token in sorted order
+    if len(token) < qgramSize:
+        return None
+    qgrams = sorted({token[j:j+qgramSize] for j in range(len(token)-qgramSize+1)})
+    return ' '.join(qgrams[:qgramPrefix])
+keyFunctions = {'Soundex': soundexKey, 'QGram': qgramKey}
+
+
+# In[ ]:
+
+
+class TokenKeyIndex:
+    def __init__(self, vocabulary, functionNames):
+        self.vocabulary = vocabulary
+        self.functionNames = functionNames
+        # key token ID of each token ID per function, -1 when the function gives no key
+        self.tokenKeys = [np.zeros(0, dtype=np.int64) for functionName in functionNames]
+        self.isKeyToken = np.zeros(0, dtype=bool)
+    def extend(self):
+        # Compute the keys of the tokens added to the vocabulary since the last call, the key
+        # tokens interned by one round are added with no keys of their own in the next round
+        vocabulary = self.vocabulary
+        while len(self.isKeyToken) < len(vocabulary):
+            known = len(self.isKeyToken)
+            newTokens = vocabulary.tokens[known:]
+            isKeyToken = np.array([token.startswith(keyPrefix) for token in newTokens], dtype=bool)
+            self.isKeyToken = np.concatenate((self.isKeyToken, isKeyToken))
+            for j, functionName in enumerate(self.functionNames):
+                keyFunction = keyFunctions[functionName]
+                newKeys = []
+                for token, isKey in zip(newTokens, isKeyToken.tolist()):
+                    code = None if isKey else keyFunction(token)
+                    newKeys.append(-1 if code is None else vocabulary.intern(keyPrefix+functionName+keyPrefix+code))
+                self.tokenKeys[j] = np.concatenate((self.tokenKeys[j], np.array(newKeys, dtype=np.int64)))
+    def keyFrequencies(self, eligible, freq):
+        # freq with the frequency of each key token, the sum over the eligible tokens mapped to it
+        keyFreq = freq.copy()
+        for tokenKeys in self.tokenKeys:
+            mapped = eligible & (tokenKeys >= 0)
+            keyFreq += np.bincount(tokenKeys[mapped], freq[mapped], len(freq)).astype(np.int64)
+        return keyFreq
+    def passMasks(self, eligible, keyFreq, beta):
+        # For each function, True for the token IDs whose key token is a blocking token
+        isBlkKey = (keyFreq >= 2) & (keyFreq <= beta) & self.isKeyToken
+        masks = []
+        for tokenKeys in self.tokenKeys:
+            mapped = eligible & (tokenKeys >= 0)
+            masks.append(mapped & isBlkKey[np.maximum(tokenKeys, 0)])
+        return masks
+
+
+# In[ ]:
+
+
+# Index of the current vocabulary, rebuilt when the vocabulary or the function list changes
+tokenKeyIndex = None
+def getKeyIndex():
+    # The shared TokenKeyIndex, None when blockingKeyFunctions is empty
+    global tokenKeyIndex
+    functionNames = [name.strip() for name in DWM10_Parms.blockingKeyFunctions.split(',') if name.strip() != '']
+    if len(functionNames) == 0:
+        return None
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    if tokenKeyIndex is None or tokenKeyIndex.vocabulary is not vocabulary or tokenKeyIndex.functionNames != functionNames:
+        tokenKeyIndex = TokenKeyIndex(vocabulary, functionNames)
+    tokenKeyIndex.extend()
+    return tokenKeyIndex
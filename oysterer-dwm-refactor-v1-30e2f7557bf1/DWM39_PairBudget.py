@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+import DWM42_BuildBlockPairs
+# Pair budget estimate for token blocking, run by DWM42 before blocking when reportPairBudget
+# is True or maxCandidatePairs > 0. The blocking records are built once for the largest beta
+# below sigma. Each block is tagged with the highest token frequency of its key, a block only
+# exists for the betas at or above that frequency. Sorting the blocks by that frequency gives
+# the blocking records, blocks and pairs generated for every beta from cumulative sums, without
+# generating any pair. The counts are the same as the DWM42 totals for that beta, before
+# duplicate pairs are removed. With maxCandidatePairs > 0 the largest beta whose pairs fit the
+# budget replaces the beta of the parms file.
+
+
+# In[ ]:
+
+
+def blockPairCount(blockSizes, maxBlockSize, windowSize):
+    # Pairs emitted by blocks of the given sizes, same rule as DWM42 buildPairCodes
+    blockSizes = blockSizes.astype(np.int64)
+    pairCnts = blockSizes*(blockSizes-1)//2
+    if maxBlockSize > 0:
+        # Only the pairs of a sorted-neighborhood window for blocks larger than maxBlockSize
+        reach = np.minimum(windowSize, blockSizes)-1
+        windowCnts = reach*blockSizes - reach*(reach+1)//2
+        pairCnts = np.where(blockSizes > maxBlockSize, windowCnts, pairCnts)
+    return pairCnts
+def pairBudgetCurve(refIDs, refDict, tokenFreqDict, betas):
+    # Returns a list of (beta, blocking records, blocks size>1, pairs generated) for each beta
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    isBlkID = DWM42_BuildBlockPairs.blockingMask(tokenFreqDict, max(betas))
+    # Frequencies of the tokens and of the key tokens of the blocking key functions
+    freq = DWM42_BuildBlockPairs.blockingFrequencies(tokenFreqDict)[1]
+    keys, keyRefs = DWM42_BuildBlockPairs.blockingRecords(refIDs, np.arange(len(refIDs), dtype=np.int64),
+                                                          refDict, isBlkID, DWM10_Parms.blockByPairs)
+    if DWM10_Parms.blockByPairs:
+        vocabularySize = len(vocabulary)
+        keyFreqs = np.maximum(freq[keys//vocabularySize], freq[keys%vocabularySize])
+    else:
+        keyFreqs = freq[keys]
+    uniqueKeys, firstRecords, blockSizes = np.unique(keys, return_index=True, return_counts=True)
+    blockFreqs = keyFreqs[firstRecords]
+    order = np.argsort(blockFreqs, kind='stable')
+    blockFreqs = blockFreqs[order]
+    blockSizes = blockSizes[order]
+    cumRecords = np.concatenate(([0], np.cumsum(blockSizes)))
+    cumBlocks = np.concatenate(([0], np.cumsum(blockSizes >= 2)))
+    pairCnts = blockPairCount(blockSizes, DWM10_Parms.maxBlockSize, DWM10_Parms.blockWindowSize)
+    cumPairs = np.concatenate(([0], np.cumsum(pairCnts)))
+    curve = []
+    for beta in betas:
+        end = int(np.searchsorted(blockFreqs, beta, side='right'))
+        curve.append((beta, int(cumRecords[end]), int(cumBlocks[end]), int(cumPairs[end])))
+    return curve
+
+
+# In[ ]:
+
+
+def runPairBudget(refDict, linkIndex, tokenFreqDict):
+    logFile = DWM10_Parms.logFile
+    maxCandidatePairs = DWM10_Parms.maxCandidatePairs
+    selectList = [key for key in linkIndex if len(linkIndex[key])==0]
+    betas = list(range(2, DWM10_Parms.sigma))
+    curve = pairBudgetCurve(selectList, refDict, tokenFreqDict, betas)
+    print('Pair Budget Estimate: beta, blocking records, blocks size>1, pairs generated')
+    print('Pair Budget Estimate: beta, blocking records, blocks size>1, pairs generated', file=logFile)
+    for beta, recordCnt, blockCnt, pairCnt in curve:
+        print('  ', beta, recordCnt, blockCnt, pairCnt)
+        print('  ', beta, recordCnt, blockCnt, pairCnt, file=logFile)
+    if maxCandidatePairs > 0:
+        fitting = [beta for beta, recordCnt, blockCnt, pairCnt in curve if pairCnt <= maxCandidatePairs]
+        if len(fitting) > 0:
+            DWM10_Parms.beta = max(fitting)
+        else:
+            DWM10_Parms.beta = 2
+            print('**Warning: no beta value fits maxCandidatePairs', maxCandidatePairs)
+            print('**Warning: no beta value fits maxCandidatePairs', maxCandidatePairs, file=logFile)
+        print('Beta Selected for maxCandidatePairs', maxCandidatePairs, '=', DWM10_Parms.beta)
+        print('Beta Selected for maxCandidatePairs', maxCandidatePairs, '=', DWM10_Parms.beta, file=logFile)
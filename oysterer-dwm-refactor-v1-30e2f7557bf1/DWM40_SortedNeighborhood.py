@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+import DWM47_MinHashBlocking
+# Sorted-neighborhood blocking used by DWM42 when blockingMode=SortedNeighborhood. The
+# filtered tokens of each reference (same filter as MinHashLSH) are put in rarity order, lowest
+# tokenFreqDict frequency first. There are snSortKeys passes, pass p sorts the references on a
+# key starting with their (p+1)-th rarest token followed by the other tokens in rarity order.
+# In each pass a reference is paired with the next snMinWindow-1 references, then the window
+# keeps growing, up to snMaxWindow, while the next reference has an estimated Jaccard
+# similarity of at least snSimilarity. The window of the next reference starts again from
+# snMinWindow. Similarity is estimated from short MinHash signatures, so each pass is array
+# work and emits at most n*(snMaxWindow-1) pairs, whatever the token frequencies.
+# Number of MinHash values used to estimate the similarity of neighbors
+signatureSize = 32
+
+
+# In[ ]:
+
+
+def rarityOrders(refIDs, refDict, keep, freq):
+    # Filtered token IDs of each reference in rarity order, ties broken by token
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    tokens = vocabulary.tokens
+    orders = []
+    for refID in refIDs:
+        refTokenIDs = vocabulary.refTokenIDs(refID, refDict)
+        tokenIDs = set(refTokenIDs[keep[refTokenIDs]].tolist())
+        orders.append(sorted(tokenIDs, key=lambda tokenID: (freq[tokenID], tokens[tokenID])))
+    return orders
+def passOrder(orders, keyPosition):
+    # Positions of the references with more than keyPosition tokens, sorted on the pass key
+    tokens = DWM13_TokenVocabulary.getVocabulary().tokens
+    sortKeys = []
+    for position, tokenIDs in enumerate(orders):
+        if len(tokenIDs) > keyPosition:
+            keyIDs = tokenIDs[keyPosition:keyPosition+1] + tokenIDs[:keyPosition] + tokenIDs[keyPosition+1:]
+            sortKeys.append((' '.join(tokens[tokenID] for tokenID in keyIDs), position))
+    sortKeys.sort()
+    return np.array([position for sortKey, position in sortKeys], dtype=np.int64)
+def refSignatures(orders):
+    # MinHash signature of the filtered token set of each reference, all-zero for empty sets
+    signatures = np.zeros((len(orders), signatureSize), dtype=np.uint64)
+    sizes = np.array([len(tokenIDs) for tokenIDs in orders], dtype=np.int64)
+    hasTokens = np.flatnonzero(sizes > 0)
+    if len(hasTokens) == 0:
+        return signatures
+    setIDs = np.array([tokenID for j in hasTokens.tolist() for tokenID in orders[j]], dtype=np.int64)
+    setStarts = np.concatenate(([0], np.cumsum(sizes[hasTokens])[:-1]))
+    multipliers, offsets = DWM47_MinHashBlocking.hashFunctions(signatureSize)
+    signatures[hasTokens] = DWM47_MinHashBlocking.bandSignatures(setIDs, setStarts, multipliers, offsets)
+    return signatures
+def adaptiveWindowPairs(order, signatures, minWindow, maxWindow, similarity):
+    # Returns (anchors, partners) as ranks in order, the anchor is paired with the partners in its window
+    anchorParts = [np.zeros(0, dtype=np.int64)]
+    partnerParts = [np.zeros(0, dtype=np.int64)]
+    ranks = np.arange(len(order), dtype=np.int64)
+    active = np.ones(len(order), dtype=bool)
+    for d in range(1, min(maxWindow, len(order))):
+        active = active[:len(order)-d]
+        if d >= minWindow:
+            # Grow the window only while every step stays similar to the anchor
+            left = signatures[order[:len(order)-d]]
+            right = signatures[order[d:]]
+            active = active & ((left == right).mean(axis=1) >= similarity)
+        if not active.any():
+            break
+        anchors = ranks[:len(order)-d][active]
+        anchorParts.append(anchors)
+        partnerParts.append(anchors+d)
+    return np.concatenate(anchorParts), np.concatenate(partnerParts)
+
+
+# In[ ]:
+
+
+def sortedNeighborhoodRecords(refIDs, refOrdinals, refDict, tokenFreqDict):
+    # Returns (sortKeyCnt, windowKeys, windowRefs, pairCodes): the sort keys built, one record per
+    # reference of each window with a pair, and the pair codes with repeats
+    logFile = DWM10_Parms.logFile
+    minWindow = DWM10_Parms.snMinWindow
+    maxWindow = DWM10_Parms.snMaxWindow
+    similarity = DWM10_Parms.snSimilarity
+    print('Sorted Neighborhood sort keys =', DWM10_Parms.snSortKeys, ' window =', minWindow, 'to', maxWindow, ' similarity =', similarity)
+    print('Sorted Neighborhood sort keys =', DWM10_Parms.snSortKeys, ' window =', minWindow, 'to', maxWindow, ' similarity =', similarity, file=logFile)
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    freq = vocabulary.frequencyArray(tokenFreqDict)
+    keep = DWM47_MinHashBlocking.tokenFilter(vocabulary, tokenFreqDict)
+    orders = rarityOrders(refIDs, refDict, keep, freq)
+    signatures = refSignatures(orders)
+    refCnt = len(refOrdinals)
+    sortKeyCnt = 0
+    keyParts = [np.zeros(0, dtype=np.int64)]
+    refParts = [np.zeros(0, dtype=np.int64)]
+    codeParts = [np.zeros(0, dtype=np.int64)]
+    for keyPosition in range(DWM10_Parms.snSortKeys):
+        order = passOrder(orders, keyPosition)
+        sortKeyCnt += len(order)
+        anchors, partners = adaptiveWindowPairs(order, signatures, minWindow, maxWindow, similarity)
+        ordinalM = refOrdinals[order[anchors]]
+        ordinalN = refOrdinals[order[partners]]
+        codeParts.append(np.minimum(ordinalM, ordinalN)*refCnt + np.maximum(ordinalM, ordinalN))
+        # Window of each anchor, numbered apart from the windows of the other passes
+        windowIDs = keyPosition*refCnt + anchors
+        windowAnchors = np.unique(anchors)
+        keyParts.extend([keyPosition*refCnt + windowAnchors, windowIDs])
+        refParts.extend([refOrdinals[order[windowAnchors]], ordinalN])
+    return sortKeyCnt, np.concatenate(keyParts), np.concatenate(refParts), np.concatenate(codeParts)
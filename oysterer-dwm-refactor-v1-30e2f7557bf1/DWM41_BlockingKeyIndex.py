@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+import DWM42_BuildBlockPairs
+# BlockingKeyIndex keeps the blocking keys of the unresolved references between the
+# iterations of one parms file run, used by DWM42 when useBlockingKeyIndex is True.
+# refKeys maps each reference to the keys DWM42 would generate for it, postings maps each key
+# to its references (with the number of times the reference generates the key). On each call
+# only references that resolved, were changed by DWM45, or hold a token whose blocking status
+# changed with tokenFreqDict are updated, then the pairs are generated from the keys shared
+# by more than one reference. References are numbered in sorted refID order over refDict, so
+# the pairs are the same as a full DWM42 run.
+# Token pair keys use a fixed base instead of the vocabulary size, which grows when DWM45 adds
+# tokens, so the keys of earlier iterations stay valid.
+pairKeyBase = 1 << 31
+class BlockingKeyIndex:
+    def __init__(self, refDict):
+        self.sortedRefIDs = sorted(refDict)
+        self.ordinalOf = {refID: ordinal for ordinal, refID in enumerate(self.sortedRefIDs)}
+        self.refKeys = {}
+        self.postings = {}
+        # keys with postings of 2 or more records, the blocks that generate pairs
+        self.multiKeys = set()
+        self.recordCnt = 0
+        self.isBlkID = None
+        self.freqVersion = None
+        # beta of the blocking mask, it changes when maxCandidatePairs selects beta
+        self.beta = None
+        # token ID -> refIDs holding it, a static array index built for every reference at the
+        # first call, plus the references recomputed since
+        self.tokenRefStarts = None
+        self.tokenRefOrdinals = None
+        self.extraTokenRefs = {}
+        self.changedRefIDs = set()
+    def markChanged(self, refIDs):
+        # References whose token lists were edited since the last call
+        self.changedRefIDs.update(refIDs)
+    def _buildTokenRefs(self, refDict):
+        vocabulary = DWM13_TokenVocabulary.getVocabulary()
+        flatIDs, offsets = vocabulary.encodeRefs(self.sortedRefIDs, refDict)
+        flatRefs = np.repeat(np.arange(len(self.sortedRefIDs), dtype=np.int64), np.diff(offsets))
+        order = np.argsort(flatIDs, kind='stable')
+        self.tokenRefOrdinals = flatRefs[order]
+        self.tokenRefStarts = np.searchsorted(flatIDs[order], np.arange(len(vocabulary)+1))
+    def _refsWithTokens(self, tokenIDs):
+        refIDs = set()
+        starts = self.tokenRefStarts
+        for tokenID in tokenIDs:
+            if tokenID+1 < len(starts):
+                for ordinal in self.tokenRefOrdinals[starts[tokenID]:starts[tokenID+1]].tolist():
+                    refIDs.add(self.sortedRefIDs[ordinal])
+            refIDs.update(self.extraTokenRefs.get(tokenID, ()))
+        return refIDs
+    def _removeRef(self, refID):
+        keys = self.refKeys.pop(refID, None)
+        if keys is None:
+            return
+        self.recordCnt -= len(keys)
+        for key in keys.tolist():
+            posting = self.postings[key]
+            posting[refID] -= 1
+            if posting[refID] == 0:
+                del posting[refID]
+            if len(posting) == 0:
+                del self.postings[key]
+            self._updateMulti(key)
+    def _addRefs(self, refIDs, refDict):
+        # Generate the blocking records of refIDs in one DWM42 call and post them by reference
+        ordinals = np.array([self.ordinalOf[refID] for refID in refIDs], dtype=np.int64)
+        keys, keyRefs = DWM42_BuildBlockPairs.blockingRecords(refIDs, ordinals, refDict,
+                                                              self.isBlkID, DWM10_Parms.blockByPairs, pairKeyBase)
+        order = np.argsort(keyRefs, kind='stable')
+        keys = keys[order]
+        keyRefs = keyRefs[order]
+        empty = np.zeros(0, dtype=np.int64)
+        for refID in refIDs:
+            self.refKeys[refID] = empty
+        refOrdinals, starts = np.unique(keyRefs, return_index=True)
+        ends = np.append(starts[1:], len(keyRefs))
+        for ordinal, start, end in zip(refOrdinals.tolist(), starts.tolist(), ends.tolist()):
+            refID = self.sortedRefIDs[ordinal]
+            self.refKeys[refID] = keys[start:end]
+            self.recordCnt += end-start
+            for key in keys[start:end].tolist():
+                posting = self.postings.setdefault(key, {})
+                posting[refID] = posting.get(refID, 0) + 1
+                self._updateMulti(key)
+    def _updateMulti(self, key):
+        posting = self.postings.get(key)
+        if posting is not None and (len(posting) > 1 or sum(posting.values()) > 1):
+            self.multiKeys.add(key)
+        else:
+            self.multiKeys.discard(key)
+    def update(self, refDict, linkIndex, tokenFreqDict):
+        # Bring the index up to date, returns the number of references recomputed
+        selected = {refID for refID in linkIndex if len(linkIndex[refID])==0}
+        if self.tokenRefStarts is None:
+            self._buildTokenRefs(refDict)
+        # Intern the tokens of the changed references before the blocking mask is sized
+        vocabulary = DWM13_TokenVocabulary.getVocabulary()
+        for refID in self.changedRefIDs:
+            if refID in refDict:
+                for tokenID in vocabulary.refTokenIDs(refID, refDict).tolist():
+                    self.extraTokenRefs.setdefault(tokenID, set()).add(refID)
+        recompute = set()
+        freqVersion = getattr(tokenFreqDict, 'version', None)
+        if self.isBlkID is None or freqVersion is None or freqVersion != self.freqVersion or self.beta != DWM10_Parms.beta:
+            isBlkID = np.atleast_2d(DWM42_BuildBlockPairs.blockingMask(tokenFreqDict, DWM10_Parms.beta))
+            if self.isBlkID is not None:
+                # Token IDs whose status changed in any pass, new token IDs are flipped if set
+                known = min(isBlkID.shape[1], self.isBlkID.shape[1])
+                flipped = np.flatnonzero((isBlkID[:, :known] != self.isBlkID[:, :known]).any(axis=0)).tolist()
+                flipped += (known + np.flatnonzero(isBlkID[:, known:].any(axis=0))).tolist()
+                recompute.update(self._refsWithTokens(flipped))
+            self.isBlkID = isBlkID
+            self.freqVersion = freqVersion
+            self.beta = DWM10_Parms.beta
+        recompute.update(self.changedRefIDs)
+        self.changedRefIDs = set()
+        # Resolved references leave the index, new or recomputed references are (re)added
+        for refID in [refID for refID in self.refKeys if refID not in selected or refID in recompute]:
+            self._removeRef(refID)
+        self._addRefs(sorted(refID for refID in selected if refID not in self.refKeys), refDict)
+        return len(recompute)
+    def blockRecords(self):
+        # (keys, refOrdinals) of the blocks with more than one record
+        keys = []
+        refOrdinals = []
+        ordinalOf = self.ordinalOf
+        for key in self.multiKeys:
+            for refID, count in self.postings[key].items():
+                ordinal = ordinalOf[refID]
+                for _ in range(count):
+                    keys.append(key)
+                    refOrdinals.append(ordinal)
+        return np.array(keys, dtype=np.int64), np.array(refOrdinals, dtype=np.int64)
+
+
+# In[ ]:
+
+
+# Index of the current parms file run, reset by the driver whenever refDict is built
+blockingKeyIndex = None
+def resetIndex():
+    global blockingKeyIndex
+    blockingKeyIndex = None
+def getIndex(refDict):
+    global blockingKeyIndex
+    if blockingKeyIndex is None:
+        blockingKeyIndex = BlockingKeyIndex(refDict)
+    return blockingKeyIndex
+def markChanged(refIDs):
+    if blockingKeyIndex is not None:
+        blockingKeyIndex.markChanged(refIDs)
@@ -6,18 +6,251 @@
 
 
 import sys, os
+import numpy as np
 from datetime import datetime
 import DWM10_Parms
+import DWM13_TokenVocabulary
 import DWM16_BuildTokenFreqDict
+import DWM38_BlockingKeyFunctions
+import DWM39_PairBudget
+import DWM40_SortedNeighborhood
+import DWM41_BlockingKeyIndex
+import DWM43_ExternalBlocking
+import DWM44_ParallelBlocking
+import DWM47_MinHashBlocking
+import DWM_Parallel
 import DWM45_Block_Cleaning ## added to perform block level token replacement
 
+# Blocking keys and candidate pairs are packed integers. A blocking key is a token ID, or
+# lowID*vocabularySize+highID for a pair of tokens, so two different token pairs never share a
+# key the way concatenated strings can ('AB'+'C' == 'A'+'BC'). References are numbered by
+# ordinal in sorted refID order and a pair is refOrdinalA*refCnt+refOrdinalB with A <= B, so
+# sorting the codes sorts the pairs by refID. The 'refA|refB' strings used by the later stages
+# are only built for the unduplicated pairs.
+def rowsOfLength(values, starts, counts, n):
+    # Matrix with one row per group of exactly n values, groups are values[starts:starts+counts]
+    rows = np.flatnonzero(counts == n)
+    return rows, values[starts[rows, None] + np.arange(n)]
+def combinations(matrix):
+    # Columns j<k of every row, the pairs generated by the nested j,k loops of each row
+    colJ, colK = np.triu_indices(matrix.shape[1], 1)
+    return matrix[:, colJ], matrix[:, colK]
+def buildBlockingKeys(blkIDs, blkRefs, blockByPairs, vocabularySize, blkAddress=None):
+    # Returns (keys, refOrdinals), one entry per blocking record, blkRefs must be grouped by reference
+    # When blkAddress is given, token pairs are only kept if one token is in the name part and
+    # the other in the address part of the reference. A reference whose blocking tokens are all
+    # in one part keeps all its token pairs, as without blkAddress
+    if not blockByPairs or len(blkRefs) == 0:
+        return blkIDs, blkRefs
+    starts = np.flatnonzero(np.concatenate(([True], blkRefs[1:] != blkRefs[:-1])))
+    counts = np.diff(np.append(starts, len(blkRefs)))
+    keyParts = [np.zeros(0, dtype=np.int64)]
+    refParts = [np.zeros(0, dtype=np.int64)]
+    for n in np.unique(counts[counts >= 2]).tolist():
+        rows, matrix = rowsOfLength(blkIDs, starts, counts, n)
+        tokenJ, tokenK = combinations(matrix)
+        keys = (np.minimum(tokenJ, tokenK)*vocabularySize + np.maximum(tokenJ, tokenK)).ravel()
+        keyRefs = np.repeat(blkRefs[starts[rows]], tokenJ.shape[1])
+        if blkAddress is not None:
+            address = rowsOfLength(blkAddress, starts, counts, n)[1]
+            addressJ, addressK = combinations(address)
+            oneField = address.min(axis=1) == address.max(axis=1)
+            keep = ((addressJ != addressK) | oneField[:, None]).ravel()
+            keys = keys[keep]
+            keyRefs = keyRefs[keep]
+        keyParts.append(keys)
+        refParts.append(keyRefs)
+    return np.concatenate(keyParts), np.concatenate(refParts)
+def windowPairs(matrix, windowOrder, windowSize):
+    # Sorted-neighborhood pairs of each row, the row is ordered by windowOrder and every
+    # reference is paired with the next windowSize-1 references
+    matrix = np.take_along_axis(matrix, windowOrder.rowOrders(matrix), axis=1)
+    refParts = []
+    for d in range(1, min(windowSize, matrix.shape[1])):
+        refParts.append((matrix[:, :-d], matrix[:, d:]))
+    refM = np.concatenate([part[0] for part in refParts], axis=1)
+    refN = np.concatenate([part[1] for part in refParts], axis=1)
+    return np.minimum(refM, refN), np.maximum(refM, refN)
+def buildPairCodes(keys, refOrdinals, refCnt, maxBlockSize=0, windowSize=10, windowOrder=None):
+    # Returns (pairCodes, blockSizes, blockPairCnts), all pairs of references sharing a blocking
+    # key, and the size and emitted pair count of every block with more than one reference.
+    # Blocks larger than maxBlockSize (when > 0) only emit the pairs of a sorted-neighborhood window.
+    order = np.lexsort((refOrdinals, keys))
+    keys = keys[order]
+    refOrdinals = refOrdinals[order]
+    empty = np.zeros(0, dtype=np.int64)
+    if len(keys) == 0:
+        return empty, empty, empty
+    blockStarts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    blockSizes = np.diff(np.append(blockStarts, len(keys)))
+    blockPairCnts = np.zeros(len(blockSizes), dtype=np.int64)
+    codeParts = [empty]
+    for n in np.unique(blockSizes[blockSizes >= 2]).tolist():
+        rows, matrix = rowsOfLength(refOrdinals, blockStarts, blockSizes, n)
+        if maxBlockSize > 0 and n > maxBlockSize:
+            refM, refN = windowPairs(matrix, windowOrder, windowSize)
+        else:
+            refM, refN = combinations(matrix)
+        blockPairCnts[rows] = refM.shape[1]
+        codeParts.append((refM*refCnt + refN).ravel())
+    isBlock = blockSizes >= 2
+    return np.concatenate(codeParts), blockSizes[isBlock], blockPairCnts[isBlock]
+def uniquePairCodes(pairCodes):
+    # Returns (unique codes, occurrences of each code), the occurrences are the blocks shared
+    # by the pair and are only counted when meta-blocking uses them
+    if DWM10_Parms.metaBlocking == 'None':
+        return np.unique(pairCodes), None
+    return np.unique(pairCodes, return_counts=True)
+def saveWeightState(pairCodes, sharedCnts, keys, keyRefs, sortedRefIDs):
+    # Keep the shared block counts and the blocks size>1 of each reference for DWM48
+    global pairWeightState
+    if sharedCnts is None:
+        pairWeightState = None
+        return
+    inverse, blockSizes = np.unique(keys, return_inverse=True, return_counts=True)[1:]
+    inBlock = blockSizes[inverse.reshape(-1)] >= 2
+    refBlockCnts = np.bincount(keyRefs[inBlock], minlength=len(sortedRefIDs))
+    pairWeightState = (pairCodes, sharedCnts, refBlockCnts, sortedRefIDs)
+class WindowOrder:
+    # Order of the references of the blocks larger than maxBlockSize, computed when such a block
+    # is windowed and only for its references. The references of a block are sorted on their
+    # tokens in reference order, without the tokens every reference of the block has (the block
+    # key), so neighbors agree on the tokens that tell the references of the block apart
+    def __init__(self, sortedRefIDs, refDict):
+        self.sortedRefIDs = sortedRefIDs
+        self.refDict = refDict
+    def rowOrders(self, matrix):
+        # Column order of each row of reference ordinals, ties keep the ordinal order
+        vocabulary = DWM13_TokenVocabulary.getVocabulary()
+        tokens = vocabulary.tokens
+        rowOrders = np.empty(matrix.shape, dtype=np.int64)
+        for row, ordinals in enumerate(matrix.tolist()):
+            refTokenIDs = [vocabulary.refTokenIDs(self.sortedRefIDs[ordinal], self.refDict).tolist() for ordinal in ordinals]
+            shared = set(refTokenIDs[0]).intersection(*refTokenIDs[1:])
+            sortKeys = [tuple(tokens[tokenID] for tokenID in tokenIDs if tokenID not in shared) for tokenIDs in refTokenIDs]
+            rowOrders[row] = sorted(range(len(ordinals)), key=sortKeys.__getitem__)
+        return rowOrders
+def logBlockHistogram(blockSizes, blockPairCnts, maxBlockSize, logFile):
+    # Block count and emitted pairs by block size, sizes are grouped in powers of 2
+    if len(blockSizes) == 0:
+        return
+    buckets = np.ceil(np.log2(blockSizes)).astype(np.int64)
+    blockCnts = np.bincount(buckets)
+    pairCnts = np.bincount(buckets, weights=blockPairCnts)
+    print('Block Size Histogram: size range, blocks, pairs emitted')
+    print('Block Size Histogram: size range, blocks, pairs emitted', file=logFile)
+    for bucket in np.flatnonzero(blockCnts).tolist():
+        low = 2**(bucket-1)+1 if bucket > 1 else 2
+        high = 2**bucket
+        sizeRange = str(low) if low == high else str(low)+'-'+str(high)
+        print('  ', sizeRange, int(blockCnts[bucket]), int(pairCnts[bucket]))
+        print('  ', sizeRange, int(blockCnts[bucket]), int(pairCnts[bucket]), file=logFile)
+    print('Largest Block Size =', int(blockSizes.max()))
+    print('Largest Block Size =', int(blockSizes.max()), file=logFile)
+    if maxBlockSize > 0:
+        oversizedCnt = int(np.count_nonzero(blockSizes > maxBlockSize))
+        print('Blocks Over maxBlockSize Windowed =', oversizedCnt)
+        print('Blocks Over maxBlockSize Windowed =', oversizedCnt, file=logFile)
+def codeOrderIsStringOrder(sortedRefIDs):
+    # Code order equals 'refA|refB' string order unless a refID contains '|' or is a prefix of
+    # another refID, a prefix is always followed by a refID starting with it in sorted order
+    for j in range(len(sortedRefIDs)):
+        if '|' in sortedRefIDs[j] or (j > 0 and sortedRefIDs[j].startswith(sortedRefIDs[j-1])):
+            return False
+    return True
+def decodePairCodes(pairCodes, sortedRefIDs, sortStrings=None):
+    # 'refA|refB' strings of the pair codes, in the order of sorted strings
+    refCnt = len(sortedRefIDs)
+    pairList = [sortedRefIDs[refA]+'|'+sortedRefIDs[refB]
+                for refA, refB in zip((pairCodes // refCnt).tolist(), (pairCodes % refCnt).tolist())]
+    if sortStrings is None:
+        sortStrings = not codeOrderIsStringOrder(sortedRefIDs)
+    if sortStrings:
+        pairList.sort()
+    return pairList
+def blockingFrequencies(tokenFreqDict):
+    # Returns (eligible, freq) indexed by token ID, eligible is True for the tokens long enough
+    # (and not numeric if excluded) to block on, the key tokens of the blocking key functions
+    # get the sum of the frequencies of the eligible tokens mapped to them
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    keyIndex = DWM38_BlockingKeyFunctions.getKeyIndex()
+    freq = vocabulary.frequencyArray(tokenFreqDict)
+    eligible = vocabulary.tokenLengths() >= DWM10_Parms.minBlkTokenLen
+    if DWM10_Parms.excludeNumericBlocks:
+        eligible &= ~vocabulary.numericFlags()
+    if keyIndex is not None:
+        freq = keyIndex.keyFrequencies(eligible, freq)
+    return eligible, freq
+def blockingMask(tokenFreqDict, beta):
+    # True for the blocking token IDs, with one more row per blocking key function that is
+    # True for the token IDs whose key token is a blocking token
+    eligible, freq = blockingFrequencies(tokenFreqDict)
+    isBlkID = eligible & (freq >= 2) & (freq <= beta)
+    keyIndex = DWM38_BlockingKeyFunctions.getKeyIndex()
+    if keyIndex is None:
+        return isBlkID
+    return np.vstack([isBlkID] + keyIndex.passMasks(eligible, freq, beta))
+def uniqueKeyOrder(*columns):
+    # Positions of the distinct rows of the columns, sorted on the last column then the others
+    order = np.lexsort(columns)
+    isNew = np.zeros(len(order), dtype=bool)
+    isNew[:1] = True
+    for column in columns:
+        isNew[1:] |= column[order][1:] != column[order][:-1]
+    return order[isNew]
+def blockingRecords(refIDs, refOrdinals, refDict, isBlkID, blockByPairs, keyBase=None):
+    # Returns (keys, refOrdinals) of the blocking records of the references in refIDs
+    # Token pair keys are first*keyBase+second, keyBase defaults to the vocabulary size
+    # isBlkID comes from blockingMask, its extra rows are the passes of the blocking key functions
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    flatIDs, offsets = vocabulary.encodeRefs(refIDs, refDict)
+    flatRefs = np.repeat(refOrdinals, np.diff(offsets))
+    keyBase = keyBase or len(vocabulary)
+    address = None
+    if blockByPairs and DWM10_Parms.fieldAwareBlocking:
+        # Split each reference into its name and address parts once, in the same pass
+        address = vocabulary.addressFlags(flatIDs, offsets)
+    masks = np.atleast_2d(isBlkID)
+    keyParts = []
+    refParts = []
+    for row in range(len(masks)):
+        blkMask = masks[row][flatIDs]
+        blkRefs = flatRefs[blkMask]
+        blkAddress = None if address is None else address[blkMask]
+        if row == 0:
+            blkIDs = flatIDs[blkMask]
+            # Keep the blocking tokens grouped by reference, in token order, ordered by ordinal
+            order = np.argsort(blkRefs, kind='stable')
+        else:
+            blkIDs = DWM38_BlockingKeyFunctions.getKeyIndex().tokenKeys[row-1][flatIDs[blkMask]]
+            # Tokens of a reference with the same key token give one key token
+            if blkAddress is None:
+                order = uniqueKeyOrder(blkIDs, blkRefs)
+            else:
+                order = uniqueKeyOrder(blkAddress, blkIDs, blkRefs)
+        keys, keyRefs = buildBlockingKeys(blkIDs[order], blkRefs[order], blockByPairs, keyBase,
+                                          None if blkAddress is None else blkAddress[order])
+        keyParts.append(keys)
+        refParts.append(keyRefs)
+    if len(keyParts) == 1:
+        return keyParts[0], refParts[0]
+    return np.concatenate(keyParts), np.concatenate(refParts)
+
+
+# Unique pair codes of the last buildBlockPairs call, their shared block counts, the blocks
+# of each reference and the refIDs of the ordinals, None unless meta-blocking is used
+pairWeightState = None
 def buildBlockPairs(refDict, linkIndex, tokenFreqDict):
+    global pairWeightState
+    pairWeightState = None
     logFile = DWM10_Parms.logFile
     print('\n>>Starting DWM42')
     print('\n>>Starting DWM42', file=logFile)
     blockByPairs = DWM10_Parms.blockByPairs
-    blockList = []
     stopCnt = 0
+    if DWM10_Parms.blockingMode == 'Token' and (DWM10_Parms.reportPairBudget or DWM10_Parms.maxCandidatePairs > 0):
+        # Estimate the pairs of each beta, and pick beta when there is a pair budget
+        DWM39_PairBudget.runPairBudget(refDict, linkIndex, tokenFreqDict)
     beta = DWM10_Parms.beta
     print('beta =',beta)
     print('beta =',beta, file=logFile)
@@ -30,96 +263,85 @@ def buildBlockPairs(refDict, linkIndex, tokenFreqDict):
     print('exclude numeric blocking tokens =', excludeNumericBlocks, file=logFile)
     print('block by pairs of tokens =', blockByPairs)
     print('block by pairs of tokens =', blockByPairs, file=logFile)    
-    # blockList is a list of ordered pairs (blockingValue, RefID) where blockingValue
-    # is a single blocking token when "blockByPairs is False"
-    # or concatenated pairs of blocking tokens when "blockByPairs is True"
-    blockList =[]
-    selectCnt = 0
-    # First extract the blocking tokens from each reference into blockTokenList
-    for key in linkIndex:
-        if len(linkIndex[key])>0:
-            continue
-        selectCnt +=1
-        tokenList = refDict[key]
-        blockTokenList = []
-        for token in tokenList:
-            # Decide if token is going to be a Blocking Token
-            isBlkToken = True
-            if len(token)<minBlkTokenLen:
-                isBlkToken = False
-            if excludeNumericBlocks and token.isdigit():
-                isBlkToken = False
-            freq = tokenFreqDict[token]
-            if freq < 2 or freq > beta:
-                isBlkToken = False
-            if isBlkToken:
-                blockTokenList.append(token)
-        tokenCnt = len(blockTokenList)
-        # If there were no blocking tokens, then nothing to do
-        if tokenCnt < 1:
-            continue
-        # When "blockByPairs==True" form all pairs from list
-        if blockByPairs:
-            if tokenCnt < 2:
-                continue
-            for j in range(0, tokenCnt-1):
-                for k in range(j+1, tokenCnt):
-                    tokenJ = blockTokenList[j]
-                    tokenK = blockTokenList[k]
-                    # Always concatenate pairs in ascending order
-                    if tokenJ < tokenK:
-                        blockList.append((tokenJ+tokenK, key))
-                    else:
-                        blockList.append((tokenK+tokenJ, key))
+    # Blocking records are pairs (blocking key, reference ordinal) where the key is a single
+    # blocking token when "blockByPairs is False"
+    # or an unordered pair of blocking tokens when "blockByPairs is True"
+    # First extract the blocking tokens from each reference
+    selectList = [key for key in linkIndex if len(linkIndex[key])==0]
+    selectCnt = len(selectList)
+    maxBlockSize = DWM10_Parms.maxBlockSize
+    windowSize = DWM10_Parms.blockWindowSize
+    blockingMode = DWM10_Parms.blockingMode
+    print('blocking mode =', blockingMode)
+    print('blocking mode =', blockingMode, file=logFile)
+    if DWM10_Parms.useBlockingKeyIndex and blockingMode == 'Token':
+        # Reuse the blocking keys of the earlier iterations, only changed references are recomputed
+        index = DWM41_BlockingKeyIndex.getIndex(refDict)
+        recomputeCnt = index.update(refDict, linkIndex, tokenFreqDict)
+        print('Blocking Key Index References Recomputed =', recomputeCnt)
+        print('Blocking Key Index References Recomputed =', recomputeCnt, file=logFile)
+        keys, keyRefs = index.blockRecords()
+        blockListLen = index.recordCnt
+        windowOrder = WindowOrder(index.sortedRefIDs, refDict)
+        pairCodes, blockSizes, blockPairCnts = buildPairCodes(keys, keyRefs, len(index.sortedRefIDs), maxBlockSize, windowSize, windowOrder)
+        pairCnt = len(pairCodes)
+        pairCodes, sharedCnts = uniquePairCodes(pairCodes)
+        saveWeightState(pairCodes, sharedCnts, keys, keyRefs, index.sortedRefIDs)
+        blockPairList = decodePairCodes(pairCodes, index.sortedRefIDs)
+        return reportBlockPairs(selectCnt, blockListLen, blockSizes, blockPairCnts, maxBlockSize, pairCnt, blockPairList)
+    # Decide once per token ID if it is a blocking token, instead of once per occurrence
+    isBlkID = blockingMask(tokenFreqDict, beta)
+    # Number the selected references in sorted refID order
+    sortedRefIDs = sorted(selectList)
+    ordinalOf = {refID: ordinal for ordinal, refID in enumerate(sortedRefIDs)}
+    refOrdinals = np.array([ordinalOf[refID] for refID in selectList], dtype=np.int64)
+    windowOrder = WindowOrder(sortedRefIDs, refDict)
+    if DWM10_Parms.blockingMemoryMB > 0 and blockingMode == 'Token':
+        # Spill sorted runs of blocking records and pair codes to disk, same pairs as below
+        blockListLen, blockSizes, blockPairCnts, pairCnt, blockPairList = DWM43_ExternalBlocking.externalBlockPairs(
+            selectList, refOrdinals, sortedRefIDs, refDict, isBlkID, blockByPairs, windowOrder)
+    elif blockingMode == 'SortedNeighborhood':
+        # Each window of the sort passes is reported as a block of its anchor and partners
+        blockListLen, windowKeys, windowRefs, pairCodes = DWM40_SortedNeighborhood.sortedNeighborhoodRecords(
+            selectList, refOrdinals, refDict, tokenFreqDict)
+        blockSizes = np.unique(windowKeys, return_counts=True)[1]
+        blockPairCnts = blockSizes-1
+        pairCnt = len(pairCodes)
+        pairCodes, sharedCnts = uniquePairCodes(pairCodes)
+        saveWeightState(pairCodes, sharedCnts, windowKeys, windowRefs, sortedRefIDs)
+        blockPairList = decodePairCodes(pairCodes, sortedRefIDs)
+    else:
+        if blockingMode == 'MinHashLSH':
+            keys, keyRefs = DWM47_MinHashBlocking.lshBlockingRecords(selectList, refOrdinals, refDict, tokenFreqDict)
         else:
-            for j in range(0, tokenCnt):
-                tokenJ = blockTokenList[j]
-                blockList.append((tokenJ, key))
-    # End of iteration of refDict
+            keys, keyRefs = blockingRecords(selectList, refOrdinals, refDict, isBlkID, blockByPairs)
+        blockListLen = len(keys)
+        # Phase 2, generate blocks and pairs of refs in each block
+        pool = DWM_Parallel.get_pool(DWM10_Parms.blockingWorkers)
+        if pool is not None:
+            with pool:
+                pairCnt, pairCodes, sharedCnts, blockSizes, blockPairCnts = DWM44_ParallelBlocking.parallelPairCodes(pool,
+                    DWM10_Parms.blockingWorkers, keys, keyRefs, selectCnt, maxBlockSize, windowSize, windowOrder)
+        else:
+            pairCodes, blockSizes, blockPairCnts = buildPairCodes(keys, keyRefs, selectCnt, maxBlockSize, windowSize, windowOrder)
+            pairCnt = len(pairCodes)
+            pairCodes, sharedCnts = uniquePairCodes(pairCodes)
+        saveWeightState(pairCodes, sharedCnts, keys, keyRefs, sortedRefIDs)
+        # Deduplicate and sort pair list
+        blockPairList = decodePairCodes(pairCodes, sortedRefIDs)
+    return reportBlockPairs(selectCnt, blockListLen, blockSizes, blockPairCnts, maxBlockSize, pairCnt, blockPairList)
+def reportBlockPairs(selectCnt, blockListLen, blockSizes, blockPairCnts, maxBlockSize, pairCnt, blockPairList):
+    logFile = DWM10_Parms.logFile
     print('Total Records Selected for Reprocessing', selectCnt)
     print('Total Records Selected for Reprocessing', selectCnt, file=logFile)    
-    # Sort blockList 
-    blockList.sort()
-    blockListLen = len(blockList)
     print('Total Blocking Records Created', blockListLen)
     print('Total Blocking Records Created', blockListLen, file=logFile)
-    # Phase 2, generate blocks and pairs of refs in each block
-    # start by appending a caboose to the end of the blockList
-    blockList.append(('XXXXX','X'))
-    block = []
-    blockPairList = []
-    blockCnt = 0
-    for j in range(0,blockListLen):
-        currPair = blockList[j]
-        currBlockToken = currPair[0]
-        block.append(currPair)
-        nextPair = blockList[j+1]
-        nextBlockToken = nextPair[0]
-        if currBlockToken != nextBlockToken:
-            blockLen = len(block)
-            if blockLen > 1:
-                blockCnt +=1
-                for m in range(0,blockLen-1):
-                    pairM = block[m]
-                    refIDm = pairM[1]                    
-                    for n in range(m+1,blockLen):
-                        pairN = block[n]
-                        refIDn = pairN[1]
-                        if refIDm < refIDn:
-                            blockPairList.append(refIDm+'|'+refIDn)
-                        else:
-                            blockPairList.append(refIDn+'|'+refIDm)
-            # End of pair generation loop            
-            block.clear()   
-    # End of j loop
+    blockCnt = len(blockSizes)
     print('Total Blocks Size>1 Created', blockCnt)
     print('Total Blocks Size>1 Created', blockCnt, file=logFile)    
-    # Deduplicate and sort pair list
-    print('Total Pairs Generated by Blocks=', len(blockPairList))
-    print('Total Pairs Generated by Blocks=', len(blockPairList), file=logFile)
-    blockPairList = list(set(blockPairList))
-    blockPairList.sort()
+    logBlockHistogram(blockSizes, blockPairCnts, maxBlockSize, logFile)
+    print('Total Pairs Generated by Blocks=', pairCnt)
+    print('Total Pairs Generated by Blocks=', pairCnt, file=logFile)
     print('Total Unduplicated Pairs =', len(blockPairList))
     print('Total Unduplicated Pairs =', len(blockPairList), file=logFile)     
     return blockPairList
-
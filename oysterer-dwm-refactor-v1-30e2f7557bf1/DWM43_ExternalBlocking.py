@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import DWM10_Parms
+import DWM42_BuildBlockPairs
+# External-memory blocking used by DWM42 when blockingMemoryMB > 0. Blocking records
+# (key, reference ordinal) are generated for a batch of references at a time, sorted and
+# written to temporary run files whenever the records in memory reach the budget. The runs
+# are merged in key order a batch at a time, each merged batch only holds complete blocks,
+# and the pair codes of those blocks are written to a second set of sorted runs. Merging
+# those runs removes duplicate pairs and decodes them to the 'refA|refB' strings. The pairs,
+# their order and the statistics are the same as the in-memory path.
+# Bytes of memory used per blocking record and per pair code, including sort workspace
+recordBytes = 48
+pairCodeBytes = 24
+# References tokenized per batch while generating blocking records
+refBatchSize = 10000
+
+
+# In[ ]:
+
+
+class RunWriter:
+    # Collects arrays until they reach limit entries, then writes them sorted as a run file
+    def __init__(self, tempDir, prefix, limit, sortRun):
+        self.tempDir = tempDir
+        self.prefix = prefix
+        self.limit = max(limit, 1)
+        self.sortRun = sortRun
+        self.parts = []
+        self.size = 0
+        self.runPaths = []
+    def add(self, *columns):
+        self.parts.append(columns)
+        self.size += len(columns[0])
+        if self.size >= self.limit:
+            self.flush()
+    def flush(self):
+        if self.size == 0:
+            return
+        columns = [np.concatenate([part[j] for part in self.parts]) for j in range(len(self.parts[0]))]
+        self.parts = []
+        self.size = 0
+        run = self.sortRun(*columns)
+        path = os.path.join(self.tempDir, self.prefix+str(len(self.runPaths))+'.npy')
+        np.save(path, run)
+        self.runPaths.append(path)
+def sortRecords(keys, refOrdinals):
+    order = np.lexsort((refOrdinals, keys))
+    return np.stack((keys[order], refOrdinals[order]), axis=1)
+def sortPairCodes(pairCodes):
+    return np.unique(pairCodes)
+
+
+# In[ ]:
+
+
+def mergeRuns(runPaths, batchSize, keyOf):
+    # Yield batches of rows merged in key order from sorted run files, a batch holds every row
+    # of each key it contains. keyOf returns the merge key column of a block of rows.
+    runs = [np.load(path, mmap_mode='r') for path in runPaths]
+    positions = [0]*len(runs)
+    readSizes = [max(batchSize//max(len(runs), 1), 1)]*len(runs)
+    while True:
+        buffers = []
+        bound = None
+        for j in range(len(runs)):
+            if positions[j] >= len(runs[j]):
+                buffers.append(None)
+                continue
+            buffer = runs[j][positions[j]:positions[j]+readSizes[j]]
+            buffers.append(buffer)
+            if positions[j]+len(buffer) < len(runs[j]):
+                # Rows with the last key of this buffer may continue past the buffer
+                lastKey = keyOf(buffer[-1:])[0]
+                if bound is None or lastKey < bound:
+                    bound = lastKey
+        if all(buffer is None for buffer in buffers):
+            return
+        parts = []
+        for j in range(len(runs)):
+            if buffers[j] is None:
+                continue
+            if bound is None:
+                taken = len(buffers[j])
+            else:
+                taken = int(np.searchsorted(keyOf(buffers[j]), bound, side='left'))
+            if taken > 0:
+                parts.append(np.asarray(buffers[j][:taken]))
+                positions[j] += taken
+        if len(parts) == 0:
+            # Every buffered row has the bound key, read more of the runs that stop at it
+            for j in range(len(runs)):
+                if buffers[j] is not None and keyOf(buffers[j][-1:])[0] == bound:
+                    readSizes[j] *= 2
+            continue
+        yield np.concatenate(parts)
+
+
+# In[ ]:
+
+
+def externalBlockPairs(selectList, refOrdinals, sortedRefIDs, refDict, isBlkID, blockByPairs, windowOrder):
+    # Returns (blockListLen, blockSizes, blockPairCnts, pairCnt, blockPairList)
+    logFile = DWM10_Parms.logFile
+    memoryBytes = DWM10_Parms.blockingMemoryMB*1024*1024
+    tempDir = tempfile.mkdtemp(prefix='DWM43_', dir=DWM10_Parms.blockingTempDir or None)
+    print('External Blocking Memory Budget MB =', DWM10_Parms.blockingMemoryMB)
+    print('External Blocking Memory Budget MB =', DWM10_Parms.blockingMemoryMB, file=logFile)
+    try:
+        refCnt = len(sortedRefIDs)
+        # Phase 1, sorted runs of blocking records
+        recordWriter = RunWriter(tempDir, 'records', memoryBytes//recordBytes, sortRecords)
+        blockListLen = 0
+        for start in range(0, len(selectList), refBatchSize):
+            keys, keyRefs = DWM42_BuildBlockPairs.blockingRecords(selectList[start:start+refBatchSize],
+                refOrdinals[start:start+refBatchSize], refDict, isBlkID, blockByPairs)
+            blockListLen += len(keys)
+            recordWriter.add(keys, keyRefs)
+        recordWriter.flush()
+        # Phase 2, merge the record runs into complete blocks and write runs of pair codes
+        pairWriter = RunWriter(tempDir, 'pairs', memoryBytes//pairCodeBytes, sortPairCodes)
+        sizeParts = [np.zeros(0, dtype=np.int64)]
+        pairCntParts = [np.zeros(0, dtype=np.int64)]
+        pairCnt = 0
+        for records in mergeRuns(recordWriter.runPaths, memoryBytes//recordBytes, lambda rows: rows[:, 0]):
+            pairCodes, blockSizes, blockPairCnts = DWM42_BuildBlockPairs.buildPairCodes(records[:, 0], records[:, 1],
+                refCnt, DWM10_Parms.maxBlockSize, DWM10_Parms.blockWindowSize, windowOrder)
+            sizeParts.append(blockSizes)
+            pairCntParts.append(blockPairCnts)
+            pairCnt += len(pairCodes)
+            pairWriter.add(pairCodes)
+        pairWriter.flush()
+        print('Blocking Record Runs =', len(recordWriter.runPaths), ' Pair Code Runs =', len(pairWriter.runPaths))
+        print('Blocking Record Runs =', len(recordWriter.runPaths), ' Pair Code Runs =', len(pairWriter.runPaths), file=logFile)
+        # Phase 3, merge the pair code runs, removing duplicates, and decode them
+        sortStrings = not DWM42_BuildBlockPairs.codeOrderIsStringOrder(sortedRefIDs)
+        blockPairList = []
+        for pairCodes in mergeRuns(pairWriter.runPaths, memoryBytes//pairCodeBytes, lambda rows: rows):
+            # A batch holds every copy of each code it contains, so np.unique removes all duplicates
+            blockPairList.extend(DWM42_BuildBlockPairs.decodePairCodes(np.unique(pairCodes), sortedRefIDs, False))
+        if sortStrings:
+            blockPairList.sort()
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+    return blockListLen, np.concatenate(sizeParts), np.concatenate(pairCntParts), pairCnt, blockPairList
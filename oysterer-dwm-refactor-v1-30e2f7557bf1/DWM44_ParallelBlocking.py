@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM42_BuildBlockPairs
+# Parallel pair generation used by DWM42 when blockingWorkers > 1. Blocking records are
+# hash-partitioned by key, so every block falls in exactly one partition, and the records are
+# grouped by partition before the pool starts. The forked workers inherit the grouped arrays,
+# each task only receives a partition number and returns the locally deduplicated pair codes
+# and block statistics of that partition. The parent merges them into the global pair set.
+# Multiplier of the key hash (Fibonacci hashing)
+hashMultiplier = np.uint64(0x9E3779B97F4A7C15)
+# Arrays shared with the workers, set before the first task is submitted
+sharedRecords = None
+
+
+# In[ ]:
+
+
+def partitionOf(keys, partitionCnt):
+    return ((keys.astype(np.uint64)*hashMultiplier) >> np.uint64(32)) % np.uint64(partitionCnt)
+def pairPartition(partition, refCnt, maxBlockSize, windowSize):
+    # Worker task, returns (pairs generated, unique pair codes, code occurrences, block sizes, block pair counts)
+    keys, refOrdinals, partitionStarts, windowOrder = sharedRecords
+    start = partitionStarts[partition]
+    end = partitionStarts[partition+1]
+    pairCodes, blockSizes, blockPairCnts = DWM42_BuildBlockPairs.buildPairCodes(keys[start:end], refOrdinals[start:end],
+        refCnt, maxBlockSize, windowSize, windowOrder)
+    uniqueCodes, sharedCnts = DWM42_BuildBlockPairs.uniquePairCodes(pairCodes)
+    return len(pairCodes), uniqueCodes, sharedCnts, blockSizes, blockPairCnts
+def parallelPairCodes(pool, workers, keys, refOrdinals, refCnt, maxBlockSize, windowSize, windowOrder):
+    # Returns (pairs generated, unique pair codes, code occurrences, block sizes, block pair counts)
+    # for all records, the occurrences are None unless meta-blocking uses them
+    global sharedRecords
+    logFile = DWM10_Parms.logFile
+    chunkSize = DWM10_Parms.blockingChunkSize
+    partitionCnt = max(workers, -(-len(keys)//chunkSize))
+    partitions = partitionOf(keys, partitionCnt)
+    order = np.argsort(partitions, kind='stable')
+    partitionStarts = np.searchsorted(partitions[order], np.arange(partitionCnt+1, dtype=np.uint64))
+    sharedRecords = (keys[order], refOrdinals[order], partitionStarts, windowOrder)
+    print('Parallel Blocking Workers =', workers, ' Partitions =', partitionCnt)
+    print('Parallel Blocking Workers =', workers, ' Partitions =', partitionCnt, file=logFile)
+    try:
+        futures = [pool.submit(pairPartition, partition, refCnt, maxBlockSize, windowSize)
+                   for partition in range(partitionCnt)]
+        results = [future.result() for future in futures]
+    finally:
+        sharedRecords = None
+    pairCnt = sum(result[0] for result in results)
+    if results[0][2] is None:
+        pairCodes = np.unique(np.concatenate([result[1] for result in results]))
+        sharedCnts = None
+    else:
+        # A pair can come from blocks in several partitions, add up its occurrences
+        pairCodes, inverse = np.unique(np.concatenate([result[1] for result in results]), return_inverse=True)
+        sharedCnts = np.bincount(inverse.reshape(-1), np.concatenate([result[2] for result in results]),
+                                 len(pairCodes)).astype(np.int64)
+    blockSizes = np.concatenate([result[3] for result in results])
+    blockPairCnts = np.concatenate([result[4] for result in results])
+    return pairCnt, pairCodes, sharedCnts, blockSizes, blockPairCnts
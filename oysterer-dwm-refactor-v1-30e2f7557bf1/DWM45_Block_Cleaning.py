@@ -6,67 +6,115 @@
 
 import re
 import os
-import csv
+import bisect
 import sys
 import time
+from collections import Counter
 from datetime import datetime
 import DWM10_Parms
+import DWM11_ResourceLoader
 from textdistance import Levenshtein
 from textdistance import DamerauLevenshtein
 changeCount = 0
+# One comparator for every distance check of the run
+damerauLevenshtein = DamerauLevenshtein()
 
 
 # In[2]:
 
 
 def normalLED(token1,token2):
-    Class = DamerauLevenshtein()
     length = max(len(token1), len(token2))
     # normalize by length, high score wins
-    dDist = Class.distance(token1,token2)
+    dDist = damerauLevenshtein.distance(token1,token2)
     fDist = float(length - dDist)/ float(length);
     return fDist, dDist
 
 
+# In[ ]:
+
+
+class AnchorIndex:
+    # Positions of the (t, t+1, t+2) token windows of one reference, by token t and by the
+    # tokens (t+1, t+2). tokenLogicNew only acts on a position of rowK whose token equals the
+    # rowJ token or whose next two tokens equal the next two rowJ tokens, every other position
+    # is a no-op, so the aligned positions are found with two lookups instead of a scan.
+    def __init__(self, tokens):
+        self.build(tokens)
+    def build(self, tokens):
+        self.tokenPositions = {}
+        self.nextPairPositions = {}
+        for position, token in enumerate(tokens):
+            self.tokenPositions.setdefault(token, []).append(position)
+            if position+2 < len(tokens):
+                self.nextPairPositions.setdefault((tokens[position+1], tokens[position+2]), []).append(position)
+    def alignedPositions(self, token, rowTokens, rowIndex, start):
+        # Sorted positions >= start aligned with token at rowIndex of rowTokens
+        positions = self.tokenPositions.get(token, [])
+        aligned = positions[bisect.bisect_left(positions, start):]
+        if rowIndex+2 < len(rowTokens):
+            positions = self.nextPairPositions.get((rowTokens[rowIndex+1], rowTokens[rowIndex+2]), [])
+            aligned = sorted(set(aligned).union(positions[bisect.bisect_left(positions, start):]))
+        return aligned
+
+
 # In[3]:
 
 
+# refIDs changed by the last RunBlockCorrections
+changedRefIDs = set()
+class BlockCorrections:
+    # Corrections counted per (from token, to token) and per type, an insertion has from token ''
+    correctionTypes = ('substitution', 'alias', 'insertion', 'merge')
+    def __init__(self):
+        self.pairCounts = Counter()
+        self.typeCounts = Counter()
+    def add(self, fromToken, toToken, correctionType):
+        self.pairCounts[(fromToken, toToken)] += 1
+        self.typeCounts[correctionType] += 1
+    def update(self, other):
+        self.pairCounts.update(other.pairCounts)
+        self.typeCounts.update(other.typeCounts)
+    def total(self):
+        return sum(self.typeCounts.values())
+# Corrections of the last RunBlockCorrections
+lastCorrections = BlockCorrections()
 def incTokenFreq(token,freqDict):
-    if token in freqDict:
-        freqDict[token] += 1
-    else:
-        freqDict[token] = 1
+    freqDict.addToken(token)
 
 
 # In[ ]:
 
 
 def decTokenFreq(token,freqDict):
-    if token in freqDict:
-        if freqDict[token] == 1:
-            del freqDict[token]
-        else:
-            freqDict[token] =- 1
+    freqDict.removeToken(token)
+
+
+# In[ ]:
+
+
+def replaceTokenFreq(oldToken,newToken,freqDict):
+    freqDict.replaceToken(oldToken,newToken)
 
 
 # In[4]:
 
 
+def loadBlockAliases():
+    # aliasDict from alias file, compiled by DWM11 on first use and memory-mapped afterwards
+    return DWM11_ResourceLoader.loadAliasDict('alias.dat')
 def isAlias(token1,token2,aliasDict):
-    if token1 in aliasDict:
-        if aliasDict[token1].lower() == token2.lower():
-            return True
-        else:
-            return False
-    else:
+    value = aliasDict.get(token1)
+    if value is None:
         return False
+    return value.lower() == token2.lower()
 
 
 # In[5]:
 
 
 def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
-    changeDict={}
+    changes = BlockCorrections()
     rowjTokens = refDict[rowjID]
     rowkTokens = refDict[rowkID]
     kRefID= rowkID
@@ -84,11 +132,28 @@ def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
         oldJ = None
         oldJ1 = None
         oldJ2 = None
+        anchors = AnchorIndex(rowkTokens)
+        def alignedPositions(j, indexJ):
+            # Same order as tokenLogicScan, the aligned positions after the current one are
+            # found again from the corrected tokens whenever this call makes a correction
+            start = 0
+            while True:
+                aligned = anchors.alignedPositions(j, rowjTokens, indexJ, start)
+                for indexK in aligned:
+                    lastTotal = changes.total()
+                    yield indexK
+                    if changes.total() != lastTotal:
+                        anchors.build(rowkTokens)
+                        start = indexK+1
+                        break
+                else:
+                    return
         for indexJ, j in enumerate(rowjTokens):
             oldK = None
             oldK1 = None
             oldK2 = None
-            for indexK, k in enumerate(rowkTokens):
+            for indexK in alignedPositions(j, indexJ):
+                k = rowkTokens[indexK]
                 if j==k:
                     if indexJ+2 < sizej:
                         tokenJ= j
@@ -126,45 +191,45 @@ def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
                         if tokenJ1 != tokenK1 and lenTokenK1 > 2 and lenTokenJ1 >2:
                             dist, dDist = normalLED(tokenJ1,tokenK1)
                             if dDist == 1:
-                                freqjToken = index[tokenJ1]
-                                freqkToken = index[tokenK1]
+                                freqjToken = index.get(tokenJ1,0)
+                                freqkToken = index.get(tokenK1,0)
                                 if freqjToken < freqkToken:
+                                    replaceTokenFreq(rowjTokens[indexJ+1],tokenK1,index)
                                     rowjTokens[indexJ+1] = tokenK1
                                     changeCount+=1
-                                    changeDict[str(tokenJ1)+","+str(tokenK1)]=changeDict.get(str(tokenJ1)+","+str(tokenK1),0)+1
-                                    incTokenFreq(tokenK1,index)
+                                    changes.add(tokenJ1, tokenK1, 'substitution')
                                     tokenJ1 = tokenK1
                                 elif freqjToken > freqkToken:
+                                    replaceTokenFreq(rowkTokens[indexK+1],tokenJ1,index)
                                     rowkTokens[indexK+1] = tokenJ1
                                     changeCount+=1
-                                    changeDict[str(tokenK1)+","+str(tokenJ1)]=changeDict.get(str(tokenK1)+","+str(tokenJ1),0)+1
-                                    incTokenFreq(tokenJ1,index)
+                                    changes.add(tokenK1, tokenJ1, 'substitution')
                         elif tokenJ2 == tokenK2 and isAlias(tokenJ1,tokenK1,aliasDict) == True:
+                            replaceTokenFreq(rowjTokens[indexJ+1],tokenK1,index)
                             rowjTokens[indexJ+1] = tokenK1
                             changeCount+=1
-                            changeDict[str(tokenJ1)+","+str(tokenK1)]=changeDict.get(str(tokenJ1)+","+str(tokenK1),0)+1
-                            incTokenFreq(tokenK1,index)
+                            changes.add(tokenJ1, tokenK1, 'alias')
                         elif tokenJ2 == tokenK2 and isAlias(tokenK1,tokenJ1,aliasDict) == True:
+                            replaceTokenFreq(rowkTokens[indexK+1],tokenJ1,index)
                             rowkTokens[indexK+1] = tokenJ1
                             changeCount+=1
-                            changeDict[str(tokenK1)+","+str(tokenJ1)]=changeDict.get(str(tokenK1)+","+str(tokenJ1),0)+1
-                            incTokenFreq(tokenJ1,index)
+                            changes.add(tokenK1, tokenJ1, 'alias')
                     elif tokenJ == tokenK and tokenJ1 == tokenK2 and tokenJ2 != tokenK1: 
                         lenTokenJ2 = len(tokenJ2)
                         if lenTokenJ2 > 2 and lenTokenK1 >2:
                             rowjTokens.insert(indexJ+1, tokenK1)
+                            incTokenFreq(tokenK1,index)
                             changeCount+=1
                             sizej=len(rowjTokens)
-                            changeDict[","+str(tokenK1)]=changeDict.get(","+str(tokenK1),0)+1
-                            incTokenFreq(tokenK1,index)
+                            changes.add('', tokenK1, 'insertion')
                     elif tokenJ == tokenK and tokenJ2 == tokenK1 and tokenJ1 != tokenK2: 
                         lenTokenK2 = len(tokenK2)
                         if lenTokenJ1 > 2 and lenTokenK2 >2:
                             rowkTokens.insert(indexK+1, tokenJ1)
+                            incTokenFreq(tokenJ1,index)
                             changeCount+=1
                             sizek=len(rowkTokens)
-                            changeDict[","+str(tokenJ1)]=changeDict.get(","+str(tokenJ1),0)+1
-                            incTokenFreq(tokenJ1,index)
+                            changes.add('', tokenJ1, 'insertion')
                     else:
                         inc = 1
                         tokenK1index=[]
@@ -183,25 +248,27 @@ def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
                                 if tokenJ2 == tokenK2:
                                     if tokenJ1 == tokenK1:
                                         if tokenK1.isdigit():
+                                            replaceTokenFreq(rowkTokens[tokenK1index[0]],tokenJ1,index)
                                             rowkTokens[tokenK1index[0]] = tokenJ1
                                             for t in tokenK1index[1:]:
+                                                decTokenFreq(rowkTokens[t],index)
                                                 del rowkTokens[t]
                                             changeCount+=1
                                             sizek=len(rowkTokens)
-                                            changeDict[str(tokenK1)+","+str(tokenJ1)]=changeDict.get(str(tokenK1)+","+str(tokenJ1),0)+1
-                                            incTokenFreq(tokenJ1,index)
+                                            changes.add(tokenK1, tokenJ1, 'merge')
                                             break
                                         else:
+                                            replaceTokenFreq(rowjTokens[indexJ+1],tokenK1List[0],index)
                                             rowjTokens[indexJ+1]=tokenK1List[0]
                                             tokenK1List.pop(0)
                                             newInc = 2
                                             for t in tokenK1List:
                                                 rowjTokens.insert(indexJ+newInc, t)
+                                                incTokenFreq(t,index)
                                                 newInc += 1
                                             changeCount+=1
                                             sizej=len(rowjTokens)
-                                            changeDict[str(tokenK1)+","+str(tokenJ1)]=changeDict.get(str(tokenK1)+","+str(tokenJ1),0)+1
-                                            incTokenFreq(tokenJ1,index)
+                                            changes.add(tokenK1, tokenJ1, 'merge')
                                             break
                                 else:
                                     continue        
@@ -214,18 +281,20 @@ def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
                                 if rowjTokens[indexJ+2] == rowkTokens[indexK+2]: 
                                     dist, dDist = normalLED(j,k)
                                     if dDist == 1:
-                                        freqjToken = index[j]
-                                        freqkToken = index[k]
+                                        # j is the value read when the loop reached indexJ, it may
+                                        # already have been replaced by an earlier correction
+                                        freqjToken = index.get(j,0)
+                                        freqkToken = index.get(k,0)
                                         if freqjToken < freqkToken:
+                                            replaceTokenFreq(rowjTokens[indexJ],k,index)
                                             rowjTokens[indexJ]=k
                                             tokenJ = k
-                                            changeDict[str(j)+","+str(k)]=changeDict.get(str(j)+","+str(k),0)+1
-                                            incTokenFreq(str(k),index)
+                                            changes.add(j, k, 'substitution')
                                         else:
+                                            replaceTokenFreq(rowkTokens[indexK],j,index)
                                             rowkTokens[indexK]=j
                                             tokenK = j
-                                            changeDict[str(k)+","+str(j)]=changeDict.get(str(k)+","+str(j),0)+1
-                                            incTokenFreq(str(j),index)
+                                            changes.add(k, j, 'substitution')
                                         changeCount+=1
                                     else:
                                         continue
@@ -240,7 +309,185 @@ def tokenLogicNew(rowjID, rowkID, index, logFile, aliasDict, refDict):
     #This updates the refDict with updated tokens from RowJ and rowK
     refDict[jRefID]=rowjTokens
     refDict[kRefID]=rowkTokens
-    return changeDict
+    return changes
+    
+
+
+# In[ ]:
+
+
+def tokenLogicScan(rowjID, rowkID, index, logFile, aliasDict, refDict):
+    # Reference implementation, compares each rowJ token with every rowK token. Same
+    # corrections, in the same order, as tokenLogicNew, it leaves changeCount unchanged.
+    changes = BlockCorrections()
+    rowjTokens = refDict[rowjID]
+    rowkTokens = refDict[rowkID]
+    kRefID= rowkID
+    kGroupID = "merged"
+    jRefID= rowjID
+    jGroupID = "merged"
+    if rowjTokens != rowkTokens:
+        sizej =len(rowjTokens)
+        sizek =len(rowkTokens)
+        rowJ= " ".join(rowjTokens)
+        rowK= " ".join(rowkTokens)
+        indexJinc = 0
+        mothod=1
+        oldJ = None
+        oldJ1 = None
+        oldJ2 = None
+        for indexJ, j in enumerate(rowjTokens):
+            oldK = None
+            oldK1 = None
+            oldK2 = None
+            for indexK, k in enumerate(rowkTokens):
+                if j==k:
+                    if indexJ+2 < sizej:
+                        tokenJ= j
+                        tokenJ1= rowjTokens[indexJ+1]
+                        tokenJ2= rowjTokens[indexJ+2]
+                        lenTokenJ = len(tokenJ)
+                        lenTokenJ1 = len(tokenJ1)
+                    else:
+                        continue
+                    if indexK+2 < sizek:
+                        tokenK= k
+                        tokenK1= rowkTokens[indexK+1]
+                        tokenK2= rowkTokens[indexK+2]
+                        lenTokenK = len(tokenK)
+                        lenTokenK1 = len(tokenK1)                            
+                    else:
+                        continue
+                    if tokenJ == tokenJ1:
+                        continue
+                    if tokenK == tokenK1:
+                        continue
+                    if oldJ == tokenJ and oldJ1 == tokenJ1 and oldJ2 ==tokenJ2:
+                        continue
+                    else:
+                        oldJ = tokenJ
+                        oldJ1 = tokenJ1 
+                        oldJ2 =tokenJ2
+                    if oldK == tokenK and oldK1 == tokenK1 and oldK2 ==tokenK2:
+                        continue
+                    else:
+                        oldK = tokenK
+                        oldK1 = tokenK1 
+                        oldK2 =tokenK2
+                    if tokenJ2 == tokenK2:
+                        if tokenJ1 != tokenK1 and lenTokenK1 > 2 and lenTokenJ1 >2:
+                            dist, dDist = normalLED(tokenJ1,tokenK1)
+                            if dDist == 1:
+                                freqjToken = index.get(tokenJ1,0)
+                                freqkToken = index.get(tokenK1,0)
+                                if freqjToken < freqkToken:
+                                    replaceTokenFreq(rowjTokens[indexJ+1],tokenK1,index)
+                                    rowjTokens[indexJ+1] = tokenK1
+                                    changes.add(tokenJ1, tokenK1, 'substitution')
+                                    tokenJ1 = tokenK1
+                                elif freqjToken > freqkToken:
+                                    replaceTokenFreq(rowkTokens[indexK+1],tokenJ1,index)
+                                    rowkTokens[indexK+1] = tokenJ1
+                                    changes.add(tokenK1, tokenJ1, 'substitution')
+                        elif tokenJ2 == tokenK2 and isAlias(tokenJ1,tokenK1,aliasDict) == True:
+                            replaceTokenFreq(rowjTokens[indexJ+1],tokenK1,index)
+                            rowjTokens[indexJ+1] = tokenK1
+                            changes.add(tokenJ1, tokenK1, 'alias')
+                        elif tokenJ2 == tokenK2 and isAlias(tokenK1,tokenJ1,aliasDict) == True:
+                            replaceTokenFreq(rowkTokens[indexK+1],tokenJ1,index)
+                            rowkTokens[indexK+1] = tokenJ1
+                            changes.add(tokenK1, tokenJ1, 'alias')
+                    elif tokenJ == tokenK and tokenJ1 == tokenK2 and tokenJ2 != tokenK1: 
+                        lenTokenJ2 = len(tokenJ2)
+                        if lenTokenJ2 > 2 and lenTokenK1 >2:
+                            rowjTokens.insert(indexJ+1, tokenK1)
+                            incTokenFreq(tokenK1,index)
+                            sizej=len(rowjTokens)
+                            changes.add('', tokenK1, 'insertion')
+                    elif tokenJ == tokenK and tokenJ2 == tokenK1 and tokenJ1 != tokenK2: 
+                        lenTokenK2 = len(tokenK2)
+                        if lenTokenJ1 > 2 and lenTokenK2 >2:
+                            rowkTokens.insert(indexK+1, tokenJ1)
+                            incTokenFreq(tokenJ1,index)
+                            sizek=len(rowkTokens)
+                            changes.add('', tokenJ1, 'insertion')
+                    else:
+                        inc = 1
+                        tokenK1index=[]
+                        tokenK1List=[]
+                        tokenK1List.append(tokenK1)
+                        tokenK1index.append(int(indexK+1))
+                        for indexK2, k2 in enumerate(rowkTokens):
+                            if indexK2 < indexK+2:
+                                continue
+                            if indexK2+inc+2 < sizek:
+                                tokenK= tokenK
+                                tokenK1= tokenK1+tokenK2
+                                tokenK1List.append(tokenK2)
+                                tokenK1index.append(int(indexK2))
+                                tokenK2= rowkTokens[indexK2+inc]
+                                if tokenJ2 == tokenK2:
+                                    if tokenJ1 == tokenK1:
+                                        if tokenK1.isdigit():
+                                            replaceTokenFreq(rowkTokens[tokenK1index[0]],tokenJ1,index)
+                                            rowkTokens[tokenK1index[0]] = tokenJ1
+                                            for t in tokenK1index[1:]:
+                                                decTokenFreq(rowkTokens[t],index)
+                                                del rowkTokens[t]
+                                            sizek=len(rowkTokens)
+                                            changes.add(tokenK1, tokenJ1, 'merge')
+                                            break
+                                        else:
+                                            replaceTokenFreq(rowjTokens[indexJ+1],tokenK1List[0],index)
+                                            rowjTokens[indexJ+1]=tokenK1List[0]
+                                            tokenK1List.pop(0)
+                                            newInc = 2
+                                            for t in tokenK1List:
+                                                rowjTokens.insert(indexJ+newInc, t)
+                                                incTokenFreq(t,index)
+                                                newInc += 1
+                                            sizej=len(rowjTokens)
+                                            changes.add(tokenK1, tokenJ1, 'merge')
+                                            break
+                                else:
+                                    continue        
+                else:
+                    if j.isnumeric() and k.isnumeric():
+                        continue
+                    if indexJ+2 < sizej and indexK+2 < sizek:
+                        if len(j) > 2 and len(k) > 2:
+                            if rowjTokens[indexJ+1] == rowkTokens[indexK+1]:
+                                if rowjTokens[indexJ+2] == rowkTokens[indexK+2]: 
+                                    dist, dDist = normalLED(j,k)
+                                    if dDist == 1:
+                                        # j is the value read when the loop reached indexJ, it may
+                                        # already have been replaced by an earlier correction
+                                        freqjToken = index.get(j,0)
+                                        freqkToken = index.get(k,0)
+                                        if freqjToken < freqkToken:
+                                            replaceTokenFreq(rowjTokens[indexJ],k,index)
+                                            rowjTokens[indexJ]=k
+                                            tokenJ = k
+                                            changes.add(j, k, 'substitution')
+                                        else:
+                                            replaceTokenFreq(rowkTokens[indexK],j,index)
+                                            rowkTokens[indexK]=j
+                                            tokenK = j
+                                            changes.add(k, j, 'substitution')
+                                    else:
+                                        continue
+                                else:
+                                    continue
+                            else:
+                                continue
+                        else:
+                            continue
+                    else:
+                        continue
+    #This updates the refDict with updated tokens from RowJ and rowK
+    refDict[jRefID]=rowjTokens
+    refDict[kRefID]=rowkTokens
+    return changes
     
 
 
@@ -253,18 +500,14 @@ def RunBlockCorrections(blockPairList, blockFreqDict, refDict): #bl = blockMap
     print('\n>>Starting DWM45 - blockCorrection is set to True', file=logFile)
     global changeCount
     changeCount = 0
+    # references whose token list was edited, used by DWM41 to recompute their blocking keys
+    global changedRefIDs
+    changedRefIDs = set()
+    global lastCorrections
+    lastCorrections = BlockCorrections()
     logFile = DWM10_Parms.logFile
-    changeDict={}
-    totalChangeDict={}
     
-    #Start Loop: load aliasDict from alias file
-    aliasDict = {}
-    with open('alias.dat', 'r') as aliasFile:
-        reader = csv.DictReader(aliasFile, delimiter='\t', fieldnames=['value', 'alias'])
-        for line in reader:
-            aliasDict[line['alias']]=line['value']
-    aliasFile.close()
-    #End Loop: Load aliasDict
+    aliasDict = loadBlockAliases()
     
     #itterate over blockPairList and cleanse each ref pair in list
     for line in blockPairList:
@@ -274,17 +517,30 @@ def RunBlockCorrections(blockPairList, blockFreqDict, refDict): #bl = blockMap
             continue
         refJID=line[0]
         refKID=line[1]
-        changeDict=tokenLogicNew(refJID, refKID, blockFreqDict, logFile, aliasDict, refDict)
-        #append changes to total dict and sum change count
-        totalChangeDict= {k: totalChangeDict.get(k, 0) + changeDict.get(k, 0) for k in set(totalChangeDict) | set(changeDict)}
+        beforeJ = list(refDict[refJID])
+        beforeK = list(refDict[refKID])
+        changes=tokenLogicNew(refJID, refKID, blockFreqDict, logFile, aliasDict, refDict)
+        if refDict[refJID] != beforeJ:
+            changedRefIDs.add(refJID)
+        if refDict[refKID] != beforeK:
+            changedRefIDs.add(refKID)
+        #add changes to the run totals
+        lastCorrections.update(changes)
+    reportCorrections(lastCorrections)
+    return changeCount
+def reportCorrections(corrections):
+    logFile = DWM10_Parms.logFile
     if DWM10_Parms.blockCorrectionDetail:
         print('>>List of Block Corrections sent to logFile')
         print('>>List of Block Corrections - blockCorrectionDetail = True', file=logFile)
-        for key in totalChangeDict:
-            print(str(key),file=logFile)
-    print("Block Token Corrections="+str(changeCount))
-    print("Block Token Corrections="+str(changeCount), file=logFile)
-    return changeCount
+        for fromToken, toToken in corrections.pairCounts:
+            print(fromToken+','+toToken,file=logFile)
+    print("Block Token Corrections="+str(corrections.total()))
+    print("Block Token Corrections="+str(corrections.total()), file=logFile)
+    typeCounts = '  '.join(correctionType+' = '+str(corrections.typeCounts[correctionType])
+                           for correctionType in BlockCorrections.correctionTypes)
+    print('Block Token Corrections by Type:', typeCounts)
+    print('Block Token Corrections by Type:', typeCounts, file=logFile)
 
 
 # In[ ]:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import sys
+import DWM10_Parms
+import DWM45_Block_Cleaning
+import DWM50_PartitionedRun
+import DWM_Parallel
+# Two-phase block correction used by the driver when blockCorrectionWorkers > 1. The pairs of
+# blockPairList are grouped into batches with no reference in common (connected components of
+# the pairs, packed like DWM50). Phase one runs DWM45 tokenLogicNew on each batch in a forked
+# worker, in blockPairList order, against copies of the batch references and the frequencies
+# of the snapshot plus the changes of the batch. Phase two applies the batches in order of
+# their first pair. A batch whose corrections reverse a correction already applied (x,y
+# against y,x) is not applied, it is run again on the current refDict and tokenFreqDict with
+# the DWM45 frequency rules. A batch does not see the frequency changes of the other batches,
+# so the result can differ from the sequential DWM45 run, blockCorrectionCompare=True also runs
+# DWM45 on a copy and reports the difference.
+
+
+# In[ ]:
+
+
+class FrequencyOverlay:
+    # Frequencies of a batch, snapshot plus batch changes, the changes are kept for phase two
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.delta = {}
+        self.updates = []
+    def get(self, token, default=0):
+        return self.snapshot.get(token, default) + self.delta.get(token, 0)
+    def addToken(self, token):
+        self.delta[token] = self.delta.get(token, 0) + 1
+        self.updates.append((True, token))
+    def removeToken(self, token):
+        # Same floor at zero as TokenFrequencyIndex.removeToken
+        if self.get(token, 0) == 0:
+            return
+        self.delta[token] = self.delta.get(token, 0) - 1
+        self.updates.append((False, token))
+    def replaceToken(self, oldToken, newToken):
+        if oldToken == newToken:
+            return
+        self.removeToken(oldToken)
+        self.addToken(newToken)
+def applyUpdates(updates, tokenFreqDict):
+    for isAdd, token in updates:
+        if isAdd:
+            tokenFreqDict.addToken(token)
+        else:
+            tokenFreqDict.removeToken(token)
+def correctBatch(pairPositions, blockPairList, tokenFreq, aliasDict, refDict):
+    # Runs tokenLogicNew on the pairs of a batch, returns the BlockCorrections of the batch
+    logFile = DWM10_Parms.logFile
+    corrections = DWM45_Block_Cleaning.BlockCorrections()
+    for j in pairPositions:
+        refJID, refKID = blockPairList[j].split('|')
+        if refJID.strip() == refKID.strip():
+            continue
+        corrections.update(DWM45_Block_Cleaning.tokenLogicNew(refJID, refKID, tokenFreq, logFile, aliasDict, refDict))
+    return corrections
+
+
+# In[ ]:
+
+
+# Data shared with the workers, set before the first task is submitted
+sharedCorrection = None
+def batchRefIDs(pairPositions, blockPairList):
+    refIDs = set()
+    for j in pairPositions:
+        refIDs.update(blockPairList[j].split('|'))
+    return refIDs
+def proposeBatch(batch):
+    # Worker task, returns (BlockCorrections, corrected references, frequency updates)
+    blockPairList, batches, refDict, tokenFreqDict, aliasDict = sharedCorrection
+    pairPositions = batches[batch]
+    batchRefs = {refID: list(refDict[refID]) for refID in batchRefIDs(pairPositions, blockPairList)}
+    tokenFreq = FrequencyOverlay(tokenFreqDict)
+    corrections = correctBatch(pairPositions, blockPairList, tokenFreq, aliasDict, batchRefs)
+    correctedRefs = {refID: tokens for refID, tokens in batchRefs.items() if tokens != refDict[refID]}
+    return corrections, correctedRefs, tokenFreq.updates
+def reversesApplied(corrections, appliedPairs):
+    for fromToken, toToken in corrections.pairCounts:
+        if fromToken != '' and (toToken, fromToken) in appliedPairs:
+            return True
+    return False
+def compareSequential(blockPairList, tokenFreqDict, refDict):
+    # Runs DWM45 on copies, returns (change count, corrected references, frequencies)
+    refIDs = batchRefIDs(range(len(blockPairList)), blockPairList)
+    sequentialRefs = {refID: list(refDict[refID]) for refID in refIDs}
+    # Overlay on a copy, tokenFreqDict is updated by phase two before the comparison
+    sequentialFreq = FrequencyOverlay(dict(tokenFreqDict))
+    with DWM50_PartitionedRun.quietStages():
+        changeCnt = DWM45_Block_Cleaning.RunBlockCorrections(blockPairList, sequentialFreq, sequentialRefs)
+    return changeCnt, sequentialRefs, sequentialFreq
+
+
+# In[ ]:
+
+
+def runParallelCorrections(blockPairList, tokenFreqDict, refDict):
+    global sharedCorrection
+    logFile = DWM10_Parms.logFile
+    workers = DWM10_Parms.blockCorrectionWorkers
+    print('\n>>Starting DWM46 - blockCorrection is set to True')
+    print('\n>>Starting DWM46 - blockCorrection is set to True', file=logFile)
+    aliasDict = DWM45_Block_Cleaning.loadBlockAliases()
+    if DWM10_Parms.blockCorrectionCompare:
+        sequential = compareSequential(blockPairList, tokenFreqDict, refDict)
+    components = DWM50_PartitionedRun.pairComponents(blockPairList)
+    batches = DWM50_PartitionedRun.packTasks(components, workers*DWM50_PartitionedRun.tasksPerWorker)
+    print('Parallel Block Correction Workers =', workers, ' Batches =', len(batches))
+    print('Parallel Block Correction Workers =', workers, ' Batches =', len(batches), file=logFile)
+    # Phase one, correction proposals of each batch against the snapshot
+    sharedCorrection = (blockPairList, batches, refDict, tokenFreqDict, aliasDict)
+    try:
+        pool = DWM_Parallel.get_pool(workers)
+        if pool is not None:
+            # Flush the reports so the forked workers do not inherit unwritten output
+            sys.stdout.flush()
+            logFile.flush()
+            with pool:
+                proposals = list(pool.map(proposeBatch, range(len(batches))))
+        else:
+            proposals = [proposeBatch(batch) for batch in range(len(batches))]
+    finally:
+        sharedCorrection = None
+    # Phase two, apply the batches in order of their first pair
+    totalCorrections = DWM45_Block_Cleaning.BlockCorrections()
+    changedRefIDs = set()
+    rerunCnt = 0
+    for batch in sorted(range(len(batches)), key=lambda batch: batches[batch][0]):
+        corrections, correctedRefs, updates = proposals[batch]
+        if reversesApplied(corrections, totalCorrections.pairCounts):
+            rerunCnt += 1
+            beforeRefs = {refID: list(refDict[refID]) for refID in batchRefIDs(batches[batch], blockPairList)}
+            corrections = correctBatch(batches[batch], blockPairList, tokenFreqDict, aliasDict, refDict)
+            correctedRefs = {refID: refDict[refID] for refID in beforeRefs if refDict[refID] != beforeRefs[refID]}
+        else:
+            refDict.update(correctedRefs)
+            applyUpdates(updates, tokenFreqDict)
+        totalCorrections.update(corrections)
+        changedRefIDs.update(correctedRefs)
+    changeCount = totalCorrections.total()
+    # Same results as RunBlockCorrections for the driver and DWM41
+    DWM45_Block_Cleaning.changeCount = changeCount
+    DWM45_Block_Cleaning.changedRefIDs = changedRefIDs
+    DWM45_Block_Cleaning.lastCorrections = totalCorrections
+    print('Batches Run Again for Reversed Corrections =', rerunCnt)
+    print('Batches Run Again for Reversed Corrections =', rerunCnt, file=logFile)
+    DWM45_Block_Cleaning.reportCorrections(totalCorrections)
+    if DWM10_Parms.blockCorrectionCompare:
+        sequentialCnt, sequentialRefs, sequentialFreq = sequential
+        refDiffCnt = sum(1 for refID in sequentialRefs if sequentialRefs[refID] != refDict[refID])
+        tokens = set(sequentialFreq.delta) | set(tokenFreqDict)
+        freqDiffCnt = sum(1 for token in tokens if sequentialFreq.get(token, 0) != tokenFreqDict.get(token, 0))
+        print('Sequential Block Token Corrections =', sequentialCnt, ' References Differing =', refDiffCnt, ' Token Frequencies Differing =', freqDiffCnt)
+        print('Sequential Block Token Corrections =', sequentialCnt, ' References Differing =', refDiffCnt, ' Token Frequencies Differing =', freqDiffCnt, file=logFile)
+    return changeCount
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+import DWM54_FilteredReferences
+# MinHash-LSH blocking used by DWM42 when blockingMode=MinHashLSH. Each reference is reduced
+# to its filtered token set (tokens of at least minBlkTokenLen characters that are not DWM54
+# stop words, frequency below sigma, numeric tokens dropped when excludeNumericBlocks is True). lshBands*lshRows MinHash
+# values are computed for every set with multiply-shift hashing of the token IDs, one band of
+# lshRows hash functions at a time. The rows of each band are combined into a bucket, and
+# every bucket is a blocking key, so two references with Jaccard similarity s share a
+# block with probability 1-(1-s**lshRows)**lshBands. The blocking records go through the
+# same pair generation as token blocking.
+# Seed of the hash functions, fixed so the blocks are the same in every run
+hashSeed = 20240607
+
+
+# In[ ]:
+
+
+def hashFunctions(count):
+    # Returns (multipliers, offsets) of count multiply-shift hash functions on 64-bit token IDs
+    rng = np.random.default_rng(hashSeed)
+    multipliers = rng.integers(1, 2**63, size=count, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2**63, size=count, dtype=np.uint64)
+    return multipliers, offsets
+def tokenFilter(vocabulary, tokenFreqDict):
+    # True for token IDs kept in the MinHash sets, the stop words are those DWM55 ignores
+    keep = (vocabulary.tokenLengths() >= DWM10_Parms.minBlkTokenLen) & ~DWM54_FilteredReferences.stopWordFlags(vocabulary, tokenFreqDict, DWM10_Parms.sigma)
+    if DWM10_Parms.excludeNumericBlocks:
+        keep &= ~vocabulary.numericFlags()
+    return keep
+def bandSignatures(setIDs, setStarts, multipliers, offsets):
+    # Minimum hash of each set for each function, returns an array of shape (sets, functions)
+    hashes = (setIDs.astype(np.uint64)[None, :]*multipliers[:, None] + offsets[:, None]) >> np.uint64(32)
+    return np.minimum.reduceat(hashes, setStarts, axis=1).T
+
+
+# In[ ]:
+
+
+def lshBlockingRecords(refIDs, refOrdinals, refDict, tokenFreqDict):
+    # Returns (keys, refOrdinals), one blocking record per band for each reference with a non-empty set
+    logFile = DWM10_Parms.logFile
+    bands = DWM10_Parms.lshBands
+    rows = DWM10_Parms.lshRows
+    print('MinHash LSH bands =', bands, ' rows =', rows)
+    print('MinHash LSH bands =', bands, ' rows =', rows, file=logFile)
+    vocabulary = DWM13_TokenVocabulary.getVocabulary()
+    flatIDs, offsets = vocabulary.encodeRefs(refIDs, refDict)
+    flatRefs = np.repeat(np.arange(len(refIDs)), np.diff(offsets))
+    keep = tokenFilter(vocabulary, tokenFreqDict)[flatIDs]
+    setIDs = flatIDs[keep]
+    setRefs = flatRefs[keep]
+    if len(setIDs) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # encodeRefs keeps the tokens of each reference together, so the sets are contiguous runs
+    setStarts = np.flatnonzero(np.concatenate(([True], setRefs[1:] != setRefs[:-1])))
+    setOrdinals = refOrdinals[setRefs[setStarts]]
+    setCnt = len(setStarts)
+    multipliers, hashOffsets = hashFunctions(bands*rows)
+    keyParts = []
+    for band in range(bands):
+        functions = slice(band*rows, (band+1)*rows)
+        signatures = bandSignatures(setIDs, setStarts, multipliers[functions], hashOffsets[functions])
+        # Number the distinct signatures of the band, equal signatures are one bucket
+        bucketIDs = np.unique(signatures, axis=0, return_inverse=True)[1].reshape(-1)
+        keyParts.append(band*setCnt + bucketIDs.astype(np.int64))
+    return np.concatenate(keyParts), np.tile(setOrdinals, bands)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM42_BuildBlockPairs
+# Meta-blocking between DWM42 and DWM55, used when metaBlocking is WEP or WNP. The pairs of the
+# last DWM42 call form the blocking graph, an edge per pair weighted by the number of blocks
+# the two references share (metaBlockingWeight=CBS) or the Jaccard similarity of their block
+# sets (metaBlockingWeight=Jaccard). WEP (weighted edge pruning) keeps the edges with at least
+# the mean weight of the graph. WNP (weighted node pruning) keeps an edge when its weight is at
+# least the mean weight of the edges of either reference. Weights and thresholds are computed
+# with array aggregation over the pair codes, the kept pairs are decoded to the same sorted
+# blockPairList DWM55 reads.
+# Relative tolerance of the mean thresholds, so a weight equal to the mean is kept despite rounding
+thresholdTolerance = 1e-9
+
+
+# In[ ]:
+
+
+def edgeWeights(pairCodes, sharedCnts, refBlockCnts, refCnt, weightScheme):
+    if weightScheme == 'Jaccard':
+        refM = pairCodes // refCnt
+        refN = pairCodes % refCnt
+        unionCnts = refBlockCnts[refM] + refBlockCnts[refN] - sharedCnts
+        return sharedCnts / np.maximum(unionCnts, 1)
+    return sharedCnts.astype(np.float64)
+def keptEdges(pairCodes, weights, refCnt, pruningScheme):
+    # Returns a mask of the edges kept by the pruning scheme
+    if len(weights) == 0:
+        return np.zeros(0, dtype=bool)
+    if pruningScheme == 'WEP':
+        return weights >= weights.mean()*(1-thresholdTolerance)
+    refM = pairCodes // refCnt
+    refN = pairCodes % refCnt
+    weightSums = np.bincount(refM, weights, refCnt) + np.bincount(refN, weights, refCnt)
+    degrees = np.bincount(refM, minlength=refCnt) + np.bincount(refN, minlength=refCnt)
+    thresholds = weightSums / np.maximum(degrees, 1) * (1-thresholdTolerance)
+    return (weights >= thresholds[refM]) | (weights >= thresholds[refN])
+def truePairCount(blockPairList, truthDict):
+    count = 0
+    for pair in blockPairList:
+        refA, refB = pair.split('|')
+        truthA = truthDict.get(refA)
+        if truthA is not None and truthA == truthDict.get(refB):
+            count += 1
+    return count
+
+
+# In[ ]:
+
+
+def pruneBlockPairs(blockPairList, truthDict):
+    logFile = DWM10_Parms.logFile
+    pruningScheme = DWM10_Parms.metaBlocking
+    weightScheme = DWM10_Parms.metaBlockingWeight
+    print('\n>>Starting DWM48')
+    print('\n>>Starting DWM48', file=logFile)
+    print('Meta-Blocking Pruning =', pruningScheme, ' Weight =', weightScheme)
+    print('Meta-Blocking Pruning =', pruningScheme, ' Weight =', weightScheme, file=logFile)
+    weightState = DWM42_BuildBlockPairs.pairWeightState
+    if weightState is None or len(weightState[0]) != len(blockPairList):
+        print('**Warning: no shared block counts for this blockPairList, meta-blocking skipped')
+        print('**Warning: no shared block counts for this blockPairList, meta-blocking skipped', file=logFile)
+        return blockPairList
+    pairCodes, sharedCnts, refBlockCnts, sortedRefIDs = weightState
+    refCnt = len(sortedRefIDs)
+    weights = edgeWeights(pairCodes, sharedCnts, refBlockCnts, refCnt, weightScheme)
+    keep = keptEdges(pairCodes, weights, refCnt, pruningScheme)
+    keptPairList = DWM42_BuildBlockPairs.decodePairCodes(pairCodes[keep], sortedRefIDs)
+    print('Total Pairs Before Pruning =', len(blockPairList))
+    print('Total Pairs Before Pruning =', len(blockPairList), file=logFile)
+    print('Total Pairs Removed =', len(blockPairList)-len(keptPairList))
+    print('Total Pairs Removed =', len(blockPairList)-len(keptPairList), file=logFile)
+    print('Total Pairs Kept =', len(keptPairList))
+    print('Total Pairs Kept =', len(keptPairList), file=logFile)
+    if len(truthDict) > 0:
+        trueBefore = truePairCount(blockPairList, truthDict)
+        trueKept = truePairCount(keptPairList, truthDict)
+        recallKept = round(trueKept/trueBefore, 4) if trueBefore > 0 else 1.0
+        print('True Pairs Before Pruning =', trueBefore, ' Kept =', trueKept, ' Recall Kept =', recallKept)
+        print('True Pairs Before Pruning =', trueBefore, ' Kept =', trueKept, ' Recall Kept =', recallKept, file=logFile)
+    return keptPairList
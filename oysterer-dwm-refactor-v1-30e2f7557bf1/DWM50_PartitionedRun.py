@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import io
+import sys
+import contextlib
+import DWM10_Parms
+import DWM55_LinkBlockPairs
+import DWM80_TransitiveClosure
+import DWM90_IterateClusters
+import DWM_Parallel
+# Partitioned run of DWM55, DWM80 and DWM90 used by the driver when partitionWorkers > 1. A
+# block pair only links two references of the same connected component of the blocking graph,
+# so each component can be scored, closed and evaluated on its own. The components are found
+# with a union-find over the block pairs, packed into tasks of about the same number of pairs
+# and run in forked worker processes that inherit refDict, tokenFreqDict and the task lists.
+# Each task returns the positions of its linked pairs in blockPairList, its cluster list and
+# its good clusters. The parent merges them into the same linkedPairList, clusterList,
+# iterationLinkIndex and linkIndex as the serial run. DWM45 block correction is not run per
+# component, its frequency updates are seen by every later correction in the whole file.
+# Number of tasks per worker, so a large component does not leave the other workers idle
+tasksPerWorker = 4
+# Data shared with the workers, set before the first task is submitted
+sharedRun = None
+
+
+# In[ ]:
+
+
+def pairComponents(blockPairList):
+    # Returns the pair positions of each connected component, in order of their first pair
+    parent = {}
+    def find(refID):
+        root = parent.setdefault(refID, refID)
+        while root != parent[root]:
+            # Path halving
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+    for pair in blockPairList:
+        refA, refB = pair.split('|')
+        rootA = find(refA)
+        rootB = find(refB)
+        if rootA != rootB:
+            parent[rootB] = rootA
+    components = {}
+    for j, pair in enumerate(blockPairList):
+        components.setdefault(find(pair.split('|')[0]), []).append(j)
+    return list(components.values())
+def packTasks(components, taskCnt):
+    # Greedy packing of the components, largest first, into the task with the fewest pairs
+    tasks = [[] for task in range(min(taskCnt, len(components)))]
+    taskSizes = [0]*len(tasks)
+    for component in sorted(components, key=len, reverse=True):
+        task = taskSizes.index(min(taskSizes))
+        tasks[task].extend(component)
+        taskSizes[task] += len(component)
+    return [sorted(task) for task in tasks]
+@contextlib.contextmanager
+def quietStages():
+    # The stage reports of a task are dropped, the parent reports the merged totals
+    logFile = DWM10_Parms.logFile
+    DWM10_Parms.logFile = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        DWM10_Parms.logFile = logFile
+
+
+# In[ ]:
+
+
+def runTask(task):
+    # Worker task, returns (linked pair positions, cluster list, good cluster refs as (refID, clusterID))
+    blockPairList, tasks, refDict, tokenFreqDict, linkIndex = sharedRun
+    pairPositions = tasks[task]
+    taskPairList = [blockPairList[j] for j in pairPositions]
+    with quietStages():
+        linkedPairList = DWM55_LinkBlockPairs.linkBlockPairs(taskPairList, refDict, tokenFreqDict)
+        if len(linkedPairList) == 0:
+            return [], [], []
+        clusterList = DWM80_TransitiveClosure.transitiveClosure(linkedPairList)
+        # DWM90 only reads and writes the link index entries of the refs in the clusters
+        taskLinkIndex = {refID: linkIndex[refID] for clusterID, refID in clusterList}
+        DWM90_IterateClusters.iterateClusters(clusterList, refDict, taskLinkIndex)
+    # iterateClusters appends a caboose to the cluster list
+    clusterList.pop()
+    positions = {pair: j for pair, j in zip(taskPairList, pairPositions)}
+    linkedPositions = [positions[refID1+'|'+refID2] for refID1, refID2 in linkedPairList]
+    goodRefs = [(refID, clusterID) for refID, clusterID in taskLinkIndex.items() if clusterID != linkIndex[refID]]
+    return linkedPositions, clusterList, goodRefs
+
+
+# In[ ]:
+
+
+def runPartitioned(blockPairList, refDict, tokenFreqDict, linkIndex):
+    # Returns (linkedPairList, clusterList, iterationLinkIndex) and updates linkIndex like DWM90
+    global sharedRun
+    logFile = DWM10_Parms.logFile
+    workers = DWM10_Parms.partitionWorkers
+    print('\n>>Starting DWM50')
+    print('\n>>Starting DWM50', file=logFile)
+    components = pairComponents(blockPairList)
+    tasks = packTasks(components, workers*tasksPerWorker)
+    largest = max((len(component) for component in components), default=0)
+    print('Partitioned Run Workers =', workers, ' Components =', len(components), ' Tasks =', len(tasks), ' Largest Component Pairs =', largest)
+    print('Partitioned Run Workers =', workers, ' Components =', len(components), ' Tasks =', len(tasks), ' Largest Component Pairs =', largest, file=logFile)
+    sharedRun = (blockPairList, tasks, refDict, tokenFreqDict, linkIndex)
+    try:
+        pool = DWM_Parallel.get_pool(workers)
+        if pool is not None:
+            # Flush the reports so the forked workers do not inherit unwritten output
+            sys.stdout.flush()
+            logFile.flush()
+            with pool:
+                results = list(pool.map(runTask, range(len(tasks))))
+        else:
+            results = [runTask(task) for task in range(len(tasks))]
+    finally:
+        sharedRun = None
+    # Merge the tasks in the order of the serial run
+    linkedPositions = sorted(j for result in results for j in result[0])
+    linkedPairList = [tuple(blockPairList[j].split('|')) for j in linkedPositions]
+    clusterList = sorted(pair for result in results for pair in result[1])
+    goodRefs = [pair for result in results for pair in result[2]]
+    iterationLinkIndex = linkIndex.copy()
+    for clusterID, refID in clusterList:
+        iterationLinkIndex[refID] = clusterID
+    for refID, clusterID in goodRefs:
+        linkIndex[refID] = clusterID
+    clusterSizes = {}
+    for clusterID, refID in clusterList:
+        clusterSizes[clusterID] = clusterSizes.get(clusterID, 0) + 1
+    goodClusters = {clusterID for refID, clusterID in goodRefs}
+    print('Number of Pairs Linked =', len(linkedPairList), 'at mu=', DWM10_Parms.mu)
+    print('Number of Pairs Linked =', len(linkedPairList), 'at mu=', DWM10_Parms.mu, file=logFile)
+    print('Size of Cluster List =', len(clusterList))
+    print('Total Clusters Processed =', len(clusterSizes))
+    print('Total Clusters Processed =', len(clusterSizes), file=logFile)
+    print('Total References in Clusters =', len(clusterList))
+    print('Total References in Clusters =', len(clusterList), file=logFile)
+    clusterCnt2 = sum(1 for size in clusterSizes.values() if size > 1)
+    print('Total Clusters Size>1 Processed =', clusterCnt2)
+    print('Total Clusters Size>1 Processed =', clusterCnt2, file=logFile)
+    print('Total Good Clusters =', len(goodClusters), ' at epsilon =', DWM10_Parms.epsilon)
+    print('Total Good Clusters =', len(goodClusters), ' at epsilon =', DWM10_Parms.epsilon, file=logFile)
+    print('Total References in Good Cluster =', len(goodRefs))
+    print('Total References in Good Cluster =', len(goodRefs), file=logFile)
+    return linkedPairList, clusterList, iterationLinkIndex
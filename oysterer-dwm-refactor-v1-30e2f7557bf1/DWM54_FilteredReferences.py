@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import DWM10_Parms
+import DWM13_TokenVocabulary
+# Filtered view of the references compared by DWM55 and shown by DWM_DataCapture. A token is
+# kept when its tokenFreqDict frequency is below sigma and, if removeExcludedBlkTokens is True,
+# it has at least minBlkTokenLen characters and is not numeric when excludeNumericBlocks is
+# True. Duplicates are removed when removeDuplicateTokens is True. The filtered token list of a
+# reference is computed the first time it is asked for and kept, so only the unresolved
+# references in the pairs of the iteration are filtered, once each instead of once per pair.
+# The view is rebuilt when refDict, tokenFreqDict (or its version), the vocabulary or the
+# filter settings change.
+filteredView = None
+
+
+# In[ ]:
+
+
+def stopWordFlags(vocabulary, tokenFreqDict, sigma):
+    # Array indexed by ID, True for the tokens with frequency of at least sigma, the stop word
+    # rule of DWM55 also used by the DWM47 and DWM40 token sets
+    return vocabulary.frequencyArray(tokenFreqDict) >= sigma
+def filterSettings():
+    return (DWM10_Parms.sigma, DWM10_Parms.removeExcludedBlkTokens, DWM10_Parms.minBlkTokenLen,
+            DWM10_Parms.excludeNumericBlocks, DWM10_Parms.removeDuplicateTokens)
+class FilteredReferences:
+    def __init__(self, refDict, tokenFreqDict, settings):
+        self.refDict = refDict
+        self.tokenFreqDict = tokenFreqDict
+        self.version = tokenFreqDict.version
+        self.settings = settings
+        self.vocabulary = DWM13_TokenVocabulary.getVocabulary()
+        self.isKeptID = self.keptIDs()
+        # key=refID, value=filtered token list
+        self.filtered = {}
+    def keptIDs(self):
+        # Decide once per token ID if the token is kept for matching
+        sigma, removeExcludedBlkTokens, minBlkTokenLen, excludeNumericBlocks, removeDuplicateTokens = self.settings
+        vocabulary = self.vocabulary
+        isKeptID = ~stopWordFlags(vocabulary, self.tokenFreqDict, sigma)
+        if removeExcludedBlkTokens:
+            isKeptID &= vocabulary.tokenLengths() >= minBlkTokenLen
+            if excludeNumericBlocks:
+                isKeptID &= ~vocabulary.numericFlags()
+        return isKeptID
+    def isCurrent(self, refDict, tokenFreqDict, settings):
+        return (self.refDict is refDict and self.tokenFreqDict is tokenFreqDict and self.version == tokenFreqDict.version
+                and self.settings == settings and self.vocabulary is DWM13_TokenVocabulary.getVocabulary())
+    def tokens(self, refID):
+        # Filtered token list of refID, empty for a refID missing from refDict
+        filtered = self.filtered.get(refID)
+        if filtered is None:
+            if refID in self.refDict:
+                tokenIDs = self.vocabulary.refTokenIDs(refID, self.refDict)
+            else:
+                tokenIDs = np.zeros(0, dtype=np.int64)
+            if len(self.isKeptID) < len(self.vocabulary):
+                # Tokens interned since the view was built
+                self.isKeptID = self.keptIDs()
+            filtered = self.vocabulary.decode(tokenIDs[self.isKeptID[tokenIDs]].tolist())
+            if self.settings[4]:
+                filtered = list(dict.fromkeys(filtered))
+            self.filtered[refID] = filtered
+        return filtered
+def getFilteredReferences(refDict, tokenFreqDict):
+    # The shared view for refDict and tokenFreqDict, rebuilt if it is out of date
+    global filteredView
+    settings = filterSettings()
+    if filteredView is None or not filteredView.isCurrent(refDict, tokenFreqDict, settings):
+        filteredView = FilteredReferences(refDict, tokenFreqDict, settings)
+    return filteredView
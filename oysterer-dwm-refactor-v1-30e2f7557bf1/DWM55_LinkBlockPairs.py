@@ -8,6 +8,7 @@ import sys
 from textdistance import Cosine
 from textdistance import MongeElkan
 import DWM10_Parms
+import DWM54_FilteredReferences
 import DWM65_ScoringMatrixStd
 import DWM66_ScoringMatrixKris
 def linkBlockPairs(blockPairList, refDict, tokenFreqDict): 
@@ -15,8 +16,6 @@ def linkBlockPairs(blockPairList, refDict, tokenFreqDict):
     sigma = DWM10_Parms.sigma
     removeDuplicateTokens = DWM10_Parms.removeDuplicateTokens
     removeExcludedBlkTokens = DWM10_Parms.removeExcludedBlkTokens
-    minBlkTokenLen = DWM10_Parms.minBlkTokenLen
-    excludeNumericBlocks = DWM10_Parms.excludeNumericBlocks
     print('\n>>Starting DWM55')
     print('\n>>Starting DWM55', file=logFile)
     print('Sigma =', sigma)
@@ -25,32 +24,8 @@ def linkBlockPairs(blockPairList, refDict, tokenFreqDict):
     print('Remove Duplicate Tokens =', removeDuplicateTokens, file=logFile)
     print('Remove Excluded Block Tokens =', removeExcludedBlkTokens)
     print('Remove Excluded Block Tokens =', removeExcludedBlkTokens, file=logFile)
-    # Define nested function for removing stop words
-    def removeStopWords(tokenList):
-        newList = []
-        #print('-- tokenList', tokenList)
-        for token in tokenList:
-            tokenLen = len(token)
-            includeToken = True
-            freq = tokenFreqDict[token]
-            if freq>=sigma:
-                includeToken = False
-                #print('-- sigma rule', token, freq)
-            if removeExcludedBlkTokens:
-                if tokenLen < minBlkTokenLen:
-                    includeToken = False
-                    #print('-- min len rule', token, tokenLen)
-                if token.isdigit() and excludeNumericBlocks:
-                    includeToken = False
-                    #print('-- number rule', token)
-            if removeDuplicateTokens and (token in newList):
-                includeToken = False
-                #print('-- duplicate token rule', token)
-            if includeToken:
-                newList.append(token)
-       # print('-- newList', newList)
-        return newList
-    # end of nexted fucntion
+    # Stop words are removed once per reference, the view is shared with data capture
+    filteredRefs = DWM54_FilteredReferences.getFilteredReferences(refDict, tokenFreqDict)
     # Check for valid comparator
     validComparator = False
     comparator = DWM10_Parms.comparator
@@ -77,8 +52,8 @@ def linkBlockPairs(blockPairList, refDict, tokenFreqDict):
         refIDs = pair.split('|')
         refID1 = refIDs[0]
         refID2 = refIDs[1]
-        tokenList1 = removeStopWords(refDict[refID1])
-        tokenList2 = removeStopWords(refDict[refID2])
+        tokenList1 = filteredRefs.tokens(refID1)
+        tokenList2 = filteredRefs.tokens(refID2)
         result = Class.normalized_similarity(tokenList1[:],tokenList2[:])
         if result >= mu:
             linkedPairList.append((refID1,refID2))
@@ -26,6 +26,10 @@ def normalized_similarity(ref1, ref2):
             token2 = ref2[k]
             simVal = 0.0
             #print('-Comparing',token1, token2)
+            # Identical tokens (same vocabulary string) score 1.0 under every rule
+            if token1 == token2:
+                matrix[j][k] = 1.0
+                continue
             # Numeric Token Rule, if both tokens numeric, only exact match
             if DWM10_Parms.matrixNumTokenRule:
                 if token1.isdigit() and token2.isdigit():
@@ -41,6 +41,11 @@ def normalized_similarity(inRef1, inRef2, return_trace=False, trace_min_sim=0.0)
         for k in range(n):
             token2 = ref2[k]
 
+            # Identical tokens (same vocabulary string) score 1.0 under every rule
+            if token1 == token2:
+                matrix[j][k] = 1.0
+                continue
+
             # Rule 1: Numeric token rule
             if DWM10_Parms.matrixNumTokenRule:
                 if token1.isdigit() and token2.isdigit():
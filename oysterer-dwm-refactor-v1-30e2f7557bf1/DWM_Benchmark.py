@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+DWM_Benchmark.py - Throughput benchmarks for the hot stages of the DWM pipeline.
+
+Run from the repository folder so the bundled samples are found, for example:
+    python DWM_Benchmark.py tokenizer
+"""
+
+import contextlib
+import io
+import random
+import re
+import sys
+import time
+import DWM10_Parms
+import DWM13_TokenVocabulary
+import DWM20_TokenizerFunctions
+import DWM25_Global_Token_Replace
+import DWM41_BlockingKeyIndex
+import DWM42_BuildBlockPairs
+import DWM43_ExternalBlocking
+import DWM45_Block_Cleaning
+import DWM46_ParallelBlockCorrection
+
+
+SAMPLE_FILES = ['S8P.txt', 'S12PX.txt']
+
+
+def _read_bodies(fileName, delimiter=',', hasHeader=True):
+    """Return the reference bodies (line without refID) of a sample file."""
+    bodies = []
+    with open(fileName, 'r') as inputFile:
+        if hasHeader:
+            inputFile.readline()
+        for line in inputFile:
+            line = line.strip()
+            firstDelimiter = line.find(delimiter)
+            bodies.append(line[firstDelimiter+1:])
+    return bodies
+
+
+def _time_tokenizer(tokenizerFunction, bodies, repeat):
+    """Return (best seconds, token count, token lists) over repeat passes."""
+    best = None
+    tokenCnt = 0
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [tokenizerFunction(body) for body in bodies]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    for tokenList in result:
+        tokenCnt += len(tokenList)
+    return best, tokenCnt, result
+
+
+def benchmarkTokenizer(fileNames=None, delimiter=',', repeat=5):
+    """
+    Measure tokens/sec of every tokenizerType on the sample files.
+
+    The engine (str.translate fast path) is compared against the compiled regular
+    expression path, and the benchmark fails if the two produce different tokens.
+    """
+    if fileNames is None:
+        fileNames = SAMPLE_FILES
+    regexFunctions = {
+        'Splitter': DWM20_TokenizerFunctions.splitterRegex,
+        'Compress': lambda string: DWM20_TokenizerFunctions.compressRegex(string, delimiter),
+    }
+    print('File, tokenizerType, tokens, engine tokens/sec, regex tokens/sec, speedup')
+    for fileName in fileNames:
+        bodies = _read_bodies(fileName, delimiter)
+        for tokenizerType in DWM20_TokenizerFunctions.validTokenizerTypes:
+            engine = DWM20_TokenizerFunctions.getTokenizer(tokenizerType, delimiter)
+            seconds, tokenCnt, tokens = _time_tokenizer(engine, bodies, repeat)
+            engineRate = tokenCnt / seconds
+            if tokenizerType in regexFunctions:
+                regexSeconds, _, regexTokens = _time_tokenizer(regexFunctions[tokenizerType], bodies, repeat)
+                if regexTokens != tokens:
+                    raise AssertionError(f'{tokenizerType} engine output differs from regex path on {fileName}')
+                regexRate = tokenCnt / regexSeconds
+                print(f'{fileName}, {tokenizerType}, {tokenCnt}, {engineRate:,.0f}, {regexRate:,.0f}, {engineRate/regexRate:.2f}x')
+            else:
+                print(f'{fileName}, {tokenizerType}, {tokenCnt}, {engineRate:,.0f}, -, -')
+
+
+def _synthetic_clean_index(vocabularySize, seed=25):
+    """
+    Return a DWM25 cleanIndex of vocabularySize tokens sorted descending by frequency.
+
+    A quarter of the tokens are frequent standard tokens, the rest are rare tokens
+    that are either a one or two edit misspelling of a standard token or unrelated.
+    """
+    rnd = random.Random(seed)
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    def random_word():
+        return ''.join(rnd.choice(letters) for _ in range(rnd.randint(4, 10)))
+    def misspell(word):
+        for _ in range(rnd.randint(1, 2)):
+            pos = rnd.randrange(len(word))
+            edit = rnd.randrange(3)
+            if edit == 0:
+                word = word[:pos] + rnd.choice(letters) + word[pos+1:]
+            elif edit == 1:
+                word = word[:pos] + rnd.choice(letters) + word[pos:]
+            elif len(word) > 3:
+                word = word[:pos] + word[pos+1:]
+        return word
+    tokenFreq = {}
+    standards = []
+    while len(standards) < vocabularySize // 4:
+        word = random_word()
+        if word not in tokenFreq:
+            tokenFreq[word] = rnd.randint(5, 50)
+            standards.append(word)
+    while len(tokenFreq) < vocabularySize:
+        word = misspell(rnd.choice(standards)) if rnd.random() < 0.5 else random_word()
+        if word not in tokenFreq:
+            tokenFreq[word] = rnd.randint(1, 3)
+    return sorted(tokenFreq.items(), reverse=True, key=lambda pair: pair[1])
+
+
+def benchmarkGlobalCorrection(sizes=(1000, 2000, 4000, 8000, 16000, 32000), scanLimit=8000,
+                              minFreqStdToken=5, maxFreqErrToken=3):
+    """
+    Measure the DWM25 Phase 3 correction search as the vocabulary grows.
+
+    The deletion index search is compared with the all-pairs scan up to scanLimit
+    tokens, and the benchmark fails if the two produce different corrections.
+    """
+    print('vocabulary, corrections, index seconds, scan seconds, speedup')
+    for size in sizes:
+        cleanIndex = _synthetic_clean_index(size)
+        start = time.perf_counter()
+        corrections = DWM25_Global_Token_Replace._find_corrections(cleanIndex, minFreqStdToken, maxFreqErrToken)
+        indexSeconds = time.perf_counter() - start
+        if size > scanLimit:
+            print(f'{size}, {len(corrections)}, {indexSeconds:.3f}, -, -')
+            continue
+        start = time.perf_counter()
+        scanCorrections = DWM25_Global_Token_Replace._find_corrections_scan(cleanIndex, minFreqStdToken, maxFreqErrToken)
+        scanSeconds = time.perf_counter() - start
+        if list(scanCorrections.items()) != list(corrections.items()):
+            raise AssertionError(f'deletion index corrections differ from scan at vocabulary {size}')
+        print(f'{size}, {len(corrections)}, {indexSeconds:.3f}, {scanSeconds:.3f}, {scanSeconds/indexSeconds:.1f}x')
+
+
+def _random_reference_pair(rnd, vocabulary):
+    """
+    Return two token lists that share runs of tokens, with the misspellings, aliases,
+    insertions and split numbers that DWM45 corrects.
+    """
+    refJ = [rnd.choice(vocabulary) for _ in range(rnd.randint(0, 10))]
+    refK = [rnd.choice(vocabulary) if rnd.random() < 0.5 or not refJ else rnd.choice(refJ)
+            for _ in range(rnd.randint(0, 10))]
+    if refJ and rnd.random() < 0.7:
+        start = rnd.randrange(len(refJ))
+        position = rnd.randint(0, len(refK))
+        refK[position:position] = refJ[start:start+rnd.randint(3, 5)]
+        edit = rnd.randrange(4)
+        if edit == 0 and refK:
+            refK[rnd.randrange(len(refK))] = rnd.choice(vocabulary)
+        elif edit == 1 and refK:
+            del refK[rnd.randrange(len(refK))]
+        elif edit == 2:
+            refK.insert(rnd.randint(0, len(refK)), rnd.choice(vocabulary))
+        else:
+            digits = [i for i, token in enumerate(refK) if token.isdigit() and len(token) > 1]
+            if digits:
+                i = rnd.choice(digits)
+                refK[i:i+1] = [refK[i][:1], refK[i][1:]]
+    if rnd.random() < 0.5:
+        refJ, refK = refK, refJ
+    return refJ, refK
+
+
+def benchmarkBlockCorrection(trials=50000, seed=45):
+    """
+    Check DWM45 tokenLogicNew (AnchorIndex) against the tokenLogicScan reference.
+
+    Both run on their own copy of random reference pairs and frequencies, and the
+    benchmark fails if the corrected tokens, frequency updates or corrections differ.
+    """
+    rnd = random.Random(seed)
+    vocabulary = ['MAIN', 'MIAN', 'MAINS', 'ST', 'STREET', 'STRET', 'AVE', 'AVENUE', 'OAK', 'OAKS',
+                  'OAKK', 'JOHN', 'JON', 'JOHNS', 'SMITH', 'SMYTH', 'SMIT', '1', '12', '123', '124',
+                  '2', '23', '3', 'NEW', 'YORK', 'NY']
+    functions = (DWM45_Block_Cleaning.tokenLogicNew, DWM45_Block_Cleaning.tokenLogicScan)
+    seconds = [0.0, 0.0]
+    corrected = 0
+    changeCount = DWM45_Block_Cleaning.changeCount
+    for trial in range(trials):
+        refJ, refK = _random_reference_pair(rnd, vocabulary)
+        snapshot = {token: rnd.randint(0, 5) for token in vocabulary}
+        aliasDict = {rnd.choice(vocabulary): rnd.choice(vocabulary) for _ in range(4)}
+        results = []
+        for position, function in enumerate(functions):
+            refDict = {'J': list(refJ), 'K': list(refK)}
+            tokenFreq = DWM46_ParallelBlockCorrection.FrequencyOverlay(snapshot)
+            start = time.perf_counter()
+            changes = function('J', 'K', tokenFreq, None, aliasDict, refDict)
+            seconds[position] += time.perf_counter() - start
+            results.append((refDict, tokenFreq.updates, changes.pairCounts, changes.typeCounts))
+        if results[0] != results[1]:
+            raise AssertionError(f'tokenLogicNew differs from tokenLogicScan on {refJ} / {refK}')
+        corrected += results[0][3] != {}
+    DWM45_Block_Cleaning.changeCount = changeCount
+    print('pairs, pairs corrected, anchor seconds, scan seconds, speedup')
+    print(f'{trials}, {corrected}, {seconds[0]:.3f}, {seconds[1]:.3f}, {seconds[1]/seconds[0]:.2f}x')
+
+
+def _brute_force_block_pairs(refDict, linkIndex, tokenFreqDict):
+    """
+    Return (blocking records, blocks size>1, pairs generated, sorted unique pairs) of
+    DWM42 Token blocking, from blocks keyed by token tuples and all pairs of each block.
+    """
+    def isBlkToken(token):
+        if len(token) < DWM10_Parms.minBlkTokenLen:
+            return False
+        if DWM10_Parms.excludeNumericBlocks and token.isdigit():
+            return False
+        return 2 <= tokenFreqDict.get(token, 0) <= DWM10_Parms.beta
+    blocks = {}
+    recordCnt = 0
+    for refID in linkIndex:
+        if len(linkIndex[refID]) != 0:
+            continue
+        blkTokens = [token for token in refDict[refID] if isBlkToken(token)]
+        if DWM10_Parms.blockByPairs:
+            keys = [tuple(sorted((blkTokens[j], blkTokens[k])))
+                    for j in range(len(blkTokens)) for k in range(j+1, len(blkTokens))]
+        else:
+            keys = [(token,) for token in blkTokens]
+        for key in keys:
+            blocks.setdefault(key, []).append(refID)
+        recordCnt += len(keys)
+    blockCnt = 0
+    pairList = []
+    for block in blocks.values():
+        if len(block) < 2:
+            continue
+        blockCnt += 1
+        for m in range(len(block)-1):
+            for n in range(m+1, len(block)):
+                refIDm, refIDn = sorted((block[m], block[n]))
+                pairList.append(refIDm+'|'+refIDn)
+    return recordCnt, blockCnt, len(pairList), sorted(set(pairList))
+
+
+def _run_block_pairs(refDict, linkIndex, tokenFreqDict, **parms):
+    """Return buildBlockPairs in the same form as _brute_force_block_pairs, under the given parms."""
+    saved = {name: getattr(DWM10_Parms, name) for name in parms}
+    for name, value in parms.items():
+        setattr(DWM10_Parms, name, value)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            pairList = DWM42_BuildBlockPairs.buildBlockPairs(refDict, linkIndex, tokenFreqDict)
+    finally:
+        for name, value in saved.items():
+            setattr(DWM10_Parms, name, value)
+    output = output.getvalue()
+    def count(label):
+        return int(re.search(re.escape(label)+r'\s*(\d+)', output).group(1))
+    return (count('Total Blocking Records Created'), count('Total Blocks Size>1 Created'),
+            count('Total Pairs Generated by Blocks='), pairList)
+
+
+def benchmarkBlockPairs(trials=2000, seed=9, parallelEvery=100):
+    """
+    Check DWM42 Token blocking against blocks built by brute force.
+
+    The tokens are short, so concatenated token pairs collide ('A'+'AB' == 'AA'+'B'), and
+    the refIDs contain '|' or are prefixes of other refIDs, so the pairs are decoded on the
+    string sort fallback. Every trial runs the in-memory, external (DWM43, with entry sizes
+    raised so a 1 MB budget spills runs of 16 entries) and blocking key index (DWM41) paths, the index again after some references are edited or resolved, and
+    every parallelEvery trials the parallel (DWM44) path. The benchmark fails if any path
+    differs from the brute force records, block count, pairs generated or pair list.
+    """
+    rnd = random.Random(seed)
+    saved = (DWM10_Parms.logFile, DWM10_Parms.blockingMode, DWM10_Parms.maxBlockSize,
+             DWM10_Parms.metaBlocking, DWM10_Parms.blockingKeyFunctions, DWM10_Parms.fieldAwareBlocking)
+    DWM10_Parms.logFile = io.StringIO()
+    DWM10_Parms.blockingMode = 'Token'
+    DWM10_Parms.maxBlockSize = 0
+    DWM10_Parms.metaBlocking = 'None'
+    DWM10_Parms.blockingKeyFunctions = ''
+    DWM10_Parms.fieldAwareBlocking = False
+    savedExternal = (DWM43_ExternalBlocking.recordBytes, DWM43_ExternalBlocking.pairCodeBytes,
+                     DWM43_ExternalBlocking.refBatchSize)
+    DWM43_ExternalBlocking.recordBytes = DWM43_ExternalBlocking.pairCodeBytes = 1 << 16
+    DWM43_ExternalBlocking.refBatchSize = 8
+    def randomToken():
+        return ''.join(rnd.choice('AB1') for _ in range(rnd.randint(1, 4)))
+    def randomRefID():
+        refID = 'R'+str(rnd.randint(0, 40))
+        if rnd.random() < 0.2:
+            refID += rnd.choice(['|', '|A', 'A|B'])
+        return refID
+    def frequencies(refDict):
+        tokenFreqDict = {}
+        for tokens in refDict.values():
+            for token in tokens:
+                tokenFreqDict[token] = tokenFreqDict.get(token, 0) + 1
+        return tokenFreqDict
+    def check(label, expected, refDict, linkIndex, tokenFreqDict, **parms):
+        if _run_block_pairs(refDict, linkIndex, tokenFreqDict, **parms) != expected:
+            raise AssertionError(f'{label} blocking differs from brute force at trial {trial}')
+    fallbackCnt = 0
+    pairCnt = 0
+    start = time.perf_counter()
+    try:
+        for trial in range(trials):
+            vocabulary = [randomToken() for _ in range(rnd.randint(1, 20))]
+            refDict = {randomRefID(): [rnd.choice(vocabulary) for _ in range(rnd.randint(0, 7))]
+                       for _ in range(rnd.randint(0, 40))}
+            linkIndex = {refID: ('' if rnd.random() < 0.9 else 'linked') for refID in refDict}
+            tokenFreqDict = frequencies(refDict)
+            DWM13_TokenVocabulary.resetVocabulary().internRefDict(refDict)
+            DWM41_BlockingKeyIndex.resetIndex()
+            DWM10_Parms.blockByPairs = rnd.random() < 0.5
+            DWM10_Parms.beta = rnd.randint(2, 10)
+            DWM10_Parms.minBlkTokenLen = rnd.randint(1, 3)
+            DWM10_Parms.excludeNumericBlocks = rnd.random() < 0.5
+            sortedRefIDs = sorted(refID for refID in linkIndex if len(linkIndex[refID]) == 0)
+            fallbackCnt += not DWM42_BuildBlockPairs.codeOrderIsStringOrder(sortedRefIDs)
+            expected = _brute_force_block_pairs(refDict, linkIndex, tokenFreqDict)
+            pairCnt += len(expected[3])
+            check('in-memory', expected, refDict, linkIndex, tokenFreqDict)
+            check('external', expected, refDict, linkIndex, tokenFreqDict, blockingMemoryMB=1)
+            check('blocking key index', expected, refDict, linkIndex, tokenFreqDict, useBlockingKeyIndex=True)
+            if trial % parallelEvery == 0:
+                check('parallel', expected, refDict, linkIndex, tokenFreqDict, blockingWorkers=2, blockingChunkSize=8)
+            # Edit and resolve some references, the index only recomputes the edited ones
+            changed = [refID for refID in refDict if rnd.random() < 0.2]
+            for refID in changed:
+                refDict[refID] = [rnd.choice(vocabulary) for _ in range(rnd.randint(0, 7))]
+            for refID in linkIndex:
+                if rnd.random() < 0.1:
+                    linkIndex[refID] = 'linked'
+            tokenFreqDict = frequencies(refDict)
+            DWM13_TokenVocabulary.getVocabulary().internRefs(changed, refDict)
+            DWM41_BlockingKeyIndex.markChanged(changed)
+            expected = _brute_force_block_pairs(refDict, linkIndex, tokenFreqDict)
+            check('updated blocking key index', expected, refDict, linkIndex, tokenFreqDict, useBlockingKeyIndex=True)
+    finally:
+        DWM41_BlockingKeyIndex.resetIndex()
+        (DWM43_ExternalBlocking.recordBytes, DWM43_ExternalBlocking.pairCodeBytes,
+         DWM43_ExternalBlocking.refBatchSize) = savedExternal
+        (DWM10_Parms.logFile, DWM10_Parms.blockingMode, DWM10_Parms.maxBlockSize,
+         DWM10_Parms.metaBlocking, DWM10_Parms.blockingKeyFunctions, DWM10_Parms.fieldAwareBlocking) = saved
+    print('trials, string sort fallback trials, unique pairs, seconds')
+    print(f'{trials}, {fallbackCnt}, {pairCnt}, {time.perf_counter()-start:.3f}')
+
+
+BENCHMARKS = {
+    'tokenizer': benchmarkTokenizer,
+    'globalCorrection': benchmarkGlobalCorrection,
+    'blockCorrection': benchmarkBlockCorrection,
+    'blockPairs': benchmarkBlockPairs,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f'Unknown benchmark {name}, choices are {", ".join(BENCHMARKS)}')
+            sys.exit(1)
+        print(f'\n>> Benchmark {name}')
+        BENCHMARKS[name]()
@@ -13,6 +13,7 @@ import csv
 import json
 import re
 import DWM10_Parms
+import DWM54_FilteredReferences
 from textdistance import Cosine, MongeElkan
 import DWM65_ScoringMatrixStd
 import DWM66_ScoringMatrixKris
@@ -318,42 +319,6 @@ def save_cluster_json(clusterList, filepath, refDict):
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(output, f, indent=2, ensure_ascii=True)
     print(f'  Data captured: {filepath}')
-def filter_tokens_for_comparison(tokens, tokenFreqDict):
-    """
-    Apply the same token filtering logic used in DWM55.linkBlockPairs.removeStopWords(),
-    but safely (no KeyError if token missing from tokenFreqDict).
-    Returns ONLY the tokens that will actually be compared.
-    """
-    sigma = DWM10_Parms.sigma
-    removeDuplicateTokens = DWM10_Parms.removeDuplicateTokens
-    removeExcludedBlkTokens = DWM10_Parms.removeExcludedBlkTokens
-    minBlkTokenLen = DWM10_Parms.minBlkTokenLen
-    excludeNumericBlocks = DWM10_Parms.excludeNumericBlocks
-
-    kept = []
-    for token in tokens:
-        tokenLen = len(token)
-        includeToken = True
-
-        freq = tokenFreqDict.get(token, 0)
-        if freq >= sigma:
-            includeToken = False
-
-        if removeExcludedBlkTokens:
-            if tokenLen < minBlkTokenLen:
-                includeToken = False
-            if excludeNumericBlocks and token.isdigit():
-                includeToken = False
-
-        if removeDuplicateTokens and token in kept:
-            includeToken = False
-
-        if includeToken:
-            kept.append(token)
-
-    return kept
-
-
 def _get_comparator():
     """
     Same comparator selection pattern as DWM55.linkBlockPairs.
@@ -384,6 +349,7 @@ def save_pair_comparison_view(pairList, filepath_prefix, refDict, tokenFreqDict,
       - linkedPairList: [(A,B), (C,D), ...]
     """
     comparator_name, Comp = _get_comparator()
+    filtered_refs = DWM54_FilteredReferences.getFilteredReferences(refDict, tokenFreqDict)
 
     mu = getattr(DWM10_Parms, "mu", None)
 
@@ -415,11 +381,9 @@ def save_pair_comparison_view(pairList, filepath_prefix, refDict, tokenFreqDict,
         match_rows = []
 
         for refID1, refID2 in sorted(pairs, key=lambda x: (x[0], x[1])):
-            t1_raw = refDict.get(refID1, [])
-            t2_raw = refDict.get(refID2, [])
-
-            t1 = filter_tokens_for_comparison(t1_raw, tokenFreqDict)
-            t2 = filter_tokens_for_comparison(t2_raw, tokenFreqDict)
+            # Same filtered tokens DWM55 compared, from the view it shares with DWM55
+            t1 = filtered_refs.tokens(refID1)
+            t2 = filtered_refs.tokens(refID2)
 
             # similarity call patterns:
             if comparator_name in ("Cosine", "MongeElkan"):
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+DWM_Parallel.py - Process pool helper shared by the parallel modes of the pipeline.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def get_pool(workers):
+    """
+    Create a process pool for a parallel stage.
+
+    Args:
+        workers: Number of worker processes requested by the parms file
+
+    Returns:
+        A ProcessPoolExecutor, or None when the stage should run serially.
+        Workers are forked so they inherit DWM10_Parms and the data already
+        loaded by the driver. DWM00_Driver is an interactive script without a
+        main guard, so start methods that re-import it (spawn, forkserver) are
+        never used; on platforms without fork the stage runs serially.
+    """
+    if workers is None or workers < 2:
+        return None
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))